@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Task, UserProfile, ReminderLog
+from .models import Task, RecurrenceRule, UserProfile, ReminderLog, ReminderJob, ReminderRun, ReminderSummary
 
 # Register your models here.
 
@@ -7,15 +7,41 @@ from .models import Task, UserProfile, ReminderLog
 class TaskAdmin(admin.ModelAdmin):
     list_display = ['text', 'user', 'priority', 'category', 'completed', 'created_at']
     list_filter = ['priority', 'category', 'completed', 'created_at']
+    ordering = ['-created_at']
+    search_fields = ['text', 'user__username']
+
+@admin.register(RecurrenceRule)
+class RecurrenceRuleAdmin(admin.ModelAdmin):
+    list_display = ['text', 'user', 'frequency', 'interval', 'start_date', 'end_date', 'next_occurrence']
+    list_filter = ['frequency', 'category']
+    readonly_fields = ['next_occurrence', 'created_at']
     search_fields = ['text', 'user__username']
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'phone_number', 'email_reminders', 'sms_reminders', 'reminder_time', 'buffer_time']
+    list_display = ['user', 'phone_number', 'email_reminders', 'sms_reminders', 'reminder_time', 'time_zone', 'next_reminder_at', 'buffer_time']
     list_filter = ['email_reminders', 'sms_reminders', 'push_reminders']
 
 @admin.register(ReminderLog)
 class ReminderLogAdmin(admin.ModelAdmin):
-    list_display = ['user', 'reminder_type', 'success', 'sent_at']
-    list_filter = ['reminder_type', 'success', 'sent_at']
+    list_display = ['user', 'reminder_type', 'success', 'skipped', 'sent_at']
+    list_filter = ['reminder_type', 'success', 'skipped', 'sent_at']
     readonly_fields = ['sent_at']
+
+@admin.register(ReminderSummary)
+class ReminderSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'reminder_type', 'date', 'total', 'succeeded', 'failed', 'skipped']
+    list_filter = ['reminder_type', 'date']
+    search_fields = ['user__username']
+
+@admin.register(ReminderJob)
+class ReminderJobAdmin(admin.ModelAdmin):
+    list_display = ['user', 'reminder_type', 'status', 'attempts', 'run_after', 'locked_by', 'created_at']
+    list_filter = ['reminder_type', 'status']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(ReminderRun)
+class ReminderRunAdmin(admin.ModelAdmin):
+    list_display = ['run_id', 'shard_index', 'shard_count', 'host', 'users', 'sent', 'failed', 'skipped', 'duplicates', 'started_at', 'finished_at']
+    list_filter = ['shard_count']
+    search_fields = ['run_id', 'host']
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class TasksConfig(AppConfig):
     name = 'tasks'
+
+    def ready(self):
+        from . import signals  # Connects the user cache invalidation receivers
+        from .metrics import install_query_recorder
+        connection_created.connect(install_query_recorder, dispatch_uid='tasks.metrics.install_query_recorder')
@@ -0,0 +1,495 @@
+import asyncio
+import gzip
+import io
+import json
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections
+from django.db.models import Count, Exists, OuterRef, Q
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .cache import bump_task_version
+from .metrics import QueryCounter
+from .models import Task, UserProfile, ReminderLog
+from .storage import compressors
+from .stubs import StubProviders
+from .transfer import preserve_auto_now_add
+from . import views
+
+
+def timings(func, iterations):
+    """Run func repeatedly and summarise wall time in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarise(samples)
+
+
+def summarise(samples):
+    samples = sorted(samples)
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(statistics.mean(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def count_queries(func):
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        func()
+    return counter.count
+
+
+def measure(func, iterations):
+    """Query count of one call and latency over `iterations` more"""
+    return {'queries': count_queries(func), 'latency': timings(func, iterations)}
+
+
+def create_user(username, tasks=0, completed=0):
+    """User with a profile and `tasks` tasks due today, `completed` of them done"""
+    user = User.objects.create_user(username, f'{username}@example.com', 'benchmark')
+    UserProfile.objects.create(user=user)
+    today = timezone.now().date()
+    Task.objects.bulk_create([
+        Task(user=user, text=f'Benchmark task {i}', due_date=today, completed=i < completed)
+        for i in range(tasks)
+    ])
+    return user
+
+
+def bench_dashboard(options):
+    """Dashboard view query count on a cold and warm summary cache, and latency"""
+    user = create_user('benchmark-dashboard', tasks=options['tasks'], completed=options['tasks'] // 2)
+    factory = RequestFactory()
+    profile = UserProfile.objects.get(user=user)
+
+    def hit():
+        request = factory.get('/')
+        # What CachedAuthenticationMiddleware attaches on a warm user cache
+        request.user = user
+        request.profile = profile
+        return views.dashboard(request)
+
+    cache.clear()
+    cold_queries = count_queries(hit)
+    warm_queries = count_queries(hit)
+    return {
+        'tasks': options['tasks'],
+        'cold_cache_queries': cold_queries,
+        'warm_cache_queries': warm_queries,
+        'warm_latency': timings(hit, options['iterations']),
+    }
+
+
+def seed_volume(users, tasks, logs, batch_size=5000):
+    """Spread `tasks` tasks and `logs` reminder logs over `users` new users.
+
+    Tasks are due within 30 days either side of today and logs are spread
+    over the last year, so date filters see realistic selectivity.
+    """
+    today = timezone.now().date()
+    now = timezone.now()
+    User.objects.bulk_create([
+        User(username=f'benchmark-volume-{i}', email=f'benchmark-volume-{i}@example.com')
+        for i in range(users)
+    ], batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith='benchmark-volume-').values_list('id', flat=True))
+    UserProfile.objects.bulk_create([UserProfile(user_id=user_id, next_reminder_at=now) for user_id in user_ids], batch_size=batch_size)
+
+    for start in range(0, tasks, batch_size):
+        Task.objects.bulk_create([
+            Task(
+                user_id=random.choice(user_ids),
+                text=f'Benchmark task {start + i}',
+                due_date=today + timedelta(days=random.randint(-30, 30)),
+                completed=random.random() < 0.5,
+            )
+            for i in range(min(batch_size, tasks - start))
+        ], batch_size=batch_size)
+
+    # Keep the seeded, spread-out sent_at values instead of auto_now_add
+    with preserve_auto_now_add(ReminderLog, 'sent_at'):
+        for start in range(0, logs, batch_size):
+            ReminderLog.objects.bulk_create([
+                ReminderLog(
+                    user_id=random.choice(user_ids),
+                    reminder_type=random.choice(['email', 'sms', 'push']),
+                    sent_at=now - timedelta(seconds=random.randint(0, 365 * 24 * 3600)),
+                    success=random.random() < 0.9,
+                )
+                for i in range(min(batch_size, logs - start))
+            ], batch_size=batch_size)
+    return user_ids
+
+
+def bench_task_views(options):
+    """Latency and query counts of the dashboard and task write views at volume"""
+    seed_volume(options['users'], options['total_tasks'], options['total_logs'])
+    user = create_user('benchmark-tasks', tasks=options['tasks'], completed=options['tasks'] // 2)
+    iterations = options['iterations']
+    factory = RequestFactory()
+    profile = UserProfile.objects.get(user=user)
+
+    def call(view, method, path, data=None, *args):
+        if method == 'post':
+            request = factory.post(path, json.dumps(data or {}), content_type='application/json')
+        else:
+            request = factory.get(path)
+        request.user = user
+        request.profile = profile
+        return view(request, *args)
+
+    toggled = Task.objects.create(user=user, text='Benchmark toggle')
+    # One call for the query count plus the timed iterations
+    doomed = iter(
+        task.id for task in Task.objects.bulk_create([
+            Task(user=user, text=f'Benchmark delete {i}') for i in range(iterations + 1)
+        ])
+    )
+    return {
+        'users': options['users'],
+        'tasks': options['total_tasks'],
+        'logs': options['total_logs'],
+        'dashboard': measure(lambda: call(views.dashboard, 'get', '/'), iterations),
+        'add_task': measure(lambda: call(views.add_task, 'post', '/add/', {'text': 'Benchmark add'}), iterations),
+        'toggle_task': measure(lambda: call(views.toggle_task, 'post', '/toggle/', None, toggled.id), iterations),
+        'delete_task': measure(lambda: call(views.delete_task, 'post', '/delete/', None, next(doomed)), iterations),
+    }
+
+
+def seed_reminder_users(count, tasks_per_user=3):
+    """`count` users due for a reminder now on every channel, each with tasks due today"""
+    now = timezone.now()
+    User.objects.bulk_create([
+        User(username=f'benchmark-reminder-{i}', email=f'benchmark-reminder-{i}@example.com')
+        for i in range(count)
+    ], batch_size=1000)
+    user_ids = list(User.objects.filter(username__startswith='benchmark-reminder-').values_list('id', flat=True))
+    UserProfile.objects.bulk_create([
+        UserProfile(
+            user_id=user_id,
+            phone_number='+15550000000',
+            fcm_token=f'benchmark-token-{user_id}',
+            email_reminders=True,
+            sms_reminders=True,
+            push_reminders=True,
+            next_reminder_at=now,
+        )
+        for user_id in user_ids
+    ], batch_size=1000)
+    Task.objects.bulk_create([
+        Task(user_id=user_id, text=f'Benchmark task {i}', due_date=now.date())
+        for user_id in user_ids for i in range(tasks_per_user)
+    ], batch_size=5000)
+    return user_ids
+
+
+def bench_send_reminders(options):
+    """send_reminders end to end against local stub SMTP, Twilio and FCM servers"""
+    seed_reminder_users(options['reminder_users'])
+    # Lift provider rate limits so the run measures this code, not the configured throttle
+    unlimited = {'RATE': 1e9, 'BURST': 10 ** 9}
+    limits = {channel: unlimited for channel in ('email', 'sms', 'push')}
+    counter = QueryCounter()
+    with StubProviders(latency=options['provider_latency'] / 1000) as providers, \
+            override_settings(NOTIFICATION_PROVIDER_LIMITS=limits, **providers.settings), \
+            connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        call_command('send_reminders', stdout=io.StringIO())
+        elapsed = time.perf_counter() - started
+    sent = sum(providers.sent.values())
+    return {
+        'users': options['reminder_users'],
+        'provider_latency_ms': options['provider_latency'],
+        'elapsed_s': round(elapsed, 3),
+        'queries': counter.count,
+        'sent': providers.sent,
+        'reminders_per_second': round(sent / elapsed, 1),
+        'logs_written': ReminderLog.objects.filter(user__username__startswith='benchmark-reminder-').count(),
+    }
+
+
+def bench_indexes(options):
+    """Query plans and latency of the Task and ReminderLog hot paths at volume"""
+    user_ids = seed_volume(options['users'], options['total_tasks'], options['total_logs'])
+    user_id = user_ids[0]
+    today = timezone.now().date()
+    todays_tasks = Task.objects.filter(due_date=today)
+
+    queries = {
+        'dashboard_incomplete_tasks': views.dashboard_tasks(user_id, today),
+        'dashboard_summary': Task.objects.filter(user_id=user_id, due_date=today).values('user').annotate(
+            total=Count('id'), completed=Count('id', filter=Q(completed=True))
+        ),
+        'send_reminders_work_set': User.objects.filter(
+            username__startswith='benchmark-volume-', profile__next_reminder_at__lte=timezone.now()
+        ).filter(Exists(todays_tasks.filter(user=OuterRef('pk'))))[:1000],
+        'reminder_history': ReminderLog.objects.filter(user_id=user_id).order_by('-sent_at', '-id')[:21],
+        'admin_task_changelist': Task.objects.filter(completed=True).order_by('-created_at')[:100],
+        'admin_log_changelist': ReminderLog.objects.filter(reminder_type='sms')[:100],
+    }
+
+    results = {
+        'users': options['users'],
+        'tasks': options['total_tasks'],
+        'logs': options['total_logs'],
+        'queries': {},
+    }
+    for name, queryset in queries.items():
+        results['queries'][name] = {
+            'plan': queryset.explain().splitlines(),
+            'latency': timings(lambda: list(queryset.all()), options['iterations']),
+        }
+    return results
+
+
+def bench_history(options):
+    """Reminder history latency on the first page and on pages deep in a long history"""
+    user = create_user('benchmark-history')
+    now = timezone.now()
+    with preserve_auto_now_add(ReminderLog, 'sent_at'):
+        ReminderLog.objects.bulk_create([
+            ReminderLog(
+                user=user,
+                reminder_type=random.choice(['email', 'sms', 'push']),
+                sent_at=now - timedelta(minutes=i),
+                success=random.random() < 0.9,
+            )
+            for i in range(options['total_logs'])
+        ], batch_size=5000)
+    factory = RequestFactory()
+
+    def page(cursor=None):
+        request = factory.get('/api/reminder-history/', {'cursor': cursor} if cursor else {})
+        request.user = user
+        return views.reminder_history(request)
+
+    results = {'logs': options['total_logs'], 'pages': {}}
+    for depth in sorted({0, options['total_logs'] // 2, max(options['total_logs'] - 20, 0)}):
+        cursor = None
+        if depth:
+            # The cursor a client would hold after paging down to `depth` rows
+            last = ReminderLog.objects.filter(user=user).order_by('-sent_at', '-id').values('sent_at', 'id')[depth - 1]
+            cursor = views.encode_history_cursor(last['sent_at'], last['id'])
+        results['pages'][f'after_{depth}_rows'] = {
+            'queries': count_queries(lambda: page(cursor)),
+            'latency': timings(lambda: page(cursor), options['iterations']),
+        }
+    return results
+
+
+def bench_auth(options):
+    """Queries and latency of authenticated requests through the full middleware
+    stack, with the session and user caches cold and warm"""
+    user = create_user('benchmark-auth', tasks=options['tasks'])
+    client = Client()
+    client.force_login(user)
+    urls = {
+        'dashboard': reverse('tasks:dashboard'),
+        'notification_settings': reverse('tasks:notification_settings'),
+    }
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed with status {response.status_code}")
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for name, url in urls.items():
+            cache.clear()
+            results[name] = {
+                'cold_cache_queries': count_queries(lambda: get(url)),
+                'warm_cache_queries': count_queries(lambda: get(url)),
+                'warm_latency': timings(lambda: get(url), options['iterations']),
+            }
+    return results
+
+
+def bench_async_api(options):
+    """Requests per second of the notification endpoints, issued one at a time
+    and `concurrency` at a time: through the ASGI handler, where the views
+    run as async views, and through the WSGI handler with a worker thread
+    per request in flight, as under a threaded WSGI server"""
+    user = create_user('benchmark-async-api')
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        return {
+            'asgi': async_to_sync(run_async_api)(user, options),
+            'wsgi': run_wsgi_api(user, options),
+        }
+
+
+def api_calls(client):
+    """The requests of the async_api scenario, as calls on a test client or RequestFactory"""
+    settings_url = reverse('tasks:notification_settings')
+    return [
+        lambda: client.get(settings_url),
+        lambda: client.post(settings_url, {'reminder_time': '07:30'}, content_type='application/json'),
+        lambda: client.post(reverse('tasks:send_reminder'), {'type': 'email'}, content_type='application/json'),
+    ]
+
+
+def api_result(samples, elapsed):
+    return {
+        'requests_per_second': round(len(samples) / elapsed, 1),
+        'latency': summarise(samples),
+    }
+
+
+async def run_async_api(user, options):
+    client = AsyncClient()
+    await client.aforce_login(user)
+    calls = api_calls(client)
+
+    async def call(i, limit):
+        async with limit:
+            started = time.perf_counter()
+            response = await calls[i % len(calls)]()
+            if response.status_code >= 400:
+                raise RuntimeError(f"Request failed with status {response.status_code}")
+            return (time.perf_counter() - started) * 1000
+
+    results = {}
+    for concurrency in sorted({1, options['concurrency']}):
+        limit = asyncio.Semaphore(concurrency)
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(call(i, limit) for i in range(options['iterations'])))
+        results[f'concurrency_{concurrency}'] = api_result(samples, time.perf_counter() - started)
+    return results
+
+
+# Any 32 allowed characters make a valid CSRF secret
+BENCHMARK_CSRF_TOKEN = 'benchmark' * 3 + 'token'
+
+
+def run_wsgi_api(user, options):
+    """run_async_api's requests through WSGIHandler from a pool of threads.
+
+    The threads share this thread's database connection, as Django's live
+    test server does, so they see the benchmark data of the open
+    transaction. close_old_connections is disconnected meanwhile, as the
+    test client does, so finishing a request can't close it.
+    """
+    client = Client()
+    client.force_login(user)
+    factory = RequestFactory(HTTP_X_CSRFTOKEN=BENCHMARK_CSRF_TOKEN)
+    factory.cookies = client.cookies
+    factory.cookies[settings.CSRF_COOKIE_NAME] = BENCHMARK_CSRF_TOKEN
+    calls = api_calls(factory)
+    handler = WSGIHandler()
+    database = connections[DEFAULT_DB_ALIAS]
+
+    def share_connection():
+        connections[DEFAULT_DB_ALIAS] = database
+
+    def call(i):
+        started = time.perf_counter()
+        response = handler(calls[i % len(calls)]().environ, lambda status, headers: None)
+        response.close()
+        if response.status_code >= 400:
+            raise RuntimeError(f"Request failed with status {response.status_code}")
+        return (time.perf_counter() - started) * 1000
+
+    results = {}
+    database.inc_thread_sharing()
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        for concurrency in sorted({1, options['concurrency']}):
+            with ThreadPoolExecutor(concurrency, initializer=share_connection) as pool:
+                started = time.perf_counter()
+                samples = list(pool.map(call, range(options['iterations'])))
+                results[f'concurrency_{concurrency}'] = api_result(samples, time.perf_counter() - started)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+        database.dec_thread_sharing()
+    return results
+
+
+ASSETS = ['tasks/dashboard.css', 'tasks/dashboard.js', 'tasks/settings.css', 'tasks/settings.js']
+
+
+def bench_assets(options):
+    """Bytes sent per dashboard visit and dashboard render cost with the task
+    list fragment cache cold and warm.
+
+    Static assets are collected into a temporary STATIC_ROOT to measure the
+    fingerprinted files and their precompressed variants. A first visit
+    downloads the page and the dashboard assets; later visits only the page,
+    as the assets are cached by the browser until their names change.
+    """
+    user = create_user('benchmark-assets', tasks=options['tasks'], completed=options['tasks'] // 2)
+    client = Client()
+    client.force_login(user)
+    url = reverse('tasks:dashboard')
+
+    def get():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"Request failed with status {response.status_code}")
+        return response.content
+
+    def cold():
+        # A new task version, as after any task change
+        bump_task_version(user.id)
+        get()
+
+    with tempfile.TemporaryDirectory() as static_root, \
+            override_settings(ALLOWED_HOSTS=['testserver'], STATIC_ROOT=static_root, DEBUG=False):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        assets = {}
+        for name in ASSETS:
+            hashed = staticfiles_storage.stored_name(name)
+            sizes = {'name': hashed, 'bytes': staticfiles_storage.size(hashed)}
+            for suffix, _ in compressors():
+                variant = hashed + suffix
+                sizes[f'{suffix[1:]}_bytes'] = staticfiles_storage.size(variant) if staticfiles_storage.exists(variant) else None
+            assets[name] = sizes
+
+        cache.clear()
+        page = get()
+        page_gzip = len(gzip.compress(page))
+        first_visit = page_gzip + sum(
+            assets[name]['gz_bytes'] or assets[name]['bytes'] for name in ASSETS if name.startswith('tasks/dashboard')
+        )
+        return {
+            'tasks': options['tasks'],
+            'page_bytes': len(page),
+            'page_gzip_bytes': page_gzip,
+            'assets': assets,
+            'first_visit_gzip_bytes': first_visit,
+            'repeat_visit_gzip_bytes': page_gzip,
+            'fragment_cold': measure(cold, options['iterations']),
+            'fragment_warm': measure(get, options['iterations']),
+        }
+
+
+SCENARIOS = {
+    'assets': bench_assets,
+    'async_api': bench_async_api,
+    'auth': bench_auth,
+    'dashboard': bench_dashboard,
+    'history': bench_history,
+    'indexes': bench_indexes,
+    'send_reminders': bench_send_reminders,
+    'task_views': bench_task_views,
+}
@@ -0,0 +1,98 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+from teachtime.routers import use_primary
+from .models import Task, RecurrenceRule
+from .recurrence import pending_occurrences
+
+
+def today_summary_key(user_id, day):
+    return f"tasks:summary:{user_id}:{day.isoformat()}"
+
+
+def get_today_summary(user, profile):
+    """Today's task counts and the user's buffer time, cached per user and day.
+
+    Recurring tasks due today that have no Task row yet count as incomplete
+    tasks and are tallied in occurrence_count. A miss costs one conditional
+    aggregate over today's tasks plus the indexed lookup of due recurrence
+    rules; a hit costs no queries.
+    """
+    today = timezone.now().date()
+    key = today_summary_key(user.id, today)
+    summary = cache.get(key)
+    if summary is None:
+        # From the primary: a lagging replica would put stale counts in the cache
+        with use_primary():
+            counts = Task.objects.filter(user=user, due_date=today).aggregate(
+                total=Count('id'),
+                completed=Count('id', filter=Q(completed=True)),
+            )
+            occurrences = pending_occurrences(RecurrenceRule.objects.filter(user=user), today).get(user.id, [])
+        summary = {
+            'total_count': counts['total'] + len(occurrences),
+            'completed_count': counts['completed'],
+            'occurrence_count': len(occurrences),
+            'buffer_time': profile.buffer_time,
+        }
+        cache.set(key, summary, getattr(settings, 'TASK_SUMMARY_CACHE_TIMEOUT', 300))
+    return summary
+
+
+def invalidate_today_summary(user):
+    """Drop the cached summary and task list after the user's tasks, recurrences or buffer time change"""
+    cache.delete(today_summary_key(user.id, timezone.now().date()))
+    bump_task_version(user.id)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # A fresh timestamp rather than 0, so an evicted version can't revive old entries
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def user_version_key(user_id):
+    return f"tasks:user:{user_id}:version"
+
+
+def get_user_version(user_id):
+    return get_version(user_version_key(user_id))
+
+
+def bump_user_version(user_id):
+    """Make every cached copy of the user and their profile stale"""
+    cache.set(user_version_key(user_id), time.time_ns(), None)
+
+
+def task_version_key(user_id):
+    return f"tasks:tasks:{user_id}:version"
+
+
+def get_task_version(user_id):
+    """Stamp of the user's task list; part of the dashboard's task list fragment cache key"""
+    return get_version(task_version_key(user_id))
+
+
+def bump_task_version(user_id):
+    """Make the user's cached task list fragments stale"""
+    cache.set(task_version_key(user_id), time.time_ns(), None)
+
+
+def get_cached_user_and_profile(user_id, load):
+    """(user, profile) for user_id from the cache, calling load() on a miss.
+
+    The version is read before loading, so a save racing with the load
+    leaves the loaded pair under a version nobody reads again.
+    """
+    key = f"tasks:user:{user_id}:{get_user_version(user_id)}"
+    pair = cache.get(key)
+    if pair is None:
+        pair = load()
+        if pair is not None:
+            cache.set(key, pair, getattr(settings, 'USER_CACHE_TIMEOUT', 300))
+    return pair
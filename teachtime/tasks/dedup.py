@@ -0,0 +1,103 @@
+import hashlib
+import json
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import ReminderDelivery
+
+CLAIM_BATCH_SIZE = 500
+
+
+def content_hash(tasks):
+    """Stable hash of the tasks a reminder is about"""
+    entries = sorted([task.id, task.text, task.completed] for task in tasks if task.id is not None)
+    # Occurrences of recurring tasks without a row yet have no id, only their
+    # occurrence key. They go after the rows, so a reminder without
+    # occurrences hashes the same as it did before they existed.
+    entries += sorted([task.occurrence, task.text, task.completed] for task in tasks if task.id is None)
+    payload = json.dumps(entries)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_deliveries(sends, day):
+    """Claim (user, channel, tasks) sends for tasks due on `day`.
+
+    Returns {(user id, channel): delivery id} for the sends that may go out.
+    A send is a duplicate, and is left out, when the same content was sent
+    to the same user on the same channel and day within
+    REMINDER_DEDUP_WINDOW seconds, or is claimed by a run that may still be
+    sending it (0 disables deduplication and claims everything). Claims
+    must be confirmed with confirm_deliveries() once sent; unconfirmed
+    ones lapse after REMINDER_DEDUP_CLAIM_TIMEOUT seconds, so a run that
+    died mid-send doesn't suppress its reminders for the whole window.
+
+    Expired claims are deleted, new ones are inserted with a per-call token
+    and the unique constraint ignoring conflicts, and the winners are read
+    back in one indexed lookup on the token, so two overlapping runs cannot
+    both claim the same send.
+    """
+    window = getattr(settings, 'REMINDER_DEDUP_WINDOW', 3600)
+    if window <= 0:
+        return {(user.id, channel): None for user, channel, tasks in sends}
+    claim_timeout = getattr(settings, 'REMINDER_DEDUP_CLAIM_TIMEOUT', 900)
+    
+    claimed = {}
+    for start in range(0, len(sends), CLAIM_BATCH_SIZE):
+        batch = sends[start:start + CLAIM_BATCH_SIZE]
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        ReminderDelivery.objects.filter(
+            Q(date__lt=day)
+            | Q(sent_at__lt=now - timedelta(seconds=window))
+            | Q(sent_at__isnull=True, claimed_at__lt=now - timedelta(seconds=claim_timeout)),
+            user_id__in={user.id for user, channel, tasks in batch},
+        ).delete()
+        ReminderDelivery.objects.bulk_create([
+            ReminderDelivery(
+                user_id=user.id,
+                channel=channel,
+                date=day,
+                content_hash=content_hash(tasks),
+                claimed_at=now,
+                claim=token,
+            )
+            for user, channel, tasks in batch
+        ], ignore_conflicts=True)
+        for delivery_id, user_id, channel in ReminderDelivery.objects.filter(claim=token).values_list('id', 'user_id', 'channel'):
+            claimed[(user_id, channel)] = delivery_id
+    return claimed
+
+
+def claim_delivery(user, channel, tasks, day):
+    """claim_deliveries for one send; returns the delivery id, or False for a duplicate"""
+    return claim_deliveries([(user, channel, tasks)], day).get((user.id, channel), False)
+
+
+def unconfirmed_claims(user_ids, day):
+    """The ids among user_ids with a claim for `day` that is not confirmed as sent yet"""
+    user_ids = list(user_ids)
+    pending = set()
+    for start in range(0, len(user_ids), CLAIM_BATCH_SIZE):
+        pending.update(
+            ReminderDelivery.objects.filter(
+                user_id__in=user_ids[start:start + CLAIM_BATCH_SIZE], date=day, sent_at__isnull=True,
+            ).values_list('user_id', flat=True)
+        )
+    return pending
+
+
+def confirm_deliveries(delivery_ids):
+    """Mark claims as sent, so they hold for the whole deduplication window"""
+    delivery_ids = [delivery_id for delivery_id in delivery_ids if delivery_id is not None]
+    now = timezone.now()
+    for start in range(0, len(delivery_ids), CLAIM_BATCH_SIZE):
+        ReminderDelivery.objects.filter(id__in=delivery_ids[start:start + CLAIM_BATCH_SIZE]).update(sent_at=now)
+
+
+def release_deliveries(delivery_ids):
+    """Forget claims whose send failed or was postponed so a retry can send"""
+    delivery_ids = [delivery_id for delivery_id in delivery_ids if delivery_id is not None]
+    for start in range(0, len(delivery_ids), CLAIM_BATCH_SIZE):
+        ReminderDelivery.objects.filter(id__in=delivery_ids[start:start + CLAIM_BATCH_SIZE]).delete()
@@ -0,0 +1,151 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from .resilience import CircuitOpenError
+from .services import FCM_INVALID_TOKEN_ERRORS, NotificationService
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ['email', 'sms', 'push']
+
+DEFAULT_CHANNEL_CONCURRENCY = {
+    'email': 4,
+    'sms': 8,
+    'push': 16,
+}
+
+
+class ChannelStats:
+    """Running counters for one notification channel"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def attempted(self):
+        return self.sent + self.failed + self.skipped
+
+    @property
+    def elapsed(self):
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self):
+        return self.attempted / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class ReminderDispatcher:
+    """Fan reminder sends out over one bounded worker pool per channel.
+
+    Sends are submitted from the calling thread and run concurrently, while
+    results are handed back to the caller as they complete so that database
+    writes stay on the thread that owns the connection. Email and push sends
+    are held back and delivered in batches when results are collected: email
+    over one SMTP connection per batch, push as FCM multicast requests.
+    """
+
+    senders = {
+        'email': NotificationService.send_email_reminder,
+        'sms': NotificationService.send_sms_reminder,
+        'push': NotificationService.send_push_notification,
+    }
+
+    def __init__(self, concurrency=None):
+        limits = dict(DEFAULT_CHANNEL_CONCURRENCY)
+        limits.update(getattr(settings, 'REMINDER_CHANNEL_CONCURRENCY', {}))
+        limits.update(concurrency or {})
+        self.pools = {
+            channel: ThreadPoolExecutor(max_workers=limits[channel], thread_name_prefix=f'reminder-{channel}')
+            for channel in CHANNELS
+        }
+        self.stats = {channel: ChannelStats(channel) for channel in CHANNELS}
+        self.futures = {}
+        self.email_batch_size = getattr(settings, 'REMINDER_EMAIL_BATCH_SIZE', 100)
+        self.pending_email = []
+        self.pending_push = []
+        self.invalid_fcm_tokens = set()
+
+    def _start(self, channel):
+        stats = self.stats[channel]
+        if stats.started_at is None:
+            stats.started_at = time.monotonic()
+
+    def submit(self, user, channel, tasks):
+        """Queue a send of `tasks` to `user` on `channel`"""
+        self._start(channel)
+        if channel == 'email':
+            self.pending_email.append((user, tasks))
+            return None
+        if channel == 'push':
+            self.pending_push.append((user, tasks))
+            return None
+        future = self.pools[channel].submit(self.senders[channel], user, tasks)
+        self.futures[future] = (channel, [user])
+        return future
+
+    def submit_email_batches(self):
+        """Send held email reminders in batches, one SMTP connection each"""
+        for i in range(0, len(self.pending_email), self.email_batch_size):
+            recipients = self.pending_email[i:i + self.email_batch_size]
+            future = self.pools['email'].submit(NotificationService.send_email_batch, recipients)
+            self.futures[future] = ('email', [user for user, tasks in recipients])
+        self.pending_email = []
+
+    def submit_push_batches(self):
+        """Send held push reminders as multicast requests, one per identical message"""
+        for message, users in NotificationService.group_push_recipients(self.pending_push):
+            future = self.pools['push'].submit(NotificationService.send_push_multicast, message, users)
+            self.futures[future] = ('push', users)
+        self.pending_push = []
+
+    def results(self):
+        """Yield (user, channel, success, error_message) as sends complete.
+
+        success is None for sends skipped because the channel's circuit
+        breaker was open.
+        """
+        try:
+            self.submit_email_batches()
+            self.submit_push_batches()
+            for future in as_completed(list(self.futures)):
+                channel, users = self.futures.pop(future)
+                try:
+                    outcome = future.result()
+                    if isinstance(outcome, list):
+                        outcomes = outcome
+                    else:
+                        outcomes = [(users[0], bool(outcome), None)]
+                except CircuitOpenError as e:
+                    outcomes = [(user, None, str(e)) for user in users]
+                except Exception as e:
+                    logger.error(f"Error sending {channel} reminders to {len(users)} users: {str(e)}")
+                    outcomes = [(user, False, str(e)) for user in users]
+
+                stats = self.stats[channel]
+                for user, success, error_message in outcomes:
+                    if success:
+                        stats.sent += 1
+                    elif success is None:
+                        stats.skipped += 1
+                    else:
+                        stats.failed += 1
+                    if channel == 'push' and error_message in FCM_INVALID_TOKEN_ERRORS:
+                        self.invalid_fcm_tokens.add(user.profile.fcm_token)
+                stats.finished_at = time.monotonic()
+
+                for user, success, error_message in outcomes:
+                    yield user, channel, success, error_message
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
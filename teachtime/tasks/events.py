@@ -0,0 +1,185 @@
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .models import DashboardEvent, DashboardStream
+
+DEFAULT_CONFIG = {
+    'BACKEND': 'memory',
+    'KEEPALIVE': 15,
+    'POLL_INTERVAL': 2,
+    'RETENTION': 600,
+    'QUEUE_SIZE': 100,
+}
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'DASHBOARD_EVENTS', {})}
+
+
+class EventBus:
+    """In-process pub/sub of dashboard events, keyed by user id.
+
+    Subscribers are asyncio queues read by event streams on the ASGI event
+    loop; publish() may be called from any thread, including sync views
+    running in the thread pool.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # user id -> {queue: event loop}
+        self.last_id = 0
+    
+    def subscribe(self, user_id, maxsize):
+        queue = asyncio.Queue(maxsize)
+        with self.lock:
+            self.subscribers.setdefault(user_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+    
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            queues = self.subscribers.get(user_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self.subscribers.pop(user_id, None)
+    
+    def publish(self, user_id, kind, data):
+        with self.lock:
+            self.last_id += 1
+            event = {'id': self.last_id, 'kind': kind, 'data': data}
+            targets = list(self.subscribers.get(user_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(deliver, queue, event)
+            except RuntimeError:
+                # The stream's loop has shut down; it unsubscribes on its way out
+                pass
+
+
+def deliver(queue, event):
+    """Queue an event for a stream, telling a stream that fell behind to resync"""
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'id': event['id'], 'kind': 'resync', 'data': {}})
+
+
+bus = EventBus()
+
+
+def subscribed_users(user_ids):
+    """The ids among user_ids with a dashboard event stream open"""
+    if get_config()['BACKEND'] == 'database':
+        return set(
+            DashboardStream.objects.filter(user_id__in=set(user_ids), expires_at__gt=timezone.now())
+            .values_list('user_id', flat=True)
+        )
+    with bus.lock:
+        return {user_id for user_id in user_ids if user_id in bus.subscribers}
+
+
+def publish_events(events, subscribed_only=False):
+    """Publish (user id, kind, data) triples to the user's open dashboards.
+    
+    With subscribed_only, events of users without an open stream are
+    dropped instead of stored; for bulk publishers like reminder sends,
+    whose events only matter to a dashboard that is open right now.
+    """
+    events = list(events)
+    if not events:
+        return
+    if get_config()['BACKEND'] == 'database':
+        if subscribed_only:
+            listening = subscribed_users(user_id for user_id, kind, data in events)
+            events = [event for event in events if event[0] in listening]
+        DashboardEvent.objects.bulk_create([
+            DashboardEvent(user_id=user_id, kind=kind, data=data) for user_id, kind, data in events
+        ])
+    else:
+        for user_id, kind, data in events:
+            bus.publish(user_id, kind, data)
+
+
+def publish_event(user_id, kind, data):
+    publish_events([(user_id, kind, data)])
+
+
+def prune_events():
+    """Delete database events older than the retention window"""
+    config = get_config()
+    if config['BACKEND'] != 'database':
+        return 0
+    now = timezone.now()
+    DashboardStream.objects.filter(expires_at__lte=now).delete()
+    deleted, _ = DashboardEvent.objects.filter(created_at__lt=now - timedelta(seconds=config['RETENTION'])).delete()
+    return deleted
+
+
+async def listen_memory(queue, config):
+    while True:
+        try:
+            yield await asyncio.wait_for(queue.get(), config['KEEPALIVE'])
+        except asyncio.TimeoutError:
+            yield None
+
+
+async def listen_database(user_id, last_event_id, config):
+    # Registered so that subscribed_only publishers store events for this user
+    lifetime = timedelta(seconds=2 * config['KEEPALIVE'])
+    stream = await DashboardStream.objects.acreate(user_id=user_id, expires_at=timezone.now() + lifetime)
+    try:
+        if last_event_id is None:
+            # Start from now; a reconnecting client resumes after its Last-Event-ID
+            latest = await DashboardEvent.objects.filter(user_id=user_id).aaggregate(Max('id'))
+            last_event_id = latest['id__max'] or 0
+        idle = 0
+        while True:
+            events = [
+                event async for event in DashboardEvent.objects
+                .filter(user_id=user_id, id__gt=last_event_id)
+                .order_by('id')
+                .values('id', 'kind', 'data')
+            ]
+            for event in events:
+                last_event_id = event['id']
+                yield event
+            idle = 0 if events else idle + config['POLL_INTERVAL']
+            if idle >= config['KEEPALIVE']:
+                idle = 0
+                yield None
+            # Renew once per keepalive interval, well before the registration lapses
+            if stream.expires_at - timezone.now() <= lifetime - timedelta(seconds=config['KEEPALIVE']):
+                stream.expires_at = timezone.now() + lifetime
+                await DashboardStream.objects.filter(id=stream.id).aupdate(expires_at=stream.expires_at)
+            await asyncio.sleep(config['POLL_INTERVAL'])
+    finally:
+        await DashboardStream.objects.filter(id=stream.id).adelete()
+
+
+async def stream_events(user_id, last_event_id=None):
+    """Server-Sent Events text for a user's dashboard, with keepalive comments"""
+    config = get_config()
+    queue = None
+    if config['BACKEND'] == 'database':
+        events = listen_database(user_id, last_event_id, config)
+    else:
+        # Subscribe before the first chunk goes out so nothing published after it is missed
+        queue = bus.subscribe(user_id, config['QUEUE_SIZE'])
+        events = listen_memory(queue, config)
+    
+    try:
+        yield 'retry: 3000\n\n'
+        async for event in events:
+            if event is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(event['data'])}\n\n"
+    finally:
+        await events.aclose()
+        if queue is not None:
+            bus.unsubscribe(user_id, queue)
@@ -0,0 +1,151 @@
+import os
+import socket
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .dedup import claim_delivery, confirm_deliveries, release_deliveries
+from .models import Task, RecurrenceRule, ReminderJob
+from .recurrence import pending_occurrences
+from .resilience import CircuitOpenError
+from .services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_reminder(user, reminder_type):
+    """Queue a reminder for the worker and return the job"""
+    return ReminderJob.objects.create(
+        user=user,
+        reminder_type=reminder_type,
+        max_attempts=getattr(settings, 'REMINDER_JOB_MAX_ATTEMPTS', 3),
+    )
+
+
+async def aenqueue_reminder(user, reminder_type):
+    """enqueue_reminder for async views"""
+    return await ReminderJob.objects.acreate(
+        user=user,
+        reminder_type=reminder_type,
+        max_attempts=getattr(settings, 'REMINDER_JOB_MAX_ATTEMPTS', 3),
+    )
+
+
+def claim_jobs(worker_id, batch_size):
+    """Atomically mark up to batch_size due jobs as running for this worker.
+
+    The claim is a conditional UPDATE on status, so two workers racing for
+    the same rows cannot both win, on SQLite as well as Postgres.
+    """
+    now = timezone.now()
+    ids = list(
+        ReminderJob.objects
+        .filter(status='pending', run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    ReminderJob.objects.filter(id__in=ids, status='pending').update(
+        status='running',
+        locked_by=worker_id,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return list(
+        ReminderJob.objects
+        .filter(id__in=ids, status='running', locked_by=worker_id, locked_at=now)
+        .select_related('user__profile')
+    )
+
+
+def release_stale_jobs(stale_after):
+    """Return running jobs whose worker stopped responding to the queue.
+
+    Each claim used up an attempt, so a job whose last attempt went stale
+    is failed rather than requeued; otherwise a job that crashes or hangs
+    its worker would be picked up forever. Returns (requeued, failed).
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = ReminderJob.objects.filter(status='running', locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed',
+        success=False,
+        error_message='Worker stopped responding',
+        locked_by=None,
+        locked_at=None,
+        updated_at=timezone.now(),
+    )
+    requeued = stale.update(
+        status='pending',
+        locked_by=None,
+        locked_at=None,
+        updated_at=timezone.now(),
+    )
+    return requeued, failed
+
+
+def run_job(job, log_buffer):
+    """Send one claimed job, log the attempt and schedule a retry if it failed"""
+    error_message = None
+    delivery_id = None
+    try:
+        # The user's own date, which can differ from the UTC one
+        today = job.user.profile.local_date()
+        tasks = list(Task.objects.filter(user=job.user, due_date=today))
+        tasks += pending_occurrences(RecurrenceRule.objects.filter(user=job.user), today).get(job.user_id, [])
+        delivery_id = claim_delivery(job.user, job.reminder_type, tasks, today)
+        # False: the same reminder already went out, e.g. from send_reminders
+        success = delivery_id is not False and bool(NotificationService.send(job.reminder_type, job.user, tasks))
+    except CircuitOpenError as e:
+        release_deliveries([delivery_id])
+        # The provider is known to be down; wait for the breaker without using up an attempt
+        log_buffer.add(job.user, job.reminder_type, False, str(e), skipped=True)
+        job.status = 'pending'
+        job.attempts -= 1
+        job.error_message = str(e)
+        job.run_after = timezone.now() + timedelta(seconds=e.retry_after)
+        job.locked_by = None
+        job.locked_at = None
+        job.save(update_fields=['status', 'attempts', 'error_message', 'locked_by', 'locked_at', 'run_after', 'updated_at'])
+        return job
+    except Exception as e:
+        logger.error(f"Error running reminder job {job.id} for {job.user.username}: {str(e)}")
+        success = False
+        error_message = str(e)
+    
+    if delivery_id is False:
+        # Nothing was sent, so nothing is logged either
+        job.status = 'duplicate'
+        job.success = False
+        job.error_message = 'Duplicate of a reminder already sent'
+        job.locked_by = None
+        job.locked_at = None
+        job.save(update_fields=['status', 'success', 'error_message', 'locked_by', 'locked_at', 'updated_at'])
+        return job
+
+    log_buffer.add(job.user, job.reminder_type, success, error_message)
+    if success:
+        confirm_deliveries([delivery_id])
+    else:
+        release_deliveries([delivery_id])
+
+    job.success = success
+    job.error_message = error_message
+    job.locked_by = None
+    job.locked_at = None
+    if success:
+        job.status = 'done'
+    elif job.attempts < job.max_attempts:
+        delay = getattr(settings, 'REMINDER_JOB_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+        job.status = 'pending'
+        job.run_after = timezone.now() + timedelta(seconds=delay)
+    else:
+        job.status = 'failed'
+    job.save(update_fields=['status', 'success', 'error_message', 'locked_by', 'locked_at', 'run_after', 'updated_at'])
+    return job
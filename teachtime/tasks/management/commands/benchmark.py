@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from tasks.benchmarks import SCENARIOS
+import django
+import json
+import platform
+
+BENCHMARK_OPTIONS = [
+    'tasks', 'users', 'total_tasks', 'total_logs', 'iterations',
+    'reminder_users', 'provider_latency', 'concurrency',
+]
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks and print the results as JSON, for comparing runs over time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            help=f"Scenarios to run: {', '.join(sorted(SCENARIOS))} (default: all)",
+        )
+        parser.add_argument(
+            '--tasks',
+            type=int,
+            default=20,
+            help='Tasks due today for the benchmark user',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Users seeded by volume scenarios',
+        )
+        parser.add_argument(
+            '--total-tasks',
+            type=int,
+            default=100000,
+            help='Tasks seeded by volume scenarios (e.g. 1000000)',
+        )
+        parser.add_argument(
+            '--total-logs',
+            type=int,
+            default=100000,
+            help='ReminderLog rows seeded by volume scenarios (e.g. 10000000)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=100,
+            help='Timed repetitions per measurement',
+        )
+        parser.add_argument(
+            '--reminder-users',
+            type=int,
+            default=500,
+            help='Users due a reminder on every channel in the send_reminders scenario',
+        )
+        parser.add_argument(
+            '--provider-latency',
+            type=float,
+            default=0,
+            help='Milliseconds the stub providers wait per message',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Requests in flight at once for concurrent scenarios',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Commit the seeded data instead of rolling it back',
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario: {', '.join(sorted(unknown))}")
+        
+        results = {}
+        for name in options['scenarios'] or sorted(SCENARIOS):
+            with transaction.atomic():
+                results[name] = SCENARIOS[name](options)
+                if not options['keep_data']:
+                    transaction.set_rollback(True)
+
+        # Enough context to tell whether two runs are comparable
+        report = {
+            'run_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {key: options[key] for key in BENCHMARK_OPTIONS},
+            'results': results,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from pathlib import Path
+from tasks.models import ReminderLog
+from tasks.retention import compact_batch, prune_summaries, retention_cutoff
+import time
+
+class Command(BaseCommand):
+    help = 'Roll old reminder logs into daily summaries and archive or delete the raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.REMINDER_LOG_RETENTION_DAYS,
+            help='Keep raw logs of this many recent days (default: REMINDER_LOG_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.REMINDER_LOG_COMPACT_BATCH_SIZE,
+            help='Rows summarised and removed per transaction (default: REMINDER_LOG_COMPACT_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            type=str,
+            default=settings.REMINDER_LOG_ARCHIVE_DIR,
+            help='Directory for the gzipped NDJSON archive (default: REMINDER_LOG_ARCHIVE_DIR)',
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Delete the raw rows without archiving them',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches, to leave room for other writers',
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--retention-days and --batch-size must be positive')
+        
+        cutoff = retention_cutoff(options['retention_days'])
+        archive_path = None
+        if not options['no_archive'] and options['archive_dir'] and ReminderLog.objects.filter(sent_at__lt=cutoff).exists():
+            archive_dir = Path(options['archive_dir'])
+            archive_dir.mkdir(parents=True, exist_ok=True)
+            archive_path = archive_dir / f"reminder_logs_{timezone.now():%Y%m%dT%H%M%S}.ndjson.gz"
+        
+        total = 0
+        # Each batch appends its own gzip member, see compact_batch()
+        archive = open(archive_path, 'ab') if archive_path else None
+        try:
+            while True:
+                removed = compact_batch(cutoff, options['batch_size'], archive)
+                if not removed:
+                    break
+                total += removed
+                self.stdout.write(f'Compacted {total} logs')
+                time.sleep(options['pause'])
+        finally:
+            if archive is not None:
+                archive.close()
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Compacted {total} reminder logs sent before {cutoff:%Y-%m-%d}')
+        )
+        if archive_path:
+            self.stdout.write(f'Archived to {archive_path}')
+        
+        if settings.REMINDER_SUMMARY_RETENTION_DAYS:
+            summary_cutoff = retention_cutoff(settings.REMINDER_SUMMARY_RETENTION_DAYS)
+            pruned = prune_summaries(summary_cutoff, options['batch_size'])
+            self.stdout.write(f'Deleted {pruned} reminder summaries before {summary_cutoff:%Y-%m-%d}')
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from tasks.models import Task, ReminderLog
+from tasks.transfer import FORMATS, TASK_FIELDS, REMINDER_FIELDS, export_lines
+import sys
+
+MODELS = {
+    'tasks': (Task, TASK_FIELDS),
+    'reminders': (ReminderLog, REMINDER_FIELDS),
+}
+
+class Command(BaseCommand):
+    help = 'Stream tasks or reminder logs to a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kind',
+            choices=sorted(MODELS),
+            help='What to export',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='csv',
+            help='Output format',
+        )
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Only export rows of this user (username)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='File to write (default: stdout)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database per round trip',
+        )
+
+    def handle(self, *args, **options):
+        model, fields = MODELS[options['kind']]
+        queryset = model.objects.all()
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+            queryset = queryset.filter(user=user)
+        
+        # Keep the owner so the file can be imported back without --user
+        fields = ['user__username'] + fields
+        
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for line in export_lines(queryset, fields, options['format'], options['chunk_size']):
+                output.write(line)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+from tasks.models import Task, ReminderLog
+from tasks.retention import count_logs, remove_from_summaries
+from tasks.transfer import FORMATS, ImportRowError, import_rows
+from contextlib import nullcontext
+import gzip
+
+MODELS = {
+    'tasks': Task,
+    'reminders': ReminderLog,
+}
+
+def restore_logs(logs):
+    # Archived logs are already counted in ReminderSummary rows
+    remove_from_summaries(count_logs(logs))
+
+class Command(BaseCommand):
+    help = 'Load tasks or reminder logs from a CSV or NDJSON export'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kind',
+            choices=sorted(MODELS),
+            help='What to import',
+        )
+        parser.add_argument(
+            'path',
+            type=str,
+            help='File written by export_data, or a gzipped compact_reminder_logs archive',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Input format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Import every row for this user instead of the username column',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per INSERT',
+        )
+        parser.add_argument(
+            '--atomic',
+            action='store_true',
+            help='Roll back everything if any row fails (default: keep earlier batches)',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        # compact_reminder_logs archives are gzipped
+        path = options['path']
+        opener = gzip.open if path.endswith('.gz') else open
+        if fmt is None:
+            fmt = 'ndjson' if path.removesuffix('.gz').endswith(('.ndjson', '.jsonl')) else 'csv'
+        
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+        
+        def progress(total):
+            self.stdout.write(f'Imported {total} rows')
+        
+        try:
+            with opener(path, 'rt', newline='', encoding='utf-8') as stream, \
+                    transaction.atomic() if options['atomic'] else nullcontext():
+                total = import_rows(
+                    MODELS[options['kind']], stream, fmt,
+                    user=user, batch_size=options['batch_size'], progress=progress,
+                    after_batch=restore_logs if options['kind'] == 'reminders' else None,
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        except ImportRowError as e:
+            kept = 'nothing was imported' if options['atomic'] else 'earlier batches were kept'
+            raise CommandError(f"{e} ({kept})")
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Imported {total} {options["kind"]}')
+        )
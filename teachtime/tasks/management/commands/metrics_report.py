@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from tasks.metrics import histogram_quantile, merged_snapshots, render_prometheus
+
+class Command(BaseCommand):
+    help = 'Summarise request and notification provider metrics from all processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prometheus',
+            action='store_true',
+            help='Print the raw Prometheus text instead of a summary',
+        )
+
+    def handle(self, *args, **options):
+        counters, histograms = merged_snapshots()
+        if options['prometheus']:
+            self.stdout.write(render_prometheus(counters, histograms), ending='')
+            return
+        
+        requests = {}
+        for (name, labels), value in counters.items():
+            if name == 'teachtime_http_requests_total':
+                view = dict(labels)['view']
+                requests[view] = requests.get(view, 0) + value
+        
+        self.stdout.write('Views (latency and queries from sampled requests)')
+        self.stdout.write(f"{'view':<36} {'requests':>9} {'sampled':>8} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'db ms':>8}")
+        for view in sorted(requests):
+            labels = (('view', view),)
+            latency = histograms.get(('teachtime_http_request_duration_seconds', labels))
+            queries = histograms.get(('teachtime_http_request_queries', labels))
+            db_time = histograms.get(('teachtime_http_request_db_seconds', labels))
+            sampled = sum(latency[:-1]) if latency else 0
+            if sampled:
+                self.stdout.write(
+                    f"{view:<36} {requests[view]:>9} {sampled:>8} "
+                    f"{histogram_quantile('teachtime_http_request_duration_seconds', latency, 0.5) * 1000:>8.1f} "
+                    f"{histogram_quantile('teachtime_http_request_duration_seconds', latency, 0.95) * 1000:>8.1f} "
+                    f"{queries[-1] / sampled:>8.1f} {db_time[-1] / sampled * 1000:>8.1f}"
+                )
+            else:
+                self.stdout.write(f"{view:<36} {requests[view]:>9} {0:>8}")
+        
+        calls = {}
+        for (name, labels), value in counters.items():
+            if name == 'teachtime_provider_calls_total':
+                labels = dict(labels)
+                calls.setdefault(labels['channel'], {})[labels['outcome']] = value
+        
+        self.stdout.write('')
+        self.stdout.write('Notification providers')
+        self.stdout.write(f"{'channel':<10} {'calls':>7} {'failed':>7} {'error %':>8} {'rejected':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for channel in sorted(calls):
+            outcomes = calls[channel]
+            made = sum(count for outcome, count in outcomes.items() if outcome != 'rejected')
+            failed = outcomes.get('failure', 0)
+            latency = histograms.get(('teachtime_provider_call_duration_seconds', (('channel', channel),)))
+            p50 = histogram_quantile('teachtime_provider_call_duration_seconds', latency, 0.5) if latency else None
+            p95 = histogram_quantile('teachtime_provider_call_duration_seconds', latency, 0.95) if latency else None
+            self.stdout.write(
+                f"{channel:<10} {made:>7} {failed:>7} {(failed / made * 100 if made else 0):>8.1f} "
+                f"{outcomes.get('rejected', 0):>9} "
+                f"{(p50 or 0) * 1000:>8.1f} {(p95 or 0) * 1000:>8.1f}"
+            )
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Min, Sum
+from tasks.models import ReminderRun
+import json
+
+class Command(BaseCommand):
+    help = 'Summarise recent send_reminders runs, adding up the shards of each window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--run-id',
+            type=str,
+            help='Only summarise this run',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Number of most recent runs to show',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the summary as JSON',
+        )
+
+    def handle(self, *args, **options):
+        runs = ReminderRun.objects.all()
+        if options['run_id']:
+            runs = runs.filter(run_id=options['run_id'])
+        
+        totals = list(
+            runs.values('run_id')
+            .annotate(
+                first_start=Min('started_at'),
+                last_finish=Max('finished_at'),
+                processes=Count('id'),
+                finished_processes=Count('finished_at'),
+                shards=Max('shard_count'),
+                total_users=Sum('users'),
+                total_sent=Sum('sent'),
+                total_failed=Sum('failed'),
+                total_skipped=Sum('skipped'),
+                total_duplicates=Sum('duplicates'),
+            )
+            .order_by('-first_start')[:options['limit']]
+        )
+        
+        shards = {}
+        for run_id, shard_index, finished_at in runs.filter(run_id__in=[t['run_id'] for t in totals]).values_list('run_id', 'shard_index', 'finished_at'):
+            if finished_at is not None:
+                shards.setdefault(run_id, set()).add(shard_index)
+        
+        summary = []
+        for total in totals:
+            done = shards.get(total['run_id'], set())
+            summary.append({
+                'run_id': total['run_id'],
+                'shards_finished': len(done),
+                'shard_count': total['shards'],
+                'missing_shards': sorted(set(range(total['shards'])) - done),
+                'processes': total['processes'],
+                'unfinished_processes': total['processes'] - total['finished_processes'],
+                'users': total['total_users'],
+                'sent': total['total_sent'],
+                'failed': total['total_failed'],
+                'skipped': total['total_skipped'],
+                'duplicates': total['total_duplicates'],
+                'started_at': total['first_start'].isoformat(),
+                'elapsed_s': round((total['last_finish'] - total['first_start']).total_seconds(), 3) if total['last_finish'] else None,
+            })
+        
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        
+        for run in summary:
+            status = 'complete' if not run['missing_shards'] else f"missing shards {', '.join(map(str, run['missing_shards']))}"
+            self.stdout.write(
+                f"{run['run_id']}: {run['shards_finished']}/{run['shard_count']} shards ({status}), "
+                f"{run['users']} users, {run['sent']} sent, {run['failed']} failed, "
+                f"{run['skipped']} skipped, {run['duplicates']} duplicates"
+                + (f" in {run['elapsed_s']}s" if run['elapsed_s'] is not None else '')
+            )
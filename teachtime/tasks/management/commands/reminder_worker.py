@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from tasks.events import prune_events
+from tasks.jobs import claim_jobs, default_worker_id, release_stale_jobs, run_job
+from tasks.metrics import registry
+from tasks.services import ReminderLogBuffer
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Process queued reminder jobs until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Number of jobs claimed per round',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=300,
+            help='Requeue running jobs locked longer than this many seconds',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the jobs that are currently due and exit',
+        )
+        parser.add_argument(
+            '--worker-id',
+            type=str,
+            default=None,
+            help='Identifier recorded on claimed jobs (default: host:pid)',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stdout.write(f'Reminder worker {worker_id} started')
+        processed = 0
+
+        try:
+            while True:
+                requeued, failed = release_stale_jobs(options['stale_after'])
+                if requeued:
+                    logger.warning(f"Requeued {requeued} stale reminder jobs")
+                if failed:
+                    logger.warning(f"Failed {failed} stale reminder jobs that were out of attempts")
+                prune_events()
+                registry.maybe_flush()
+
+                jobs = claim_jobs(worker_id, options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                with ReminderLogBuffer() as log_buffer:
+                    for job in jobs:
+                        run_job(job, log_buffer)
+                        processed += 1
+        except KeyboardInterrupt:
+            self.stdout.write('Interrupted')
+        registry.flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Processed {processed} reminder jobs')
+        )
@@ -1,12 +1,37 @@
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.db.models.functions import Mod
 from django.utils import timezone
-from tasks.models import Task, ReminderLog
-from tasks.services import NotificationService
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from tasks.jobs import default_worker_id
+from tasks.models import Task, RecurrenceRule, UserProfile, ReminderJob, ReminderRun
+from tasks.dedup import claim_deliveries, confirm_deliveries, release_deliveries, unconfirmed_claims
+from tasks.dispatch import ReminderDispatcher
+from tasks.events import prune_events
+from tasks.metrics import QueryCounter, registry
+from tasks.recurrence import pending_occurrences
+from tasks.resilience import get_provider_guard
+from tasks.services import NotificationService, ReminderLogBuffer
+from teachtime.routers import read_from, use_primary
+import argparse
 import logging
 
 logger = logging.getLogger(__name__)
 
+def parse_shard(value):
+    """Parse an --shard value of the form i/N"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected i/N, e.g. 0/4')
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError('expected 0 <= i < N')
+    return index, count
+
 class Command(BaseCommand):
     help = 'Send daily task reminders to users'
 
@@ -21,67 +46,295 @@ class Command(BaseCommand):
             type=str,
             choices=['email', 'sms', 'push', 'all'],
             default='all',
-            help='Type of reminder to send',
+            help='Type of reminder to send; schedules only move on to the next day with all',
+        )
+        parser.add_argument(
+            '--log-batch-size',
+            type=int,
+            default=None,
+            help='Number of ReminderLog rows written per INSERT (default: REMINDER_LOG_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--lead',
+            type=int,
+            default=5,
+            help='Send reminders scheduled up to this many minutes from now',
+        )
+        parser.add_argument(
+            '--shard',
+            type=parse_shard,
+            default=(0, 1),
+            help='Only handle users whose id modulo N is i, given as i/N (0 <= i < N); '
+                 'run one process per shard to split a window without overlap',
+        )
+        parser.add_argument(
+            '--run-id',
+            type=str,
+            help='Label shared by the shards of one window in reminder_runs; required with --shard '
+                 'i/N for N > 1 (default: start minute, UTC)',
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60,
+            help='Reminders missed by more than this many minutes are skipped and rescheduled',
+        )
+        parser.add_argument(
+            '--database',
+            choices=list(settings.DATABASES),
+            default=None,
+            help='Database to scan for due recipients, e.g. a read replica (default: the primary); '
+                 'everything else uses the primary',
         )
 
     def handle(self, *args, **options):
+        started_at = timezone.now()
+        shard_index, shard_count = options['shard']
+        # Shards started on either side of a minute would get different default labels
+        if shard_count > 1 and not options['run_id']:
+            raise CommandError('--run-id is required with --shard, so reminder_runs can add up the shards')
+        self.run = ReminderRun.objects.create(
+            run_id=options['run_id'] or started_at.strftime('%Y-%m-%dT%H:%MZ'),
+            shard_index=shard_index,
+            shard_count=shard_count,
+            host=default_worker_id(),
+            started_at=started_at,
+        )
+        
+        self.work_set_queries = QueryCounter()
+        total_queries = QueryCounter()
+        with connection.execute_wrapper(total_queries), \
+                ReminderLogBuffer(options['log_batch_size']) as self.log_buffer:
+            total_sent = self.send_reminders(options)
+        
+        self.run.finished_at = timezone.now()
+        self.run.save()
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully sent {total_sent} reminders')
+        )
+        # Work set queries sent to a replica weren't seen on the primary's connection
+        if (options['database'] or DEFAULT_DB_ALIAS) != DEFAULT_DB_ALIAS:
+            total_queries.count += self.work_set_queries.count
+        self.stdout.write(
+            f'Database queries issued: {total_queries.count} '
+            f'({self.work_set_queries.count} to build the work set)'
+        )
+    
+    def local_days(self, users, window_start, window_end):
+        """{date: Q} selecting the users whose reminder falls on that date in their own time zone.
+        
+        A reminder is about the tasks of the user's local day, which for a
+        09:00 reminder in Tokyo or Honolulu is not the UTC date of the run.
+        Each time zone of the due users covers one or two local dates of the
+        window, and the users of a date are selected by time zone and the
+        range of next_reminder_at that falls on it, so no ids are listed.
+        """
+        days = {}
+        for time_zone in users.order_by().values_list('profile__time_zone', flat=True).distinct():
+            tz = ZoneInfo(time_zone)
+            day = window_start.astimezone(tz).date()
+            while day <= window_end.astimezone(tz).date():
+                due_on_day = Q(
+                    profile__time_zone=time_zone,
+                    profile__next_reminder_at__gte=datetime.combine(day, time.min, tzinfo=tz),
+                    profile__next_reminder_at__lt=datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz),
+                )
+                days[day] = days[day] | due_on_day if day in days else due_on_day
+                day += timedelta(days=1)
+        return days
+    
+    def get_work_set(self, users, today):
+        """Users with tasks due on `today`, with profiles joined and tasks prefetched.
+        
+        Recurring tasks due today that have no row yet are added to
+        todays_tasks, so users whose only tasks today recur are included.
+        """
+        todays_tasks = Task.objects.filter(due_date=today)
+        due_rules = RecurrenceRule.objects.filter(next_occurrence__lte=today)
+        work_set = list(
+            users
+            .filter(Exists(todays_tasks.filter(user=OuterRef('pk'))) | Exists(due_rules.filter(user=OuterRef('pk'))))
+            .select_related('profile')
+            .prefetch_related(Prefetch('tasks', queryset=todays_tasks, to_attr='todays_tasks'))
+        )
+        # A subquery rather than the recipients' ids, which could exceed the database's parameter limit
+        occurrences = pending_occurrences(due_rules.filter(user__in=users.values('pk')), today)
+        for user in work_set:
+            user.todays_tasks += occurrences.get(user.id, [])
+        # A rule that was only behind schedule may have no occurrence today
+        return [user for user in work_set if user.todays_tasks]
+    
+    def advance_schedules(self, profile_ids, window_end, now):
+        """Move each profile's next_reminder_at past both `now` and its current slot.
+        
+        The ids may come from a replica, but the rows are read again on the
+        primary under a row lock, so a schedule the user just changed is
+        never overwritten with a replica's stale copy. Profiles that are no
+        longer due there are left alone.
+        """
+        with use_primary():
+            for start in range(0, len(profile_ids), 500):
+                with transaction.atomic():
+                    batch = list(
+                        UserProfile.objects.select_for_update()
+                        .filter(id__in=profile_ids[start:start + 500], next_reminder_at__lte=window_end)
+                        .only('id', 'reminder_time', 'time_zone', 'next_reminder_at')
+                    )
+                    for profile in batch:
+                        profile.schedule_next_reminder(max(now, profile.next_reminder_at))
+                    UserProfile.objects.bulk_update(batch, ['next_reminder_at'])
+    
+    def send_reminders(self, options):
         users = User.objects.all()
+        profiles = UserProfile.objects.all()
         
         if options['user']:
             users = users.filter(username=options['user'])
+            profiles = profiles.filter(user__username=options['user'])
         
-        # Filter users who should receive reminders at this time
-        current_time = timezone.now().time()
-        users = users.filter(
-            profile__reminder_time__hour=current_time.hour,
-            profile__reminder_time__minute__lte=current_time.minute + 5,
-            profile__reminder_time__minute__gte=current_time.minute - 5
-        )
+        # Keep to this process's shard of the users
+        shard_index, shard_count = options['shard']
+        if shard_count > 1:
+            users = users.annotate(shard=Mod('id', shard_count)).filter(shard=shard_index)
+            profiles = profiles.annotate(shard=Mod('user_id', shard_count)).filter(shard=shard_index)
+        
+        # Filter users whose next reminder falls in the current window
+        now = timezone.now()
+        window_start = now - timedelta(minutes=options['grace'])
+        window_end = now + timedelta(minutes=options['lead'])
+        users = users.filter(profile__next_reminder_at__range=(window_start, window_end))
         
         reminder_type = options['type']
         total_sent = 0
+        dispatcher = ReminderDispatcher()
         
-        for user in users:
+        # One work set per local date the due users' reminders fall on
+        scan_database = options['database'] or DEFAULT_DB_ALIAS
+        work_set = []
+        with connections[scan_database].execute_wrapper(self.work_set_queries), read_from(scan_database):
+            for day, due_on_day in self.local_days(users, window_start, window_end).items():
+                for user in self.get_work_set(users.filter(due_on_day), day):
+                    user.reminder_date = day
+                    work_set.append(user)
+        
+        # Reminders due based on user preferences
+        sends = []
+        for user in work_set:
+            if reminder_type in ['email', 'all'] and user.profile.email_reminders:
+                sends.append((user, 'email', user.todays_tasks))
+            
+            if reminder_type in ['sms', 'all'] and user.profile.sms_reminders:
+                sends.append((user, 'sms', user.todays_tasks))
+            
+            if reminder_type in ['push', 'all'] and user.profile.push_reminders:
+                sends.append((user, 'push', user.todays_tasks))
+        
+        # Drop sends another run (or send_reminder_now) already made with the same content
+        sends_by_day = {}
+        for send in sends:
+            sends_by_day.setdefault(send[0].reminder_date, []).append(send)
+        claims = {}
+        for day, day_sends in sends_by_day.items():
+            claims.update(claim_deliveries(day_sends, day))
+        duplicates = 0
+        duplicate_users = {}
+        unsent = []
+        for user, channel, tasks in sends:
+            if (user.id, channel) not in claims:
+                duplicates += 1
+                duplicate_users.setdefault(user.reminder_date, set()).add(user.id)
+                continue
             try:
-                # Get today's tasks
-                today = timezone.now().date()
-                tasks = Task.objects.filter(user=user, due_date=today)
-                
-                if not tasks.exists():
-                    continue
-                
-                # Send reminders based on user preferences
-                if reminder_type in ['email', 'all'] and user.profile.email_reminders:
-                    success = NotificationService.send_email_reminder(user, tasks)
-                    self.log_reminder(user, 'email', success)
-                    if success:
-                        total_sent += 1
-                
-                if reminder_type in ['sms', 'all'] and user.profile.sms_reminders:
-                    success = NotificationService.send_sms_reminder(user, tasks)
-                    self.log_reminder(user, 'sms', success)
-                    if success:
-                        total_sent += 1
-                
-                if reminder_type in ['push', 'all'] and user.profile.push_reminders:
-                    success = NotificationService.send_push_notification(user, tasks)
-                    self.log_reminder(user, 'push', success)
-                    if success:
-                        total_sent += 1
-                        
+                dispatcher.submit(user, channel, tasks)
             except Exception as e:
                 logger.error(f"Error sending reminder to {user.username}: {str(e)}")
-                self.log_reminder(user, reminder_type, False, str(e))
+                self.log_reminder(user, channel, False, str(e))
+                unsent.append(claims[(user.id, channel)])
         
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully sent {total_sent} reminders')
-        )
+        skipped = []
+        delivered = []
+        failed = len(unsent)
+        for user, channel, success, error_message in dispatcher.results():
+            if success is None:
+                self.log_reminder(user, channel, False, error_message, skipped=True)
+                skipped.append((user, channel))
+            else:
+                self.log_reminder(user, channel, success, error_message)
+            if success:
+                total_sent += 1
+                delivered.append(claims[(user.id, channel)])
+            else:
+                failed += success is False
+                unsent.append(claims[(user.id, channel)])
+        
+        # Hold sent reminders for the whole deduplication window, and let
+        # retries of failed and postponed sends through
+        confirm_deliveries(delivered)
+        release_deliveries(unsent)
+        
+        # Hand sends skipped by an open circuit to the reminder worker
+        self.queue_retries(skipped)
+        
+        if duplicates:
+            self.stdout.write(f'Skipped {duplicates} duplicate reminders')
+        
+        NotificationService.forget_fcm_tokens(dispatcher.invalid_fcm_tokens)
+        
+        # Reschedule every profile that was due, including missed and skipped ones.
+        # Due profiles are found in the scanned database, so ones a lagging
+        # replica didn't have yet stay due for the next run. The schedule is
+        # shared by all channels, so a single-channel run leaves it alone
+        # rather than dropping today's reminders on the other channels.
+        if reminder_type == 'all':
+            # Sends still claimed by a run that may have died are retried once
+            # the claim lapses, so those users stay due
+            in_flight = set()
+            for day, user_ids in duplicate_users.items():
+                in_flight |= unconfirmed_claims(user_ids, day)
+            with read_from(scan_database):
+                due_profiles = profiles.filter(next_reminder_at__lte=window_end).exclude(user_id__in=in_flight)
+                due_profiles = list(due_profiles.values_list('id', flat=True))
+            self.advance_schedules(due_profiles, window_end, now)
+        else:
+            self.stdout.write(f'Schedules not advanced: only {reminder_type} reminders were sent')
+        
+        prune_events()
+        registry.flush()
+        
+        for channel, stats in dispatcher.stats.items():
+            if stats.attempted:
+                self.stdout.write(
+                    f'{channel}: {stats.sent} sent, {stats.failed} failed, {stats.skipped} skipped '
+                    f'in {stats.elapsed:.2f}s ({stats.throughput:.1f}/s)'
+                )
+        
+        self.run.users = len(work_set)
+        self.run.sent = total_sent
+        self.run.failed = failed
+        self.run.skipped = len(skipped)
+        self.run.duplicates = duplicates
+        self.run.channel_stats = {
+            channel: {'sent': stats.sent, 'failed': stats.failed, 'skipped': stats.skipped, 'elapsed': round(stats.elapsed, 3)}
+            for channel, stats in dispatcher.stats.items() if stats.attempted
+        }
+        
+        return total_sent
+    
+    def queue_retries(self, skipped):
+        """Queue a ReminderJob per skipped send, due once its circuit may have closed"""
+        now = timezone.now()
+        max_attempts = getattr(settings, 'REMINDER_JOB_MAX_ATTEMPTS', 3)
+        ReminderJob.objects.bulk_create([
+            ReminderJob(
+                user=user,
+                reminder_type=channel,
+                max_attempts=max_attempts,
+                run_after=now + timedelta(seconds=get_provider_guard(channel).breaker.retry_after()),
+            )
+            for user, channel in skipped
+        ], batch_size=500)
     
-    def log_reminder(self, user, reminder_type, success, error_message=None):
+    def log_reminder(self, user, reminder_type, success, error_message=None, skipped=False):
         """Log reminder attempt"""
-        ReminderLog.objects.create(
-            user=user,
-            reminder_type=reminder_type,
-            success=success,
-            error_message=error_message
-        )
\ No newline at end of file
+        self.log_buffer.add(user, reminder_type, success, error_message, skipped)
\ No newline at end of file
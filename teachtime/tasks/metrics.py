@@ -0,0 +1,321 @@
+import bisect
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import timedelta
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'VIEW_SAMPLE_RATE': 0.1,
+    'FLUSH_INTERVAL': 30,
+    'RETENTION': 24 * 3600,
+    'TOKEN': None,
+}
+
+# MetricsSnapshot holding the summed totals of processes that went away
+RETIRED_PROCESS = 'retired'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+METRICS = {
+    'teachtime_http_requests_total': ('counter', 'Requests handled, by view, method and status'),
+    'teachtime_http_request_duration_seconds': ('histogram', 'Latency of sampled requests'),
+    'teachtime_http_request_queries': ('histogram', 'Database queries per sampled request'),
+    'teachtime_http_request_db_seconds': ('histogram', 'Database time per sampled request'),
+    'teachtime_provider_calls_total': ('counter', 'Notification provider calls, by channel and outcome'),
+    'teachtime_provider_call_duration_seconds': ('histogram', 'Latency of notification provider calls'),
+}
+
+BUCKETS = {
+    'teachtime_http_request_duration_seconds': LATENCY_BUCKETS,
+    'teachtime_http_request_queries': QUERY_BUCKETS,
+    'teachtime_http_request_db_seconds': LATENCY_BUCKETS,
+    'teachtime_provider_call_duration_seconds': LATENCY_BUCKETS,
+}
+
+
+def get_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, 'METRICS', {})}
+
+
+class Registry:
+    """Counters and histograms of this process, flushed to MetricsSnapshot.
+
+    Series are keyed by (metric name, sorted label items). Recording takes
+    one lock and a dict update, cheap enough for every request and send.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}  # key -> [bucket counts..., +Inf count, sum]
+        self.last_flush = time.monotonic()
+        self.pid = None
+    
+    @property
+    def process(self):
+        # A token per process, so a reused pid starts a new snapshot instead of
+        # overwriting (and lowering) the totals of the process that had it
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.process_name = f"{socket.gethostname()}:{self.pid}:{uuid.uuid4().hex[:8]}"
+        return self.process_name
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = BUCKETS[name]
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(buckets) + 2)
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+    def flush(self):
+        """Save this process's totals so /metrics and metrics_report see them"""
+        from .models import MetricsSnapshot
+        self.last_flush = time.monotonic()
+        MetricsSnapshot.objects.update_or_create(process=self.process, defaults={'data': self.snapshot()})
+        retire_snapshots(timezone.now() - timedelta(seconds=get_config()['RETENTION']))
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= get_config()['FLUSH_INTERVAL']:
+            self.flush()
+
+
+registry = Registry()
+
+
+def merge_data(snapshots):
+    """Sum snapshot data into (counters, histograms) keyed by (name, labels)"""
+    counters = {}
+    histograms = {}
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in data['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], series)]
+            else:
+                histograms[key] = list(series)
+    return counters, histograms
+
+
+def retire_snapshots(cutoff):
+    """Fold the snapshots of processes silent since cutoff into the retired row.
+
+    Their totals stay in the merged counters, so a process going away
+    never makes a counter go down, which Prometheus would read as a reset.
+    """
+    from .models import MetricsSnapshot
+    with transaction.atomic():
+        expired = list(
+            MetricsSnapshot.objects.select_for_update()
+            .filter(updated_at__lt=cutoff)
+            .exclude(process=RETIRED_PROCESS)
+        )
+        if not expired:
+            return
+        retired, _ = MetricsSnapshot.objects.select_for_update().get_or_create(
+            process=RETIRED_PROCESS, defaults={'data': {'counters': [], 'histograms': []}},
+        )
+        counters, histograms = merge_data([retired.data] + [snapshot.data for snapshot in expired])
+        retired.data = {
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, dict(labels), series] for (name, labels), series in histograms.items()],
+        }
+        retired.save()
+        MetricsSnapshot.objects.filter(id__in=[snapshot.id for snapshot in expired]).delete()
+
+
+def merged_snapshots():
+    """Sum the saved snapshots of every process, live or retired, into (counters, histograms) keyed by (name, labels)"""
+    from .models import MetricsSnapshot
+    return merge_data(MetricsSnapshot.objects.values_list('data', flat=True))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def render_prometheus(counters, histograms):
+    """Prometheus text exposition format of merged metrics"""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            continue
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS[name] + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {series[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_quantile(name, series, q):
+    """Estimate quantile q from bucket counts by interpolating inside the bucket"""
+    buckets = BUCKETS[name]
+    total = sum(series[:-1])
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(series[:-1]):
+        if cumulative + count >= rank and count:
+            if i == len(buckets):
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+# Query stats of the sampled request running in this context, if any
+current_queries = ContextVar('current_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; only times sampled requests"""
+    stats = current_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+class QueryCounter:
+    """Execute wrapper that counts the queries it sees, for connection.execute_wrapper()"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver, so queries made from sync_to_async threads are seen too"""
+    if record_query not in connection.execute_wrappers:
+        # Outermost, so it can't be popped by an execute_wrapper() block that was open when the connection was made
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class MetricsMiddleware:
+    """Count every request and, for a sampled share, record latency and DB work"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections opened before the first request (e.g. at startup) need it too
+        install_query_recorder(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.config['ENABLED']:
+            return self.get_response(request)
+        sample = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(sample)
+        self.finish(request, response, sample)
+        registry.maybe_flush()
+        return response
+
+    async def __acall__(self, request):
+        if not self.config['ENABLED']:
+            return await self.get_response(request)
+        sample = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(sample)
+        self.finish(request, response, sample)
+        if time.monotonic() - registry.last_flush >= self.config['FLUSH_INTERVAL']:
+            await sync_to_async(registry.flush)()
+        return response
+
+    def start(self):
+        if random.random() >= self.config['VIEW_SAMPLE_RATE']:
+            return None
+        stats = [0, 0.0]
+        return stats, current_queries.set(stats), time.perf_counter()
+
+    def stop(self, sample):
+        if sample is not None:
+            current_queries.reset(sample[1])
+
+    def finish(self, request, response, sample):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.inc('teachtime_http_requests_total', {
+            'view': view,
+            'method': request.method,
+            'status': str(response.status_code),
+        })
+        if sample is None:
+            return
+        stats, token, started = sample
+        labels = {'view': view}
+        registry.observe('teachtime_http_request_duration_seconds', labels, time.perf_counter() - started)
+        registry.observe('teachtime_http_request_queries', labels, stats[0])
+        registry.observe('teachtime_http_request_db_seconds', labels, stats[1])
+
+
+def record_provider_call(channel, outcome, duration=None):
+    """Count a notification provider call and, if it was made, its latency"""
+    if not get_config()['ENABLED']:
+        return
+    registry.inc('teachtime_provider_calls_total', {'channel': channel, 'outcome': outcome})
+    if duration is not None:
+        registry.observe('teachtime_provider_call_duration_seconds', {'channel': channel}, duration)
@@ -0,0 +1,133 @@
+from functools import partial
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from teachtime.routers import choose_replica, get_replicas, read_alias, use_primary
+from .cache import get_cached_user_and_profile
+from .models import UserProfile
+
+
+def load_user_and_profile(request):
+    """The session's (user, profile), or (AnonymousUser, None), with no queries on a warm cache"""
+    try:
+        user_id = get_user_model()._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser(), None
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request), None
+
+    def load():
+        # From the primary: a lagging replica would put stale rows in the cache
+        with use_primary():
+            user = auth.get_user(request)
+            if not user.is_authenticated:
+                return None
+            profile, created = UserProfile.objects.get_or_create(user=user)
+        return user, profile
+
+    pair = get_cached_user_and_profile(user_id, load)
+    if pair is None:
+        return AnonymousUser(), None
+    user, profile = pair
+
+    # The check auth.get_user() makes, so a password change still ends other sessions
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        user = auth.get_user(request)
+        if not user.is_authenticated:
+            return user, None
+        profile, created = UserProfile.objects.get_or_create(user=user)
+    return user, profile
+
+
+def get_user_and_profile(request):
+    if not hasattr(request, '_cached_user_and_profile'):
+        request._cached_user_and_profile = load_user_and_profile(request)
+    return request._cached_user_and_profile
+
+
+async def auser(request):
+    user, profile = await sync_to_async(get_user_and_profile)(request)
+    return user
+
+
+async def aprofile(request):
+    user, profile = await sync_to_async(get_user_and_profile)(request)
+    return profile
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware serving request.user and request.profile from the cache.
+
+    Both are loaded lazily as one cached pair per user, invalidated by
+    bumping the user's cache version whenever the User or UserProfile is
+    saved (see tasks.signals). Bulk updates skip those signals, so views
+    saving the cached profile must pass update_fields. Async views use
+    `await request.auser()` and `await request.aprofile()`.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user_and_profile(request)[0])
+        request.profile = SimpleLazyObject(lambda: get_user_and_profile(request)[1])
+        request.auser = partial(auser, request)
+        request.aprofile = partial(aprofile, request)
+
+
+class ReplicaRoutingMiddleware:
+    """Send the reads of safe requests to a read replica, except right after the client's own writes.
+    
+    An unsafe request (POST, ...) reads and writes the primary and sets a
+    cookie that keeps the client's reads on the primary for
+    REPLICA_STICKY_SECONDS, longer than replication lag, so users always
+    see their own changes. Does nothing when DATABASE_REPLICAS is empty.
+    """
+    
+    cookie_name = 'read_primary'
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = read_alias.set(self.choose_database(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        return self.stick(request, response)
+    
+    async def __acall__(self, request):
+        token = read_alias.set(self.choose_database(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        return self.stick(request, response)
+    
+    def choose_database(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') or self.cookie_name in request.COOKIES:
+            return None
+        return choose_replica()
+    
+    def stick(self, request, response):
+        if get_replicas() and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
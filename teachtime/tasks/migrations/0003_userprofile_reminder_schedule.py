@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:58
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_existing_profiles(apps, schema_editor):
+    UserProfile = apps.get_model('tasks', 'UserProfile')
+    now = timezone.now()
+    profiles = list(UserProfile.objects.filter(next_reminder_at__isnull=True))
+    for profile in profiles:
+        local_now = now.astimezone(ZoneInfo(profile.time_zone))
+        fire_at = datetime.combine(local_now.date(), profile.reminder_time, tzinfo=local_now.tzinfo)
+        if fire_at <= local_now:
+            fire_at += timedelta(days=1)
+        profile.next_reminder_at = fire_at.astimezone(dt_timezone.utc)
+    UserProfile.objects.bulk_update(profiles, ['next_reminder_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_reminderlog_userprofile_task_due_date_alter_task_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='time_zone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+        migrations.RunPython(schedule_existing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
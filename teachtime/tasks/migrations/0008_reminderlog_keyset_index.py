@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_task_position'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='reminderlog',
+            options={'ordering': ['-sent_at', '-id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='reminderlog',
+            name='tasks_log_user_sent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='reminderlog',
+            index=models.Index(fields=['user', '-sent_at', '-id'], name='tasks_log_user_sent_id_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_dashboardstream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderdelivery',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='reminderdelivery',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('duplicate', 'Duplicate'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_delivery_confirmation'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_task_user_due_idx',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'due_date', 'position', '-created_at', 'completed'], name='tasks_task_user_due_idx'),
+        ),
+    ]
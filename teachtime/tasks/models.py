@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -10,10 +12,69 @@ class UserProfile(models.Model):
     sms_reminders = models.BooleanField(default=False)
     push_reminders = models.BooleanField(default=True)
     reminder_time = models.TimeField(default='08:00')  # Daily reminder time
+    time_zone = models.CharField(max_length=64, default='UTC')  # IANA name reminder_time is local to
+    next_reminder_at = models.DateTimeField(blank=True, null=True, db_index=True)  # Next fire time (UTC)
     buffer_time = models.FloatField(default=2.0)
     
     def __str__(self):
         return f"{self.user.username}'s Profile"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        profile = super().from_db(db, field_names, values)
+        # What the schedule was computed from, so save() can tell when it moved
+        profile._loaded_schedule = profile.schedule_inputs()
+        return profile
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_schedule = self.schedule_inputs()
+    
+    def schedule_inputs(self):
+        """(reminder_time, time_zone) as loaded or set; None for a deferred field"""
+        reminder_time = self.__dict__.get('reminder_time')
+        if reminder_time is not None:
+            reminder_time = self._meta.get_field('reminder_time').to_python(reminder_time)
+        return reminder_time, self.__dict__.get('time_zone')
+    
+    def schedule_changed(self):
+        """True if reminder_time or time_zone changed since the profile was loaded"""
+        loaded = getattr(self, '_loaded_schedule', None)
+        if loaded is None:
+            return False
+        return any(
+            current is not None and current != before
+            for current, before in zip(self.schedule_inputs(), loaded)
+        )
+    
+    def save(self, *args, **kwargs):
+        # Edits from anywhere (admin, shell, fixtures) move the next fire time
+        if self.next_reminder_at is None or self.schedule_changed():
+            self.schedule_next_reminder()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'next_reminder_at' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'next_reminder_at']
+        super().save(*args, **kwargs)
+        self._loaded_schedule = self.schedule_inputs()
+    
+    def get_next_reminder_at(self, after):
+        """First UTC instant after `after` when the local reminder_time is reached"""
+        tz = ZoneInfo(self.time_zone)
+        reminder_time = self._meta.get_field('reminder_time').to_python(self.reminder_time)
+        local_after = after.astimezone(tz)
+        fire_at = datetime.combine(local_after.date(), reminder_time, tzinfo=tz)
+        if fire_at <= local_after:
+            fire_at = datetime.combine(local_after.date() + timedelta(days=1), reminder_time, tzinfo=tz)
+        return fire_at.astimezone(dt_timezone.utc)
+    
+    def local_date(self, at=None):
+        """The user's date at `at` (default: now), in their time zone"""
+        return (at or timezone.now()).astimezone(ZoneInfo(self.time_zone)).date()
+    
+    def schedule_next_reminder(self, after=None):
+        """Set next_reminder_at to the next fire time after `after` (default: now)"""
+        self.next_reminder_at = self.get_next_reminder_at(after or timezone.now())
+        return self.next_reminder_at
 
 class Task(models.Model):
     PRIORITY_CHOICES = [
@@ -35,15 +96,37 @@ class Task(models.Model):
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
     category = models.CharField(max_length=10, choices=CATEGORY_CHOICES, default='personal')
     completed = models.BooleanField(default=False)
+    position = models.PositiveIntegerField(default=0)  # Manual order on the dashboard
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     due_date = models.DateField(default=timezone.now)
+    # Set when this row is a materialized occurrence of a recurring task
+    recurrence = models.ForeignKey('RecurrenceRule', on_delete=models.SET_NULL, blank=True, null=True, related_name='occurrences')
     
     class Meta:
-        ordering = ['-created_at']
+        indexes = [
+            # Dashboard (filter and order, see views.dashboard_tasks), today's summary and
+            # send_reminders. completed comes last: completed=False is written as
+            # NOT completed, which can't narrow an index column, so ahead of the
+            # order columns it would force a sort.
+            models.Index(fields=['user', 'due_date', 'position', '-created_at', 'completed'], name='tasks_task_user_due_idx'),
+            # Admin changelist ordering
+            models.Index(fields=['-created_at'], name='tasks_task_created_idx'),
+        ]
+        constraints = [
+            # An occurrence is materialized at most once
+            models.UniqueConstraint(fields=['recurrence', 'due_date'], name='tasks_task_occurrence_unique'),
+        ]
     
     def __str__(self):
         return f"{self.text} ({self.get_priority_display()})"
+    
+    @property
+    def occurrence(self):
+        """'<rule id>:<date>' for occurrences of a recurring task, materialized or not"""
+        if self.recurrence_id is None:
+            return None
+        return f"{self.recurrence_id}:{self.due_date.isoformat()}"
 
 class ReminderLog(models.Model):
     REMINDER_TYPES = [
@@ -56,11 +139,250 @@ class ReminderLog(models.Model):
     reminder_type = models.CharField(max_length=10, choices=REMINDER_TYPES)
     sent_at = models.DateTimeField(auto_now_add=True)
     success = models.BooleanField(default=False)
+    skipped = models.BooleanField(default=False)  # Not attempted because the provider circuit was open
+    error_message = models.TextField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-sent_at', '-id']
+        indexes = [
+            # A user's reminder history, newest first; id breaks ties for keyset paging
+            models.Index(fields=['user', '-sent_at', '-id'], name='tasks_log_user_sent_id_idx'),
+            # Admin changelist ordering and date filter
+            models.Index(fields=['-sent_at'], name='tasks_log_sent_idx'),
+        ]
+    
+    def __str__(self):
+        status = "✓" if self.success else ("–" if self.skipped else "✗")
+        return f"{status} {self.get_reminder_type_display()} to {self.user.username}"
+
+class ReminderJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('duplicate', 'Duplicate'),  # Not sent: the same reminder already went out
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminder_jobs')
+    reminder_type = models.CharField(max_length=10, choices=ReminderLog.REMINDER_TYPES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # Not claimed before this time
+    locked_by = models.CharField(max_length=100, blank=True, null=True)  # Worker holding the job
+    locked_at = models.DateTimeField(blank=True, null=True)
+    success = models.BooleanField(default=False)
     error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='tasks_job_status_run_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_reminder_type_display()} job for {self.user.username} ({self.status})"
+
+
+class DashboardEvent(models.Model):
+    """Dashboard update waiting to be streamed, for the database event backend"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dashboard_events')
+    kind = models.CharField(max_length=30)  # e.g. task.updated, reminder.sent
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Pruned after DASHBOARD_EVENTS['RETENTION']
+    
+    class Meta:
+        indexes = [
+            # Streams poll for a user's events after the last id they sent
+            models.Index(fields=['user', 'id'], name='tasks_event_user_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} for {self.user.username}"
+
+class DashboardStream(models.Model):
+    """An open dashboard event stream, for the database event backend.
+    
+    Publishers skip storing events for users without one, e.g. most
+    recipients of a send_reminders run.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dashboard_streams')
+    expires_at = models.DateTimeField()  # Renewed while the stream is open, so streams of a crashed server lapse
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='tasks_stream_user_exp_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Dashboard stream of {self.user.username}"
+
+class ReminderDelivery(models.Model):
+    """Reminder content claimed for sending to a user on a channel, used to drop duplicate sends"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminder_deliveries')
+    channel = models.CharField(max_length=10, choices=ReminderLog.REMINDER_TYPES)
+    date = models.DateField()  # Day of the tasks the reminder was about
+    content_hash = models.CharField(max_length=64)  # sha256 of the tasks in the reminder
+    claimed_at = models.DateTimeField()
+    sent_at = models.DateTimeField(blank=True, null=True)  # Set once the send went out; claims never confirmed lapse
+    claim = models.CharField(max_length=32, db_index=True)  # Token of the run that claimed the send
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'channel', 'date', 'content_hash'], name='tasks_delivery_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_channel_display()} reminder for {self.user.username} on {self.date}"
+
+
+class MetricsSnapshot(models.Model):
+    """Latest metric totals of one web or command process, merged by /metrics and metrics_report"""
+    process = models.CharField(max_length=255, unique=True)  # host:pid:token, or 'retired' for processes that went away
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    def __str__(self):
+        return self.process
+
+class ReminderRun(models.Model):
+    """One send_reminders process's pass over a reminder window, or one shard of it"""
+    run_id = models.CharField(max_length=64, db_index=True)  # Shared by all shards of a window
+    shard_index = models.PositiveIntegerField(default=0)
+    shard_count = models.PositiveIntegerField(default=1)
+    host = models.CharField(max_length=255)  # host:pid
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(blank=True, null=True)  # Null while running or if the run crashed
+    users = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)  # Postponed because a provider circuit was open
+    duplicates = models.PositiveIntegerField(default=0)
+    channel_stats = models.JSONField(default=dict)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Run {self.run_id} shard {self.shard_index}/{self.shard_count}"
+
+class RecurrenceRule(models.Model):
+    """A task that repeats, e.g. every Sunday.
+    
+    Occurrences are not stored ahead of time: tasks.recurrence builds them
+    as unsaved Tasks for the day being viewed, and only an occurrence that
+    is completed or edited gets a Task row (linked back via recurrence).
+    Deleted occurrences are listed in excluded_dates. next_occurrence is
+    the first occurrence not yet in the past; it is advanced lazily, and
+    the index on it keeps the rules due today cheap to find.
+    """
+    FREQUENCY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurrences')
+    text = models.CharField(max_length=255)
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES, default='medium')
+    category = models.CharField(max_length=10, choices=Task.CATEGORY_CHOICES, default='personal')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    interval = models.PositiveIntegerField(default=1)  # Every `interval` days, weeks or months
+    weekdays = models.CharField(max_length=13, blank=True)  # Weekly only: e.g. "0,6" for Monday and Sunday; blank means start_date's weekday
+    start_date = models.DateField(default=timezone.now)
+    end_date = models.DateField(blank=True, null=True)
+    excluded_dates = models.JSONField(default=list, blank=True)  # ISO dates of deleted occurrences
+    next_occurrence = models.DateField(blank=True, null=True)  # None once the rule has ended
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Rules with an occurrence due by a given day, per user (dashboard) or for many users (send_reminders)
+            models.Index(fields=['user', 'next_occurrence'], name='tasks_rule_user_next_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.text} ({self.get_frequency_display()})"
+    
+    def save(self, *args, **kwargs):
+        if isinstance(self.start_date, datetime):
+            # The default, timezone.now, gives a datetime until the row is reloaded
+            self.start_date = self.start_date.date()
+        # Edits may move the schedule, so recompute from today (or the start)
+        if kwargs.get('update_fields') is None:
+            self.next_occurrence = self.next_on_or_after(timezone.now().date())
+        super().save(*args, **kwargs)
+    
+    def get_weekdays(self):
+        if self.weekdays:
+            return {int(day) for day in self.weekdays.split(',')}
+        return {self.start_date.weekday()}
+    
+    def occurs_on(self, day):
+        """Whether the schedule has an occurrence on `day`, ignoring excluded_dates"""
+        if day < self.start_date or (self.end_date and day > self.end_date):
+            return False
+        if self.frequency == 'daily':
+            return (day - self.start_date).days % self.interval == 0
+        if self.frequency == 'weekly':
+            # Count whole weeks from the Monday of the start week
+            first_monday = self.start_date - timedelta(days=self.start_date.weekday())
+            weeks = (day - first_monday).days // 7
+            return day.weekday() in self.get_weekdays() and weeks % self.interval == 0
+        # Monthly on start_date's day of the month; months without that day are skipped
+        months = (day.year - self.start_date.year) * 12 + day.month - self.start_date.month
+        return day.day == self.start_date.day and months % self.interval == 0
+    
+    def next_on_or_after(self, day):
+        """First occurrence on or after `day`, or None if the rule ends before one"""
+        day = max(day, self.start_date)
+        # Every schedule repeats within this many days
+        for offset in range(366 * self.interval + 31):
+            candidate = day + timedelta(days=offset)
+            if self.end_date and candidate > self.end_date:
+                return None
+            if self.occurs_on(candidate):
+                return candidate
+        return None
+    
+    def build_occurrence(self, day):
+        """Unsaved Task for the occurrence on `day`"""
+        return Task(
+            user_id=self.user_id,
+            text=self.text,
+            priority=self.priority,
+            category=self.category,
+            due_date=day,
+            recurrence=self,
+        )
+    
+    def exclude(self, day):
+        """Stop showing the occurrence on `day`, e.g. after it was deleted"""
+        if day.isoformat() not in self.excluded_dates:
+            self.excluded_dates.append(day.isoformat())
+            self.save(update_fields=['excluded_dates'])
+
+class ReminderSummary(models.Model):
+    """Per user, channel and day counts of ReminderLog rows removed by compact_reminder_logs"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminder_summaries')
+    reminder_type = models.CharField(max_length=10, choices=ReminderLog.REMINDER_TYPES)
+    date = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
     
     class Meta:
-        ordering = ['-sent_at']
+        ordering = ['-date', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'reminder_type', 'date'], name='tasks_summary_unique'),
+        ]
+        indexes = [
+            # Reminder history and stats past the raw log retention, newest first
+            models.Index(fields=['user', '-date', '-id'], name='tasks_summary_user_date_idx'),
+        ]
     
     def __str__(self):
-        status = "✓" if self.success else "✗"
-        return f"{status} {self.get_reminder_type_display()} to {self.user.username}"
\ No newline at end of file
+        return f"{self.get_reminder_type_display()} to {self.user.username} on {self.date}: {self.succeeded}/{self.total}"
\ No newline at end of file
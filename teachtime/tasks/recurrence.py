@@ -0,0 +1,91 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from teachtime.routers import use_primary
+from .models import Task, RecurrenceRule
+
+# Rules per query, to stay under the database's parameter limit on large reminder runs
+BATCH_SIZE = 500
+
+
+def advance_rules(rules, day):
+    """Move next_occurrence of rules that fell behind `day` up to their next occurrence.
+
+    Excluded dates before `day` are dropped on the way, so the list only
+    holds dates that can still be shown. `rules` may have been read from a
+    lagging replica, so the behind rules are read again and updated on the
+    primary, under a row lock, and `rules` is brought up to date from
+    there; writing the replica's excluded dates back would revive deleted
+    occurrences. Returns `rules` without those deleted in the meantime.
+    """
+    stale = {rule.id: rule for rule in rules if rule.next_occurrence is not None and rule.next_occurrence < day}
+    if not stale:
+        return rules
+    with use_primary(), transaction.atomic():
+        stale_ids = list(stale)
+        fresh = []
+        for start in range(0, len(stale_ids), BATCH_SIZE):
+            fresh += RecurrenceRule.objects.select_for_update().filter(id__in=stale_ids[start:start + BATCH_SIZE])
+        behind = [rule for rule in fresh if rule.next_occurrence is not None and rule.next_occurrence < day]
+        for rule in behind:
+            rule.next_occurrence = rule.next_on_or_after(day)
+            rule.excluded_dates = [excluded for excluded in rule.excluded_dates if excluded >= day.isoformat()]
+        if behind:
+            RecurrenceRule.objects.bulk_update(behind, ['next_occurrence', 'excluded_dates'], batch_size=BATCH_SIZE)
+    fresh = {rule.id: rule for rule in fresh}
+    updated = []
+    for rule in rules:
+        if rule.id in fresh:
+            rule = fresh[rule.id]
+        elif rule.id in stale:
+            continue
+        updated.append(rule)
+    return updated
+
+
+def pending_occurrences(rules, day):
+    """Unsaved Tasks for occurrences of `rules` on `day` without a Task row yet, by user id.
+
+    `rules` is a RecurrenceRule queryset, e.g. one user's rules. Rules not
+    due by `day` are skipped in the index; the rest cost one query to
+    advance if they fell behind and one to find materialized occurrences,
+    per BATCH_SIZE rules.
+    """
+    rules = advance_rules(list(rules.filter(next_occurrence__lte=day)), day)
+    due = [rule for rule in rules if rule.next_occurrence == day and day.isoformat() not in rule.excluded_dates]
+    if not due:
+        return {}
+    materialized = set()
+    for start in range(0, len(due), BATCH_SIZE):
+        materialized.update(
+            Task.objects.filter(recurrence__in=due[start:start + BATCH_SIZE], due_date=day)
+            .values_list('recurrence_id', flat=True)
+        )
+    occurrences = {}
+    for rule in due:
+        if rule.id not in materialized:
+            occurrences.setdefault(rule.user_id, []).append(rule.build_occurrence(day))
+    return occurrences
+
+
+def parse_occurrence(value):
+    """Split an occurrence key '<rule id>:<date>' into (rule id, date), or None"""
+    if not isinstance(value, str) or ':' not in value:
+        return None
+    rule_id, day = value.split(':', 1)
+    try:
+        rule_id, day = int(rule_id), parse_date(day)
+    except ValueError:
+        return None
+    return (rule_id, day) if day else None
+
+
+def next_dates(rule, start, count):
+    """The next `count` occurrence dates of `rule` from `start`, skipping excluded ones"""
+    dates = []
+    day = rule.next_on_or_after(start)
+    while day is not None and len(dates) < count:
+        if day.isoformat() not in rule.excluded_dates:
+            dates.append(day)
+        day = rule.next_on_or_after(day + timedelta(days=1))
+    return dates
@@ -0,0 +1,178 @@
+import time
+import threading
+import logging
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from .metrics import record_provider_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER_LIMITS = {
+    'RATE': 10.0,             # Requests per second
+    'BURST': 10,              # Requests allowed back to back
+    'FAILURE_THRESHOLD': 5,   # Consecutive failures that open the breaker
+    'RESET_TIMEOUT': 60.0,    # Seconds before an open breaker lets a probe through
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+    def __init__(self, channel, retry_after):
+        super().__init__(f"{channel} provider unavailable, retry in {retry_after:.0f}s")
+        self.channel = channel
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker counting consecutive provider failures"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now.
+
+        Once the reset timeout has passed a single probe call is let through;
+        its outcome closes the breaker again or restarts the timeout.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self.retry_after() == 0:
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit for {self.name} half-open, probing provider")
+                return
+            raise CircuitOpenError(self.name, self.retry_after() or self.reset_timeout)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ProviderGuard:
+    """Rate limiter and circuit breaker in front of one notification channel"""
+
+    def __init__(self, channel, rate, burst, failure_threshold, reset_timeout):
+        self.channel = channel
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(channel, failure_threshold, reset_timeout)
+
+    def call(self, func, *args, is_failure=None, client_errors=(), **kwargs):
+        """Call func through the breaker and rate limiter.
+
+        Exceptions and results for which is_failure(result) is true count as
+        provider failures; client_errors are blamed on the request instead.
+        Raises CircuitOpenError without calling func while the breaker is
+        open.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            record_provider_call(self.channel, 'rejected')
+            raise
+        self.bucket.acquire()
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except client_errors:
+            record_provider_call(self.channel, 'client_error', time.monotonic() - started)
+            self.breaker.record_success()
+            raise
+        except Exception:
+            record_provider_call(self.channel, 'failure', time.monotonic() - started)
+            self.breaker.record_failure()
+            raise
+        if is_failure is not None and is_failure(result):
+            record_provider_call(self.channel, 'failure', time.monotonic() - started)
+            self.breaker.record_failure()
+        else:
+            record_provider_call(self.channel, 'success', time.monotonic() - started)
+            self.breaker.record_success()
+        return result
+
+
+def http_provider_failure(response):
+    """Responses that mean the provider itself is throttling or unhealthy"""
+    return response.status == 429 or response.status >= 500
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_provider_guard(channel):
+    """Process-wide guard for channel configured from settings.NOTIFICATION_PROVIDER_LIMITS"""
+    with _guards_lock:
+        if channel not in _guards:
+            options = dict(DEFAULT_PROVIDER_LIMITS)
+            options.update(getattr(settings, 'NOTIFICATION_PROVIDER_LIMITS', {}).get(channel, {}))
+            _guards[channel] = ProviderGuard(
+                channel,
+                rate=options['RATE'],
+                burst=options['BURST'],
+                failure_threshold=options['FAILURE_THRESHOLD'],
+                reset_timeout=options['RESET_TIMEOUT'],
+            )
+        return _guards[channel]
+
+
+@receiver(setting_changed)
+def reset_provider_guards(setting, **kwargs):
+    """Rebuild the guards with new limits when override_settings changes them"""
+    if setting == 'NOTIFICATION_PROVIDER_LIMITS':
+        with _guards_lock:
+            _guards.clear()
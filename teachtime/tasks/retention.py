@@ -0,0 +1,154 @@
+import gzip
+import os
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import ReminderLog, ReminderSummary
+from .transfer import REMINDER_FIELDS, export_lines
+
+ARCHIVE_FIELDS = ['user__username'] + REMINDER_FIELDS
+
+
+def retention_cutoff(days, now=None):
+    """Midnight UTC `days` days ago; whole days before it are compacted"""
+    today = (now or timezone.now()).astimezone(dt_timezone.utc).date()
+    return datetime.combine(today - timedelta(days=days), time.min, tzinfo=dt_timezone.utc)
+
+
+def summarise_logs(logs):
+    """{(user id, reminder type, UTC date): counts} of a ReminderLog queryset"""
+    rows = (
+        logs.order_by()
+        .values('user_id', 'reminder_type', day=TruncDate('sent_at', tzinfo=dt_timezone.utc))
+        .annotate(
+            total=Count('id'),
+            succeeded=Count('id', filter=Q(success=True)),
+            skipped=Count('id', filter=Q(skipped=True)),
+        )
+    )
+    return {
+        (row['user_id'], row['reminder_type'], row['day']): {
+            'total': row['total'],
+            'succeeded': row['succeeded'],
+            'failed': row['total'] - row['succeeded'] - row['skipped'],
+            'skipped': row['skipped'],
+        }
+        for row in rows
+    }
+
+
+def count_logs(logs):
+    """summarise_logs() counts of ReminderLog objects in memory, e.g. ones just imported"""
+    counts = {}
+    for log in logs:
+        sent_at = log.sent_at if timezone.is_aware(log.sent_at) else timezone.make_aware(log.sent_at)
+        key = (log.user_id, log.reminder_type, sent_at.astimezone(dt_timezone.utc).date())
+        values = counts.setdefault(key, {'total': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0})
+        values['total'] += 1
+        values['succeeded'] += bool(log.success)
+        values['skipped'] += bool(log.skipped)
+    for values in counts.values():
+        values['failed'] = values['total'] - values['succeeded'] - values['skipped']
+    return counts
+
+
+def add_to_summaries(counts):
+    """Add summarise_logs() counts to the ReminderSummary rows, creating missing ones"""
+    existing = {
+        (summary.user_id, summary.reminder_type, summary.date): summary
+        for summary in ReminderSummary.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, reminder_type, day in counts},
+            date__in={day for user_id, reminder_type, day in counts},
+        )
+    }
+    created = []
+    for key, values in counts.items():
+        summary = existing.get(key)
+        if summary is None:
+            user_id, reminder_type, day = key
+            created.append(ReminderSummary(user_id=user_id, reminder_type=reminder_type, date=day, **values))
+            continue
+        for field, value in values.items():
+            setattr(summary, field, getattr(summary, field) + value)
+    ReminderSummary.objects.bulk_create(created)
+    changed = [summary for key, summary in existing.items() if key in counts]
+    ReminderSummary.objects.bulk_update(changed, ['total', 'succeeded', 'failed', 'skipped'])
+
+
+def write_archive_member(archive, lines):
+    """Append `lines` to a binary file as one gzip member and make it durable.
+
+    Concatenated members read back as a single gzip stream, so the archive
+    stays valid after every batch even if the run is killed.
+    """
+    archive.write(gzip.compress(''.join(lines).encode('utf-8')))
+    archive.flush()
+    os.fsync(archive.fileno())
+
+
+def remove_from_summaries(counts):
+    """Take count_logs() counts of restored logs back out of their summaries.
+
+    Importing an archive brings back raw rows that compaction already
+    counted, so each summary gives up what was restored and is deleted
+    once empty; the next compaction counts the rows again. Days without
+    a summary are left alone, as nothing counted those rows yet.
+    """
+    summaries = ReminderSummary.objects.select_for_update().filter(
+        user_id__in={user_id for user_id, reminder_type, day in counts},
+        date__in={day for user_id, reminder_type, day in counts},
+    )
+    changed = []
+    emptied = []
+    for summary in summaries:
+        values = counts.get((summary.user_id, summary.reminder_type, summary.date))
+        if values is None:
+            continue
+        for field, value in values.items():
+            setattr(summary, field, max(getattr(summary, field) - value, 0))
+        if summary.total:
+            changed.append(summary)
+        else:
+            emptied.append(summary.id)
+    ReminderSummary.objects.bulk_update(changed, ['total', 'succeeded', 'failed', 'skipped'])
+    ReminderSummary.objects.filter(id__in=emptied).delete()
+
+
+def compact_batch(cutoff, batch_size, archive=None):
+    """Roll up to batch_size logs sent before cutoff into summaries and remove them.
+
+    Everything happens in one short transaction, so rows are never both
+    counted in a summary and still present. Removed rows are first
+    appended to the `archive` binary file, in export_data's NDJSON format,
+    as one complete gzip member that is fsynced before the delete commits;
+    a crash can therefore lose no archived row, but if the transaction
+    fails they may be written again by the next run. Returns the number
+    of rows removed.
+    """
+    with transaction.atomic():
+        ids = list(
+            ReminderLog.objects.filter(sent_at__lt=cutoff)
+            .order_by('sent_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        batch = ReminderLog.objects.filter(id__in=ids)
+        add_to_summaries(summarise_logs(batch))
+        if archive is not None:
+            write_archive_member(archive, export_lines(batch, ARCHIVE_FIELDS, 'ndjson', chunk_size=batch_size))
+        batch.delete()
+    return len(ids)
+
+
+def prune_summaries(cutoff, batch_size):
+    """Delete summaries of days before cutoff in batches; returns the number deleted"""
+    total = 0
+    while True:
+        ids = list(ReminderSummary.objects.filter(date__lt=cutoff.date()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        ReminderSummary.objects.filter(id__in=ids).delete()
+        total += len(ids)
@@ -1,48 +1,170 @@
-import urllib.request
 import urllib.parse
+import base64
+import functools
 import json
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+from .events import publish_events
+from .models import ReminderLog, UserProfile
+from .resilience import CircuitOpenError, get_provider_guard, http_provider_failure
+from .transport import get_transport
+import smtplib
 import logging
 
 logger = logging.getLogger(__name__)
 
+# FCM per-token errors meaning the registration token will never work again
+FCM_INVALID_TOKEN_ERRORS = {'NotRegistered', 'InvalidRegistration'}
+
+# SMTP errors caused by the recipient rather than the mail server
+EMAIL_RECIPIENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+@functools.lru_cache(maxsize=None)
+def basic_auth_header(username, password):
+    """HTTP Basic Authorization header value, encoded once per credential pair"""
+    credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return f'Basic {credentials}'
+
+def serialize_reminder_event(log):
+    return {
+        'type': log.reminder_type,
+        'label': log.get_reminder_type_display(),
+        'success': log.success,
+        'skipped': log.skipped,
+        'sent_at': log.sent_at.isoformat(),
+    }
+
+class ReminderLogBuffer:
+    """Collect ReminderLog rows and write them in batches with bulk_create.
+    
+    Use as a context manager so pending rows are flushed on exit, including
+    when the block raises. A batch_size of 1 writes every row through
+    immediately.
+    """
+    
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'REMINDER_LOG_BATCH_SIZE', 500)
+        self.pending = []
+    
+    def add(self, user, reminder_type, success, error_message=None, skipped=False):
+        self.pending.append(ReminderLog(
+            user=user,
+            reminder_type=reminder_type,
+            success=success,
+            skipped=skipped,
+            error_message=error_message
+        ))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all pending rows"""
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        ReminderLog.objects.bulk_create(rows, batch_size=self.batch_size)
+        # Stored only for users watching a dashboard, not a second row per log
+        publish_events(
+            ((row.user_id, 'reminder.sent', serialize_reminder_event(row)) for row in rows),
+            subscribed_only=True,
+        )
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
 class NotificationService:
     
     @staticmethod
-    def send_email_reminder(user, tasks):
-        """Send email reminder with daily tasks"""
+    def send(reminder_type, user, tasks):
+        """Send a reminder over the channel named by reminder_type"""
+        senders = {
+            'email': NotificationService.send_email_reminder,
+            'sms': NotificationService.send_sms_reminder,
+            'push': NotificationService.send_push_notification,
+        }
+        return senders[reminder_type](user, tasks)
+    
+    @staticmethod
+    def build_email_message(user, tasks, html_template, text_template, connection=None):
+        """Render the reminder email for one user from pre-loaded templates"""
+        subject = f"Daily Task Reminder - {user.first_name or user.username}"
+        
+        # Create email content
+        context = {
+            'user': user,
+            'tasks': tasks,
+            'incomplete_tasks': [t for t in tasks if not t.completed],
+            'completed_tasks': [t for t in tasks if t.completed],
+            'site_url': settings.SITE_URL
+        }
+        
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text_template.render(context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+            connection=connection,
+        )
+        email.attach_alternative(html_template.render(context), 'text/html')
+        return email
+    
+    @staticmethod
+    def send_email_batch(recipients):
+        """Send reminder emails to many (user, tasks) pairs over one connection.
+        
+        Templates are loaded once for the batch and each message is sent on
+        its own, so a bad address only fails that message. Returns a
+        (user, success, error_message) result per recipient in order, where
+        success is None for sends skipped because the circuit is open.
+        """
+        html_template = get_template('tasks/email_reminder.html')
+        text_template = get_template('tasks/email_reminder.txt')
+        connection = get_connection(fail_silently=False)
+        guard = get_provider_guard('email')
+        results = []
+        
         try:
-            subject = f"Daily Task Reminder - {user.first_name or user.username}"
-            
-            # Create email content
-            context = {
-                'user': user,
-                'tasks': tasks,
-                'incomplete_tasks': [t for t in tasks if not t.completed],
-                'completed_tasks': [t for t in tasks if t.completed],
-                'site_url': settings.SITE_URL
-            }
-            
-            message = render_to_string('tasks/email_reminder.html', context)
-            plain_message = render_to_string('tasks/email_reminder.txt', context)
-            
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                html_message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                fail_silently=False,
-            )
-            
-            logger.info(f"Email reminder sent to {user.email}")
-            return True
-            
+            guard.call(connection.open)
+            for user, tasks in recipients:
+                try:
+                    email = NotificationService.build_email_message(user, tasks, html_template, text_template, connection)
+                    guard.call(connection.send_messages, [email], client_errors=EMAIL_RECIPIENT_ERRORS)
+                    logger.info(f"Email reminder sent to {user.email}")
+                    results.append((user, True, None))
+                except CircuitOpenError:
+                    raise
+                except EMAIL_RECIPIENT_ERRORS as e:
+                    logger.error(f"Failed to send email to {user.email}: {str(e)}")
+                    results.append((user, False, str(e)))
+                except Exception as e:
+                    logger.error(f"Failed to send email to {user.email}: {str(e)}")
+                    results.append((user, False, str(e)))
+                    # The server may have dropped the session; start a fresh one for the rest
+                    connection.close()
+                    guard.call(connection.open)
+        except CircuitOpenError as e:
+            logger.warning(f"Skipped {len(recipients) - len(results)} email reminders: {str(e)}")
+            results.extend((user, None, str(e)) for user, tasks in recipients[len(results):])
         except Exception as e:
-            logger.error(f"Failed to send email to {user.email}: {str(e)}")
-            return False
+            logger.error(f"Email connection failed for {len(recipients) - len(results)} users: {str(e)}")
+            results.extend((user, False, str(e)) for user, tasks in recipients[len(results):])
+        finally:
+            connection.close()
+        
+        return results
+    
+    @staticmethod
+    def send_email_reminder(user, tasks):
+        """Send email reminder with daily tasks"""
+        user, success, error_message = NotificationService.send_email_batch([(user, tasks)])[0]
+        if success is None:
+            raise CircuitOpenError('email', get_provider_guard('email').breaker.retry_after())
+        return success
     
     @staticmethod
     def send_sms_reminder(user, tasks):
@@ -60,98 +182,160 @@ class NotificationService:
             else:
                 message = f"Hi {user.first_name or user.username}! You have {incomplete_count} pending task{'s' if incomplete_count > 1 else ''} today. Check your dashboard: {settings.SITE_URL}"
             
-            # Twilio API call using urllib
-            import base64
-            
+            # Twilio API call over the shared keep-alive transport
             data = urllib.parse.urlencode({
                 'From': settings.TWILIO_PHONE_NUMBER,
                 'To': user.profile.phone_number,
                 'Body': message
             }).encode('utf-8')
             
-            credentials = f"{settings.TWILIO_ACCOUNT_SID}:{settings.TWILIO_AUTH_TOKEN}"
-            encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            req = urllib.request.Request(
-                f"https://api.twilio.com/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json",
-                data=data,
+            response = get_provider_guard('sms').call(
+                get_transport().request,
+                'POST',
+                f"{settings.TWILIO_API_URL}/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json",
+                body=data,
                 headers={
-                    'Authorization': f'Basic {encoded_credentials}',
+                    'Authorization': basic_auth_header(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
                     'Content-Type': 'application/x-www-form-urlencoded'
-                }
+                },
+                is_failure=http_provider_failure
             )
             
-            try:
-                response = urllib.request.urlopen(req)
-                if response.status == 201:
-                    logger.info(f"SMS sent to {user.profile.phone_number}")
-                    return True
-                else:
-                    logger.error(f"Twilio API error: {response.status}")
-                    return False
-            except urllib.error.HTTPError as e:
-                logger.error(f"Twilio API error: {e.read().decode()}")
+            if response.status == 201:
+                logger.info(f"SMS sent to {user.profile.phone_number}")
+                return True
+            else:
+                logger.error(f"Twilio API error: {response.status} {response.text}")
                 return False
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Failed to send SMS to {user.username}: {str(e)}")
             return False
     
     @staticmethod
-    def send_push_notification(user, tasks):
-        """Send push notification using Firebase or similar service"""
-        try:
-            incomplete_count = len([t for t in tasks if not t.completed])
-            
-            if incomplete_count == 0:
-                title = "All Done! 🎉"
-                body = "You've completed all your tasks for today!"
-            else:
-                title = f"Task Reminder ({incomplete_count} pending)"
-                body = f"You have {incomplete_count} task{'s' if incomplete_count > 1 else ''} waiting for you."
-            
-            # Firebase Cloud Messaging API call
-            headers = {
-                'Authorization': f'key={settings.FCM_SERVER_KEY}',
-                'Content-Type': 'application/json',
-            }
-            
-            payload = {
-                'to': user.profile.fcm_token if hasattr(user, 'profile') and user.profile.fcm_token else None,
-                'notification': {
-                    'title': title,
-                    'body': body,
-                    'icon': '/static/icon-192x192.png',
-                    'click_action': settings.SITE_URL
-                },
-                'data': {
-                    'url': settings.SITE_URL,
-                    'task_count': str(incomplete_count)
-                }
+    def build_push_message(tasks):
+        """FCM notification and data blocks for a user's tasks"""
+        incomplete_count = len([t for t in tasks if not t.completed])
+        
+        if incomplete_count == 0:
+            title = "All Done! 🎉"
+            body = "You've completed all your tasks for today!"
+        else:
+            title = f"Task Reminder ({incomplete_count} pending)"
+            body = f"You have {incomplete_count} task{'s' if incomplete_count > 1 else ''} waiting for you."
+        
+        return {
+            'notification': {
+                'title': title,
+                'body': body,
+                'icon': '/static/icon-192x192.png',
+                'click_action': settings.SITE_URL
+            },
+            'data': {
+                'url': settings.SITE_URL,
+                'task_count': str(incomplete_count)
             }
-            
-            if not payload['to']:
+        }
+    
+    @staticmethod
+    def group_push_recipients(recipients):
+        """Group (user, tasks) pairs into multicast batches sharing one message.
+        
+        Returns a list of (message, users) with at most FCM_MULTICAST_SIZE
+        users per batch.
+        """
+        batch_size = getattr(settings, 'FCM_MULTICAST_SIZE', 1000)
+        groups = {}
+        for user, tasks in recipients:
+            message = NotificationService.build_push_message(tasks)
+            key = json.dumps(message, sort_keys=True)
+            groups.setdefault(key, (message, []))[1].append(user)
+        
+        batches = []
+        for message, users in groups.values():
+            for i in range(0, len(users), batch_size):
+                batches.append((message, users[i:i + batch_size]))
+        return batches
+    
+    @staticmethod
+    def send_push_multicast(message, users):
+        """Send one FCM message to many users in a single request.
+        
+        Returns a (user, success, error_message) result per user in order,
+        where success is None for sends skipped because the circuit is open.
+        An error_message in FCM_INVALID_TOKEN_ERRORS means the user's token
+        should be forgotten.
+        """
+        results = {}
+        recipients = []
+        for user in users:
+            token = user.profile.fcm_token if hasattr(user, 'profile') and user.profile.fcm_token else None
+            if token:
+                recipients.append((user, token))
+            else:
                 logger.warning(f"No FCM token for user {user.username}")
-                return False
-            
-            req = urllib.request.Request(
-                'https://fcm.googleapis.com/fcm/send',
-                data=json.dumps(payload).encode('utf-8'),
-                headers=headers
-            )
-            
+                results[user.pk] = (user, False, 'No FCM token')
+        
+        if recipients:
             try:
-                response = urllib.request.urlopen(req)
+                # Firebase Cloud Messaging API call
+                headers = {
+                    'Authorization': f'key={settings.FCM_SERVER_KEY}',
+                    'Content-Type': 'application/json',
+                }
+                
+                payload = dict(message, registration_ids=[token for user, token in recipients])
+                
+                response = get_provider_guard('push').call(
+                    get_transport().request,
+                    'POST',
+                    settings.FCM_API_URL,
+                    body=json.dumps(payload).encode('utf-8'),
+                    headers=headers,
+                    is_failure=http_provider_failure
+                )
+                
                 if response.status == 200:
-                    logger.info(f"Push notification sent to {user.username}")
-                    return True
+                    token_results = response.json().get('results', [])
+                    for i, (user, token) in enumerate(recipients):
+                        result = token_results[i] if i < len(token_results) else {'error': 'MissingResult'}
+                        if 'error' in result:
+                            logger.error(f"FCM error for {user.username}: {result['error']}")
+                            results[user.pk] = (user, False, result['error'])
+                        else:
+                            logger.info(f"Push notification sent to {user.username}")
+                            results[user.pk] = (user, True, None)
                 else:
-                    logger.error(f"FCM API error: {response.status}")
-                    return False
-            except urllib.error.HTTPError as e:
-                logger.error(f"FCM API error: {e.read().decode()}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Failed to send push notification to {user.username}: {str(e)}")
-            return False
\ No newline at end of file
+                    logger.error(f"FCM API error: {response.status} {response.text}")
+                    for user, token in recipients:
+                        results[user.pk] = (user, False, f"FCM API error: {response.status}")
+                    
+            except CircuitOpenError as e:
+                logger.warning(f"Skipped {len(recipients)} push notifications: {str(e)}")
+                for user, token in recipients:
+                    results[user.pk] = (user, None, str(e))
+            except Exception as e:
+                logger.error(f"Failed to send push notification to {len(recipients)} users: {str(e)}")
+                for user, token in recipients:
+                    results[user.pk] = (user, False, str(e))
+        
+        return [results[user.pk] for user in users]
+    
+    @staticmethod
+    def forget_fcm_tokens(tokens):
+        """Clear FCM tokens that the provider reported as invalid"""
+        if tokens:
+            UserProfile.objects.filter(fcm_token__in=list(tokens)).update(fcm_token=None)
+    
+    @staticmethod
+    def send_push_notification(user, tasks):
+        """Send push notification using Firebase or similar service"""
+        message = NotificationService.build_push_message(tasks)
+        user, success, error_message = NotificationService.send_push_multicast(message, [user])[0]
+        if success is None:
+            raise CircuitOpenError('push', get_provider_guard('push').breaker.retry_after())
+        if error_message in FCM_INVALID_TOKEN_ERRORS:
+            NotificationService.forget_fcm_tokens([user.profile.fcm_token])
+        return success
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .cache import bump_user_version
+from .models import UserProfile
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    bump_user_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+@receiver(pre_save, sender=UserProfile)
+def fixture_profile_loading(sender, instance, raw, using, **kwargs):
+    # loaddata writes rows without calling save(), so schedule them here
+    if not raw:
+        return
+    stored = sender.objects.using(using).filter(pk=instance.pk).values('reminder_time', 'time_zone').first()
+    instance._loaded_schedule = (stored['reminder_time'], stored['time_zone']) if stored else None
+    if instance.next_reminder_at is None or instance.schedule_changed():
+        instance.schedule_next_reminder()
@@ -0,0 +1,309 @@
+const csrftoken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+
+// URLs of the endpoints used below, from data-* attributes on <body>
+const urls = document.body.dataset;
+
+// Today's tasks as rendered by Django
+let tasks = JSON.parse(document.getElementById('tasks-data').textContent);
+
+// Initialize on page load
+document.addEventListener('DOMContentLoaded', function() {
+    console.log('Loaded tasks from database:', tasks);
+    loadTasks();
+    updateCapacity();
+    connectEvents();
+});
+
+// Changes made on other devices, and reminders as they are sent,
+// arrive over Server-Sent Events and are patched into the page
+function connectEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    const source = new EventSource(urls.eventStreamUrl);
+    source.addEventListener('task.created', e => applyTaskEvent(JSON.parse(e.data).task));
+    source.addEventListener('task.updated', e => applyTaskEvent(JSON.parse(e.data).task));
+    source.addEventListener('task.deleted', e => {
+        const { id, occurrence } = JSON.parse(e.data);
+        tasks = tasks.filter(t => !sameTask(t, { id, occurrence }));
+        loadTasks();
+        updateCapacity();
+    });
+    source.addEventListener('reminder.sent', e => {
+        const reminder = JSON.parse(e.data);
+        const status = reminder.success ? 'sent' : (reminder.skipped ? 'postponed' : 'failed');
+        showNotice(`${reminder.label} reminder ${status}`);
+    });
+    // The stream dropped events for this page; start over from the server
+    source.addEventListener('resync', () => location.reload());
+}
+
+// Occurrences of recurring tasks may have no id until they are first changed
+function sameTask(a, b) {
+    return (a.id !== null && a.id === b.id) || (!!a.occurrence && a.occurrence === b.occurrence);
+}
+
+function taskRef(task) {
+    return task.id !== null ? task.id : `'${task.occurrence}'`;
+}
+
+function findTask(ref) {
+    return tasks.find(t => t.id === ref || (t.id === null && t.occurrence === ref));
+}
+
+function applyTaskEvent(task) {
+    const existing = tasks.find(t => sameTask(t, task));
+    if (existing) {
+        Object.assign(existing, task);
+    } else if (!task.completed) {
+        tasks.push(task);
+    }
+    loadTasks();
+    updateCapacity();
+}
+
+function showNotice(message) {
+    const notice = document.getElementById('event-notice');
+    notice.textContent = message;
+    notice.classList.add('visible');
+    clearTimeout(notice.hideTimer);
+    notice.hideTimer = setTimeout(() => notice.classList.remove('visible'), 4000);
+}
+
+// Buffer time slider
+document.getElementById('buffer-slider').addEventListener('input', function(e) {
+    const bufferTime = parseFloat(e.target.value);
+    document.getElementById('buffer-display').textContent = bufferTime;
+    updateCapacity();
+
+    fetch(urls.updateBufferUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrftoken
+        },
+        body: JSON.stringify({ buffer_time: bufferTime })
+    }).catch(err => console.error('Buffer update error:', err));
+});
+
+// Add task form
+document.getElementById('add-task-form').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const text = document.getElementById('task-text').value;
+    const category = document.getElementById('task-category').value;
+    const priority = document.getElementById('task-priority').value;
+    const repeat = document.getElementById('task-repeat').value;
+
+    try {
+        const response = await fetch(urls.addTaskUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrftoken
+            },
+            body: JSON.stringify({ text, category, priority, repeat })
+        });
+
+        if (response.ok) {
+            const task = await response.json();
+            console.log('Task added:', task);
+            // The task.created event may have added it already
+            if (!tasks.some(t => sameTask(t, task))) {
+                tasks.push(task);
+            }
+            document.getElementById('task-text').value = '';
+            loadTasks();
+            updateCapacity();
+        } else {
+            const errorText = await response.text();
+            console.error('Server error:', errorText);
+            alert('Failed to add task. Check console for details.');
+        }
+    } catch (error) {
+        console.error('Error adding task:', error);
+        alert('Error adding task: ' + error.message);
+    }
+});
+
+// Toggles and deletes are applied locally at once and sent to the
+// server together in one batch request shortly afterwards
+let pendingOps = [];
+let flushTimer = null;
+
+function queueOperation(op) {
+    pendingOps.push(op);
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flushOperations, 500);
+}
+
+async function flushOperations(keepalive = false) {
+    clearTimeout(flushTimer);
+    if (pendingOps.length === 0) {
+        return;
+    }
+    const operations = pendingOps;
+    pendingOps = [];
+
+    try {
+        const response = await fetch(urls.batchTasksUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrftoken
+            },
+            body: JSON.stringify({ operations }),
+            keepalive
+        });
+
+        const result = await response.json();
+        if (!response.ok) {
+            console.error('Batch update rejected:', result);
+            location.reload();
+            return;
+        }
+        // Occurrences given a row by this batch are addressed by id from now on
+        result.results.forEach(r => {
+            const task = r.task && r.task.occurrence && tasks.find(t => t.occurrence === r.task.occurrence);
+            if (task && r.task.id !== null) {
+                task.id = r.task.id;
+            }
+        });
+    } catch (error) {
+        console.error('Error saving task changes:', error);
+    }
+}
+
+window.addEventListener('pagehide', () => flushOperations(true));
+
+function toggleTask(ref) {
+    const task = findTask(ref);
+    if (task) {
+        task.completed = !task.completed;
+        const target = task.id !== null ? { id: task.id } : { occurrence: task.occurrence };
+        queueOperation({ op: 'toggle', ...target, completed: task.completed });
+        loadTasks();
+        updateCapacity();
+    }
+}
+
+function deleteTask(ref) {
+    const task = findTask(ref);
+    if (task) {
+        tasks = tasks.filter(t => t !== task);
+        const target = task.id !== null ? { id: task.id } : { occurrence: task.occurrence };
+        queueOperation({ op: 'delete', ...target });
+        loadTasks();
+        updateCapacity();
+    }
+}
+
+function loadTasks() {
+    const tasksList = document.getElementById('tasks-list');
+
+    // Check if all tasks are completed
+    const incompleteTasks = tasks.filter(t => !t.completed);
+
+    if (tasks.length > 0 && incompleteTasks.length === 0) {
+        // All tasks completed - show celebration
+        tasksList.innerHTML = `
+            <div class="completion-celebration">
+                <div class="celebration-icon">🎉</div>
+                <h2>Amazing Work!</h2>
+                <p>You've completed all ${tasks.length} task${tasks.length > 1 ? 's' : ''} for today!</p>
+                <div class="celebration-quote">
+                    <h3>💪 Defeat Procrastination!</h3>
+                    <p>"The way to get started is to quit talking and begin doing." - Walt Disney</p>
+                    <p>You chose action over laziness today. Tomorrow, do it again!</p>
+                </div>
+                <button class="btn-celebrate" onclick="location.reload()">Plan Tomorrow</button>
+            </div>
+        `;
+        return;
+    }
+
+    if (incompleteTasks.length === 0) {
+        tasksList.innerHTML = `
+            <div class="empty-state">
+                <svg fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z"></path>
+                </svg>
+                <p>No tasks for today. Start planning your day above!</p>
+            </div>
+        `;
+        return;
+    }
+
+    const priorities = {
+        high: 'High Priority',
+        medium: 'Medium Priority',
+        low: 'Low Priority',
+        flexible: 'Flexible (Can Shift)'
+    };
+
+    const categories = {
+        church: 'Church Leadership',
+        weekend: 'Weekend Commitments',
+        personal: 'Personal',
+        work: 'Work'
+    };
+
+    let html = '';
+
+    // Group by priority - only show incomplete tasks
+    for (const [priorityKey, priorityLabel] of Object.entries(priorities)) {
+        const priorityTasks = incompleteTasks.filter(t => t.priority === priorityKey);
+
+        if (priorityTasks.length > 0) {
+            html += `<div class="priority-section">`;
+            html += `<div class="priority-title">${priorityLabel}</div>`;
+
+            priorityTasks.forEach(task => {
+                html += renderTask(task, categories);
+            });
+
+            html += `</div>`;
+        }
+    }
+
+    tasksList.innerHTML = html;
+}
+
+function renderTask(task, categories) {
+    return `
+        <div class="task-item ${task.priority} ${task.completed ? 'completed' : ''}">
+            <input type="checkbox" class="task-checkbox" 
+                   ${task.completed ? 'checked' : ''} 
+                   onchange="toggleTask(${taskRef(task)})">
+            <div class="task-content">
+                <div class="task-text ${task.completed ? 'completed' : ''}">${task.text}</div>
+                <div class="task-badges">
+                    <span class="badge ${task.category}">${categories[task.category]}</span>
+                </div>
+            </div>
+            <button class="task-delete" onclick="deleteTask(${taskRef(task)})">×</button>
+        </div>
+    `;
+}
+
+function updateCapacity() {
+    const bufferTime = parseFloat(document.getElementById('buffer-slider').value);
+    const activeTasks = tasks.filter(t => !t.completed);
+    const scheduledHours = activeTasks.length * 0.5;
+    const availableHours = 12 - bufferTime;
+    const capacityPercent = Math.min((scheduledHours / availableHours) * 100, 100);
+
+    document.getElementById('scheduled-hours').textContent = scheduledHours.toFixed(1);
+    document.getElementById('available-hours').textContent = availableHours.toFixed(1);
+
+    const capacityFill = document.getElementById('capacity-fill');
+    capacityFill.style.width = capacityPercent + '%';
+
+    if (capacityPercent > 90) {
+        capacityFill.style.background = '#ef4444';
+    } else if (capacityPercent > 70) {
+        capacityFill.style.background = '#f59e0b';
+    } else {
+        capacityFill.style.background = '#10b981';
+    }
+}
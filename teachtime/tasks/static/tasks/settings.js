@@ -0,0 +1,109 @@
+const csrftoken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+
+// Load current settings
+document.addEventListener('DOMContentLoaded', function() {
+    loadSettings();
+});
+
+async function loadSettings() {
+    try {
+        const response = await fetch('/api/notification-settings/');
+        if (response.ok) {
+            const settings = await response.json();
+
+            document.getElementById('email_reminders').checked = settings.email_reminders;
+            document.getElementById('sms_reminders').checked = settings.sms_reminders;
+            document.getElementById('push_reminders').checked = settings.push_reminders;
+            document.getElementById('reminder_time').value = settings.reminder_time;
+            document.getElementById('phone_number').value = settings.phone_number;
+            document.getElementById('time_zone').value = settings.time_zone === 'UTC'
+                ? Intl.DateTimeFormat().resolvedOptions().timeZone
+                : settings.time_zone;
+        }
+    } catch (error) {
+        console.error('Error loading settings:', error);
+    }
+}
+
+// Save settings
+document.getElementById('settings-form').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const formData = {
+        email_reminders: document.getElementById('email_reminders').checked,
+        sms_reminders: document.getElementById('sms_reminders').checked,
+        push_reminders: document.getElementById('push_reminders').checked,
+        reminder_time: document.getElementById('reminder_time').value,
+        time_zone: document.getElementById('time_zone').value,
+        phone_number: document.getElementById('phone_number').value
+    };
+
+    try {
+        const response = await fetch('/api/notification-settings/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrftoken
+            },
+            body: JSON.stringify(formData)
+        });
+
+        if (response.ok) {
+            document.getElementById('success-message').style.display = 'block';
+            setTimeout(() => {
+                document.getElementById('success-message').style.display = 'none';
+            }, 3000);
+        }
+    } catch (error) {
+        console.error('Error saving settings:', error);
+        alert('Error saving settings');
+    }
+});
+
+// Test email reminder
+async function testReminder() {
+    try {
+        const response = await fetch('/api/send-reminder/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrftoken
+            },
+            body: JSON.stringify({ type: 'email' })
+        });
+
+        const job = await response.json();
+        if (!response.ok) {
+            alert('Failed to send test email: ' + job.error);
+            return;
+        }
+
+        const result = await waitForJob(job.status_url);
+        if (result.success) {
+            alert('Test email sent! Check your inbox.');
+        } else if (result.status === 'duplicate') {
+            alert('This reminder was already sent recently, so it was not sent again.');
+        } else if (result.status === 'failed') {
+            alert('Failed to send test email: ' + (result.error_message || 'delivery failed'));
+        } else {
+            alert('Test email queued. It will be sent shortly.');
+        }
+    } catch (error) {
+        console.error('Error sending test email:', error);
+        alert('Error sending test email');
+    }
+}
+
+// Poll a queued reminder until it finishes or we stop waiting
+async function waitForJob(statusUrl, attempts = 15) {
+    let result = {};
+    for (let i = 0; i < attempts; i++) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(statusUrl);
+        result = await response.json();
+        if (['done', 'duplicate', 'failed'].includes(result.status)) {
+            break;
+        }
+    }
+    return result;
+}
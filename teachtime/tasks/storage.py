@@ -0,0 +1,48 @@
+import gzip
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.html')
+
+
+def compressors():
+    """(suffix, compress) pairs for the precompressed variants that can be written here"""
+    found = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        found.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return found
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Fingerprinted static files with precompressed copies for the web server.
+
+    collectstatic writes each file under a content-hashed name, so it can be
+    cached forever, and next to every hashed text file a .gz copy, plus a .br
+    copy when the brotli package is installed. A web server with gzip_static
+    or brotli_static sends those instead of compressing on every request.
+    Copies are only written when they are smaller than the original.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.write_compressed(name)
+
+    def write_compressed(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for suffix, compress in compressors():
+            # Hashed names change with the content, so an existing copy is current
+            if self.exists(name + suffix):
+                continue
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                self._save(name + suffix, ContentFile(compressed))
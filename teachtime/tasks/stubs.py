@@ -0,0 +1,140 @@
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for Django's SMTP backend: accepts and counts every message"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('latin-1').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-stub')
+                self.reply('250 8BITMIME')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                time.sleep(self.server.providers.latency)
+                self.server.providers.count('email')
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class StubHTTPHandler(BaseHTTPRequestHandler):
+    """Twilio Messages and FCM legacy send endpoints that always succeed"""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real providers
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.providers.latency)
+        if self.path.endswith('/Messages.json'):
+            self.server.providers.count('sms')
+            status, payload = 201, {'sid': 'SM00000000000000000000000000000000', 'status': 'queued'}
+        else:
+            tokens = json.loads(body).get('registration_ids', [])
+            self.server.providers.count('push', len(tokens))
+            status, payload = 200, {
+                'success': len(tokens),
+                'failure': 0,
+                'results': [{'message_id': f'stub:{i}'} for i in range(len(tokens))],
+            }
+        if self.server.providers.take_unanswered():
+            # Accepted, but the connection drops before the response goes out
+            self.close_connection = True
+            return
+        self.respond(status, payload)
+        if self.server.providers.close_idle:
+            # Like a provider's idle timeout, without a Connection: close header
+            self.close_connection = True
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StubProviders:
+    """Local SMTP, Twilio and FCM stand-ins on free ports, for benchmarking sends.
+
+    Use as a context manager; `settings` are the overrides that point the
+    notification services at the stubs and `sent` counts what each received.
+    `latency` seconds are added to every message to mimic a remote provider.
+    Set `unanswered` to hang up on that many HTTP requests after accepting
+    them, and `close_idle` to close connections after every response.
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.unanswered = 0
+        self.close_idle = False
+        self.sent = {'email': 0, 'sms': 0, 'push': 0}
+        self.lock = threading.Lock()
+        self.smtp = ThreadingSMTPServer(('127.0.0.1', 0), StubSMTPHandler)
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), StubHTTPHandler)
+        self.http.daemon_threads = True
+        self.smtp.providers = self.http.providers = self
+
+    def count(self, channel, messages=1):
+        with self.lock:
+            self.sent[channel] += messages
+
+    def take_unanswered(self):
+        with self.lock:
+            if not self.unanswered:
+                return False
+            self.unanswered -= 1
+            return True
+
+    @property
+    def settings(self):
+        http_url = f'http://127.0.0.1:{self.http.server_address[1]}'
+        return {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': self.smtp.server_address[1],
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'TWILIO_API_URL': http_url,
+            'FCM_API_URL': f'{http_url}/fcm/send',
+        }
+
+    def __enter__(self):
+        for server in (self.smtp, self.http):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for server in (self.smtp, self.http):
+            server.shutdown()
+            server.server_close()
+        return False
@@ -1,3 +1,1356 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import smtplib
+import tempfile
+import time as time_module
+from base64 import urlsafe_b64encode
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from zoneinfo import ZoneInfo
+from django.contrib.auth.models import User
+from django.core import mail, serializers
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from teachtime.routers import ReplicaRouter, read_from
+from .cache import bump_task_version, get_today_summary
+from .dedup import claim_deliveries, claim_delivery, content_hash, confirm_deliveries, release_deliveries
+from .dispatch import ReminderDispatcher
+from .events import publish_event, publish_events, stream_events
+from .jobs import claim_jobs, enqueue_reminder, release_stale_jobs, run_job
+from .management.commands.send_reminders import Command as SendRemindersCommand
+from .metrics import RETIRED_PROCESS, Registry, merged_snapshots, render_prometheus, retire_snapshots
+from .models import Task, UserProfile, ReminderLog, ReminderJob, DashboardEvent, DashboardStream, ReminderDelivery, MetricsSnapshot, RecurrenceRule, ReminderSummary
+from .resilience import CircuitOpenError, ProviderGuard, TokenBucket, http_provider_failure
+from .recurrence import advance_rules, next_dates, pending_occurrences
+from .services import NotificationService, ReminderLogBuffer
+from .stubs import StubProviders
+from .transport import HTTPTransport
+from .views import dashboard_tasks
 
-# Create your tests here.
+
+def create_user(username, **profile_fields):
+    """User with a profile; the profile is cached on user.profile"""
+    user = User.objects.create(username=username, email=f'{username}@example.com')
+    UserProfile.objects.create(user=user, **profile_fields)
+    return user
+
+
+def create_task(user, text='Prepare lesson', **fields):
+    return Task.objects.create(user=user, text=text, **fields)
+
+
+# Fourteen hours ahead of UTC and eleven behind, so at any moment at least
+# one of them is on a different date than UTC
+FAR_TIME_ZONES = ['Pacific/Kiritimati', 'Pacific/Pago_Pago']
+
+
+def create_local_day_tasks(user):
+    """Tasks named after the user's local yesterday, today and tomorrow; returns today's name"""
+    today = user.profile.local_date()
+    for offset in (-1, 0, 1):
+        day = today + timedelta(days=offset)
+        create_task(user, day.isoformat(), due_date=day)
+    return today.isoformat()
+
+
+def reminded_tasks(message):
+    """Texts of the pending tasks listed in a reminder email"""
+    return [line[2:].split(' [')[0] for line in message.body.splitlines() if line.startswith('- ')]
+
+
+class RefusingEmailBackend(locmem.EmailBackend):
+    """Outbox backend counting connections and refusing addresses at example.org"""
+
+    opened = 0
+
+    def open(self):
+        type(self).opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0].endswith('@example.org'):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+class ReminderDispatcherTests(TestCase):
+
+    def test_results_cover_every_send(self):
+        sms_users = [create_user(f'sms{i}', phone_number=f'+1555000000{i}') for i in range(3)]
+        email_users = [create_user(f'email{i}') for i in range(2)]
+        tasks = [create_task(sms_users[0])]
+
+        with StubProviders() as providers, override_settings(**providers.settings):
+            dispatcher = ReminderDispatcher()
+            for user in sms_users:
+                dispatcher.submit(user, 'sms', tasks)
+            for user in email_users:
+                dispatcher.submit(user, 'email', tasks)
+            results = list(dispatcher.results())
+
+        self.assertEqual(providers.sent, {'email': 2, 'sms': 3, 'push': 0})
+        self.assertCountEqual(
+            [(user.username, channel, success) for user, channel, success, error_message in results],
+            [(user.username, 'sms', True) for user in sms_users] + [(user.username, 'email', True) for user in email_users],
+        )
+        self.assertEqual(dispatcher.stats['sms'].sent, 3)
+        self.assertEqual(dispatcher.stats['email'].sent, 2)
+        self.assertEqual(dispatcher.stats['push'].attempted, 0)
+
+    def test_send_that_raises_is_reported_as_failed(self):
+        def failing_send(user, tasks):
+            raise RuntimeError('provider exploded')
+
+        class FailingDispatcher(ReminderDispatcher):
+            senders = {**ReminderDispatcher.senders, 'sms': failing_send}
+
+        user = create_user('teacher', phone_number='+15550000000')
+        dispatcher = FailingDispatcher()
+        dispatcher.submit(user, 'sms', [])
+
+        with self.assertLogs('tasks.dispatch', 'ERROR'):
+            self.assertEqual(list(dispatcher.results()), [(user, 'sms', False, 'provider exploded')])
+        self.assertEqual(dispatcher.stats['sms'].failed, 1)
+
+
+class WorkSetTests(TestCase):
+
+    def work_set(self):
+        today = timezone.now().date()
+        with CaptureQueriesContext(connection) as queries:
+            work_set = SendRemindersCommand().get_work_set(User.objects.all(), today)
+        return work_set, len(queries)
+
+    def test_query_count_does_not_grow_with_users(self):
+        today = timezone.now().date()
+        for i in range(2):
+            create_task(create_user(f'teacher{i}'), due_date=today)
+        work_set, few_queries = self.work_set()
+        self.assertEqual(len(work_set), 2)
+
+        for i in range(2, 8):
+            create_task(create_user(f'teacher{i}'), due_date=today)
+        work_set, many_queries = self.work_set()
+        self.assertEqual(len(work_set), 8)
+        self.assertEqual(many_queries, few_queries)
+
+    def test_only_users_with_tasks_due_today(self):
+        today = timezone.now().date()
+        teacher = create_user('teacher')
+        create_task(teacher, 'Today', due_date=today)
+        create_task(teacher, 'Tomorrow', due_date=today + timedelta(days=1))
+        create_task(create_user('idle'), 'Yesterday', due_date=today - timedelta(days=1))
+
+        work_set, queries = self.work_set()
+
+        self.assertEqual([user.username for user in work_set], ['teacher'])
+        self.assertEqual([task.text for task in work_set[0].todays_tasks], ['Today'])
+        self.assertEqual(work_set[0].profile.user_id, teacher.id)
+
+
+class ReminderLogBufferTests(TestCase):
+
+    def test_writes_full_batches_and_the_rest_on_exit(self):
+        user = create_user('teacher')
+        with ReminderLogBuffer(batch_size=2) as buffer:
+            buffer.add(user, 'email', True)
+            self.assertEqual(ReminderLog.objects.count(), 0)
+            buffer.add(user, 'sms', False, 'No phone number')
+            self.assertEqual(ReminderLog.objects.count(), 2)
+            buffer.add(user, 'push', True)
+            self.assertEqual(ReminderLog.objects.count(), 2)
+
+        self.assertEqual(ReminderLog.objects.count(), 3)
+        self.assertEqual(ReminderLog.objects.get(reminder_type='sms').error_message, 'No phone number')
+
+    def test_flushes_when_the_block_raises(self):
+        user = create_user('teacher')
+        with self.assertRaises(RuntimeError):
+            with ReminderLogBuffer(batch_size=100) as buffer:
+                buffer.add(user, 'email', True)
+                raise RuntimeError
+
+        self.assertEqual(ReminderLog.objects.count(), 1)
+
+
+class ReminderScheduleTests(TestCase):
+
+    def test_next_reminder_follows_the_local_time_across_dst(self):
+        profile = UserProfile(reminder_time=time(8, 0), time_zone='America/New_York')
+        # 09:00 EST on the day before clocks go forward
+        after = datetime(2024, 3, 9, 14, 0, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(profile.get_next_reminder_at(after), datetime(2024, 3, 10, 12, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            profile.get_next_reminder_at(datetime(2024, 3, 10, 12, 0, tzinfo=dt_timezone.utc)),
+            datetime(2024, 3, 11, 12, 0, tzinfo=dt_timezone.utc),
+        )
+
+    def test_changing_the_reminder_time_moves_the_schedule(self):
+        create_user('teacher', reminder_time=time(8, 0), time_zone='Asia/Tokyo')
+        profile = UserProfile.objects.get(user__username='teacher')
+        profile.reminder_time = time(21, 30)
+        profile.save()
+
+        profile = UserProfile.objects.get(id=profile.id)
+        self.assertEqual(profile.next_reminder_at.astimezone(ZoneInfo('Asia/Tokyo')).time(), time(21, 30))
+
+        profile.time_zone = 'Europe/Paris'
+        profile.save(update_fields=['time_zone'])
+        profile = UserProfile.objects.get(id=profile.id)
+        self.assertEqual(profile.next_reminder_at.astimezone(ZoneInfo('Europe/Paris')).time(), time(21, 30))
+
+    def test_fixtures_changing_the_reminder_time_move_the_schedule(self):
+        create_user('teacher', reminder_time=time(8, 0), time_zone='Asia/Tokyo')
+        profile = UserProfile.objects.get(user__username='teacher')
+        fixture = json.loads(serializers.serialize('json', [profile]))
+        fixture[0]['fields']['reminder_time'] = '21:30:00'
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'profiles.json'
+            path.write_text(json.dumps(fixture))
+            call_command('loaddata', str(path), verbosity=0)
+
+        profile = UserProfile.objects.get(id=profile.id)
+        self.assertEqual(profile.next_reminder_at.astimezone(ZoneInfo('Asia/Tokyo')).time(), time(21, 30))
+
+    def test_other_edits_keep_the_schedule(self):
+        create_user('teacher')
+        profile = UserProfile.objects.get(user__username='teacher')
+        next_reminder_at = profile.next_reminder_at - timedelta(days=1)
+        UserProfile.objects.filter(id=profile.id).update(next_reminder_at=next_reminder_at)
+        # Changed elsewhere; reloading makes it the schedule this instance keeps
+        UserProfile.objects.filter(id=profile.id).update(reminder_time=time(9, 0))
+        profile.refresh_from_db()
+        profile.buffer_time = 3
+        profile.save()
+
+        self.assertEqual(UserProfile.objects.get(id=profile.id).next_reminder_at, next_reminder_at)
+
+    def create_due_user(self, username, due_in):
+        user = create_user(username, push_reminders=False)
+        create_task(user, due_date=timezone.now().date())
+        UserProfile.objects.filter(user=user).update(next_reminder_at=timezone.now() + due_in)
+        return user
+
+    def send_reminders(self, *args):
+        out = StringIO()
+        call_command('send_reminders', *args, stdout=out)
+        return out.getvalue()
+
+    def test_sends_to_due_users_and_advances_their_schedule(self):
+        due = self.create_due_user('due', timedelta(minutes=-1))
+        later = self.create_due_user('later', timedelta(hours=3))
+        later_at = UserProfile.objects.get(user=later).next_reminder_at
+
+        self.send_reminders()
+
+        self.assertEqual([message.to for message in mail.outbox], [[due.email]])
+        self.assertTrue(ReminderLog.objects.get(user=due, reminder_type='email').success)
+        self.assertGreater(UserProfile.objects.get(user=due).next_reminder_at, timezone.now())
+        self.assertEqual(UserProfile.objects.get(user=later).next_reminder_at, later_at)
+
+    def test_reminders_cover_the_users_local_day(self):
+        expected = {}
+        for time_zone in FAR_TIME_ZONES:
+            user = create_user(time_zone.split('/')[1].lower(), time_zone=time_zone, push_reminders=False)
+            UserProfile.objects.filter(user=user).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+            expected[user.email] = create_local_day_tasks(user)
+
+        self.send_reminders()
+
+        self.assertEqual(len(mail.outbox), 2)
+        for message in mail.outbox:
+            today = expected[message.to[0]]
+            self.assertEqual(reminded_tasks(message), [today])
+
+    def test_single_channel_run_leaves_the_schedule_alone(self):
+        due = self.create_due_user('due', timedelta(minutes=-1))
+        due_at = UserProfile.objects.get(user=due).next_reminder_at
+
+        output = self.send_reminders('--type', 'email')
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Schedules not advanced', output)
+        self.assertEqual(UserProfile.objects.get(user=due).next_reminder_at, due_at)
+
+
+class ReminderJobTests(TestCase):
+
+    def run_next_job(self):
+        job = claim_jobs('worker-a', 10)[0]
+        with ReminderLogBuffer() as buffer:
+            return run_job(job, buffer)
+
+    def test_a_job_is_claimed_by_one_worker(self):
+        user = create_user('teacher')
+        job = enqueue_reminder(user, 'email')
+        ReminderJob.objects.create(user=user, reminder_type='sms', run_after=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual([claimed.id for claimed in claim_jobs('worker-a', 10)], [job.id])
+        self.assertEqual(claim_jobs('worker-b', 10), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('running', 'worker-a', 1))
+
+    def test_successful_job_is_done_and_logged(self):
+        user = create_user('teacher')
+        create_task(user, due_date=timezone.now().date())
+
+        enqueue_reminder(user, 'email')
+        job = self.run_next_job()
+
+        self.assertEqual((job.status, job.success), ('done', True))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(ReminderLog.objects.get(user=user).success)
+
+    def test_failed_job_is_retried_until_out_of_attempts(self):
+        # Without a phone number the SMS send fails
+        user = create_user('teacher')
+        enqueue_reminder(user, 'sms')
+
+        job = self.run_next_job()
+        self.assertEqual((job.status, job.success), ('pending', False))
+        self.assertGreater(job.run_after, timezone.now())
+
+        ReminderJob.objects.filter(id=job.id).update(attempts=job.max_attempts - 1, run_after=timezone.now())
+        job = self.run_next_job()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(ReminderLog.objects.filter(user=user, success=False).count(), 2)
+
+    def test_job_covers_the_users_local_day(self):
+        for time_zone in FAR_TIME_ZONES:
+            user = create_user(time_zone.split('/')[1].lower(), time_zone=time_zone)
+            today = create_local_day_tasks(user)
+            enqueue_reminder(user, 'email')
+            self.run_next_job()
+
+            self.assertEqual(reminded_tasks(mail.outbox[-1]), [today])
+
+    def test_stale_running_jobs_are_released(self):
+        user = create_user('teacher')
+        stale = ReminderJob.objects.create(
+            user=user, reminder_type='email', status='running',
+            locked_by='worker-a', locked_at=timezone.now() - timedelta(minutes=10),
+        )
+        fresh = ReminderJob.objects.create(
+            user=user, reminder_type='email', status='running',
+            locked_by='worker-b', locked_at=timezone.now(),
+        )
+
+        self.assertEqual(release_stale_jobs(300), (1, 0))
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), ('pending', None))
+        self.assertEqual(fresh.status, 'running')
+
+    def test_job_stale_on_its_last_attempt_fails(self):
+        user = create_user('teacher')
+        job = enqueue_reminder(user, 'email')
+        ReminderJob.objects.filter(id=job.id).update(attempts=job.max_attempts - 1)
+        claim_jobs('worker-a', 10)
+        ReminderJob.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(minutes=10))
+
+        self.assertEqual(release_stale_jobs(300), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('failed', job.max_attempts, None))
+        self.assertEqual(claim_jobs('worker-b', 10), [])
+
+
+class HTTPTransportTests(TestCase):
+
+    def test_reuses_the_connection_for_the_next_request(self):
+        transport = HTTPTransport(pool_size=2)
+        body = json.dumps({'registration_ids': ['token']}).encode()
+        with StubProviders() as providers:
+            url = providers.settings['FCM_API_URL']
+            first = transport.request('POST', url, body=body)
+            pool = next(iter(transport._pools.values()))
+            pooled = pool.queue[0]
+            second = transport.request('POST', url, body=body)
+
+            self.assertEqual(list(pool.queue), [pooled])
+            transport.close()
+
+        self.assertEqual((first.status, second.status), (200, 200))
+        self.assertEqual(second.json()['success'], 1)
+        self.assertEqual(providers.sent['push'], 2)
+        self.assertEqual(transport._pools, {})
+
+    def test_post_is_not_sent_again_when_its_response_is_lost(self):
+        transport = HTTPTransport(pool_size=2)
+        with StubProviders() as providers:
+            url = f"{providers.settings['TWILIO_API_URL']}/Messages.json"
+            transport.request('POST', url, body=b'To=%2B15550000000')
+            providers.unanswered = 1
+
+            with self.assertRaises(ConnectionError):
+                transport.request('POST', url, body=b'To=%2B15550000000')
+            transport.close()
+
+        self.assertEqual(providers.sent['sms'], 2)
+
+    def test_connection_closed_while_idle_is_replaced(self):
+        transport = HTTPTransport(pool_size=2)
+        with StubProviders() as providers:
+            providers.close_idle = True
+            url = f"{providers.settings['TWILIO_API_URL']}/Messages.json"
+            transport.request('POST', url, body=b'To=%2B15550000000')
+            # Give the stub time to close its end
+            time_module.sleep(0.05)
+            response = transport.request('POST', url, body=b'To=%2B15550000000')
+            transport.close()
+
+        self.assertEqual(response.status, 201)
+        self.assertEqual(providers.sent['sms'], 2)
+
+
+class PushMulticastTests(TestCase):
+
+    @override_settings(FCM_MULTICAST_SIZE=2)
+    def test_recipients_of_the_same_message_share_batches(self):
+        pending = Task(text='Grade essays', completed=False)
+        busy = [create_user(f'busy{i}') for i in range(3)]
+        done = create_user('done')
+
+        batches = NotificationService.group_push_recipients(
+            [(user, [pending]) for user in busy] + [(done, [])]
+        )
+
+        self.assertEqual(
+            [(message['data']['task_count'], [user.username for user in users]) for message, users in batches],
+            [('1', ['busy0', 'busy1']), ('1', ['busy2']), ('0', ['done'])],
+        )
+
+    def test_one_request_reaches_every_token(self):
+        users = [create_user(f'teacher{i}', fcm_token=f'token-{i}') for i in range(2)]
+        users.insert(1, create_user('no-token'))
+        message = NotificationService.build_push_message([])
+
+        with StubProviders() as providers, override_settings(**providers.settings):
+            results = NotificationService.send_push_multicast(message, users)
+
+        self.assertEqual(
+            [(user.username, success, error_message) for user, success, error_message in results],
+            [('teacher0', True, None), ('no-token', False, 'No FCM token'), ('teacher1', True, None)],
+        )
+        self.assertEqual(providers.sent['push'], 2)
+
+
+@override_settings(EMAIL_BACKEND='tasks.tests.RefusingEmailBackend')
+class EmailBatchTests(TestCase):
+
+    def test_batch_goes_over_one_connection(self):
+        RefusingEmailBackend.opened = 0
+        users = [create_user(f'teacher{i}') for i in range(3)]
+        tasks = [Task(text='Grade essays', completed=False), Task(text='Plan assembly', completed=True)]
+
+        results = NotificationService.send_email_batch([(user, tasks) for user in users])
+
+        self.assertEqual([success for user, success, error_message in results], [True, True, True])
+        self.assertEqual(RefusingEmailBackend.opened, 1)
+        self.assertEqual([message.to for message in mail.outbox], [[user.email] for user in users])
+        self.assertIn('Grade essays', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].subject, 'Daily Task Reminder - teacher0')
+
+    def test_refused_recipient_only_fails_their_message(self):
+        users = [create_user('teacher0'), create_user('gone'), create_user('teacher1')]
+        users[1].email = 'gone@example.org'
+
+        results = NotificationService.send_email_batch([(user, []) for user in users])
+
+        self.assertEqual([success for user, success, error_message in results], [True, False, True])
+        self.assertIn('gone@example.org', results[1][2])
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class ProviderGuardTests(TestCase):
+
+    def guard(self, reset_timeout=60):
+        return ProviderGuard('sms', rate=1000, burst=1000, failure_threshold=2, reset_timeout=reset_timeout)
+
+    def fail(self, guard):
+        def send():
+            raise ConnectionError
+        with self.assertRaises(ConnectionError):
+            guard.call(send)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        guard = self.guard()
+        calls = []
+        with self.assertLogs('tasks.resilience', 'WARNING') as logs:
+            self.fail(guard)
+            self.fail(guard)
+        self.assertEqual(logs.output, ['WARNING:tasks.resilience:Circuit for sms opened after 2 failures'])
+
+        with self.assertRaises(CircuitOpenError) as raised:
+            guard.call(calls.append, 'sent')
+        self.assertEqual(calls, [])
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    def test_probe_after_the_reset_timeout_closes_the_breaker(self):
+        guard = self.guard(reset_timeout=0)
+        with self.assertLogs('tasks.resilience', 'WARNING'):
+            self.fail(guard)
+            self.fail(guard)
+        self.assertEqual(guard.breaker.state, 'open')
+
+        self.assertEqual(guard.call(lambda: 'sent'), 'sent')
+        self.assertEqual(guard.breaker.state, 'closed')
+
+    def test_throttled_responses_count_as_failures_and_client_errors_do_not(self):
+        class Response:
+            status = 503
+
+        guard = self.guard()
+        guard.call(lambda: Response(), is_failure=http_provider_failure)
+        self.assertEqual(guard.breaker.failures, 1)
+
+        def refused():
+            raise smtplib.SMTPRecipientsRefused({})
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            guard.call(refused, client_errors=(smtplib.SMTPRecipientsRefused,))
+        self.assertEqual((guard.breaker.state, guard.breaker.failures), ('closed', 0))
+
+    def test_bucket_waits_once_the_burst_is_used(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        started = time_module.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertGreaterEqual(time_module.monotonic() - started, 0.04)
+
+
+class TodaySummaryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher', buffer_time=1.5)
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.task = create_task(self.user, due_date=today)
+        create_task(self.user, due_date=today, completed=True)
+
+    def test_a_cached_summary_costs_no_queries(self):
+        summary = get_today_summary(self.user, self.user.profile)
+        self.assertEqual(
+            (summary['total_count'], summary['completed_count'], summary['buffer_time']),
+            (2, 1, 1.5),
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_today_summary(self.user, self.user.profile), summary)
+
+    def test_task_views_invalidate_the_summary(self):
+        get_today_summary(self.user, self.user.profile)
+
+        self.client.post(reverse('tasks:add_task'), {'text': 'Call parents'}, content_type='application/json')
+        self.assertEqual(get_today_summary(self.user, self.user.profile)['total_count'], 3)
+
+        self.client.post(reverse('tasks:toggle_task', args=[self.task.id]))
+        self.assertEqual(get_today_summary(self.user, self.user.profile)['completed_count'], 2)
+
+
+class IndexTests(TestCase):
+
+    def test_hot_queries_use_the_composite_indexes(self):
+        user = create_user('teacher')
+        today = timezone.now().date()
+        dashboard = dashboard_tasks(user, today)
+        history = ReminderLog.objects.filter(user=user).order_by('-sent_at', '-id')
+
+        self.assertIn('tasks_task_user_due_idx', dashboard.explain())
+        self.assertIn('tasks_log_user_sent_id_idx', history.explain())
+        # Both come out of the index already in order, without a sort step
+        self.assertNotIn('TEMP B-TREE', dashboard.explain())
+        self.assertNotIn('TEMP B-TREE', history.explain())
+
+
+class BatchTasksTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.client.force_login(self.user)
+        self.tasks = [create_task(self.user, f'Task {i}') for i in range(3)]
+
+    def batch(self, operations):
+        return self.client.post(reverse('tasks:batch_tasks'), {'operations': operations}, content_type='application/json')
+
+    def test_applies_every_operation(self):
+        first, second, third = self.tasks
+        response = self.batch([
+            {'op': 'create', 'text': 'Mark tests', 'priority': 'high'},
+            {'op': 'toggle', 'id': first.id},
+            {'op': 'delete', 'id': second.id},
+            {'op': 'reorder', 'ids': [third.id, first.id]},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(result['ok'] for result in response.json()['results']))
+        self.assertTrue(Task.objects.filter(user=self.user, text='Mark tests', priority='high').exists())
+        self.assertFalse(Task.objects.filter(id=second.id).exists())
+        first.refresh_from_db()
+        third.refresh_from_db()
+        self.assertTrue(first.completed)
+        self.assertEqual((third.position, first.position), (0, 1))
+
+    def test_one_invalid_operation_applies_nothing(self):
+        other = create_task(create_user('other'))
+        response = self.batch([
+            {'op': 'create', 'text': 'Mark tests'},
+            {'op': 'delete', 'id': self.tasks[0].id},
+            {'op': 'toggle', 'id': other.id},
+            {'op': 'rename', 'id': self.tasks[1].id},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result['error'] for result in response.json()['results']],
+            [None, None, 'Task not found', 'Unknown operation'],
+        )
+        self.assertFalse(Task.objects.filter(text='Mark tests').exists())
+        self.assertTrue(Task.objects.filter(id=self.tasks[0].id).exists())
+        other.refresh_from_db()
+        self.assertFalse(other.completed)
+
+    def test_operations_on_a_deleted_task_are_rejected(self):
+        task = self.tasks[0]
+        response = self.batch([{'op': 'delete', 'id': task.id}, {'op': 'toggle', 'id': task.id}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Task.objects.filter(id=task.id).exists())
+
+    @override_settings(TASK_BATCH_MAX_OPERATIONS=2)
+    def test_rejects_empty_and_oversized_batches(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        response = self.batch([{'op': 'create', 'text': f'Task {i}'} for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'At most 2 operations per batch')
+
+
+class ImportExportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user('owner')
+        create_task(self.owner, 'Grade essays', priority='high', category='work', completed=True, position=2)
+        create_task(self.owner, 'Choir practice', category='church', due_date=timezone.now().date() + timedelta(days=3))
+
+    def export(self, fmt):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('tasks:export_tasks'), {'format': fmt})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def import_as(self, username, data, fmt):
+        user = create_user(username)
+        self.client.force_login(user)
+        response = self.client.post(f"{reverse('tasks:import_tasks')}?format={fmt}", data, content_type='text/plain')
+        return user, response
+
+    def task_rows(self, user):
+        return list(
+            Task.objects.filter(user=user).order_by('text')
+            .values_list('text', 'priority', 'category', 'completed', 'position', 'due_date')
+        )
+
+    def test_ndjson_round_trip(self):
+        user, response = self.import_as('copy', self.export('ndjson'), 'ndjson')
+
+        self.assertEqual(response.json(), {'created': 2})
+        self.assertEqual(self.task_rows(user), self.task_rows(self.owner))
+
+    def test_csv_upload_round_trip(self):
+        upload = SimpleUploadedFile('tasks.csv', self.export('csv'))
+        user = create_user('copy')
+        self.client.force_login(user)
+
+        response = self.client.post(reverse('tasks:import_tasks'), {'file': upload})
+
+        self.assertEqual(response.json(), {'created': 2})
+        self.assertEqual(self.task_rows(user), self.task_rows(self.owner))
+
+    def test_bad_rows_are_reported_and_import_nothing(self):
+        for i, (row, error) in enumerate([
+            ('{"text": "Grade essays", "position": "abc"}', "Line 2: invalid position: 'abc'"),
+            ('{"text": "Grade essays", "due_date": "2024-02-30"}', "Line 2: invalid due_date: '2024-02-30'"),
+            ('{"text": "Grade essays", "priority": "urgent"}', "Line 2: invalid priority: 'urgent'"),
+            ('{"priority": "high"}', 'Line 2: text is required'),
+        ]):
+            with self.subTest(row=row):
+                user, response = self.import_as(f'importer{i}', '{"text": "Plan assembly"}\n' + row, 'ndjson')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': error})
+                self.assertFalse(Task.objects.filter(user=user).exists())
+
+
+class ReminderHistoryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.client.force_login(self.user)
+
+    def create_log(self, sent_at, reminder_type='email', success=True):
+        log = ReminderLog.objects.create(user=self.user, reminder_type=reminder_type, success=success)
+        ReminderLog.objects.filter(id=log.id).update(sent_at=sent_at)
+        return log.id
+
+    def history(self, **params):
+        response = self.client.get(reverse('tasks:reminder_history'), params)
+        return response.status_code, response.json()
+
+    def test_pages_through_every_log_once_despite_ties(self):
+        now = timezone.now()
+        newest = self.create_log(now)
+        tied = [self.create_log(now - timedelta(hours=1)) for _ in range(5)]
+        oldest = self.create_log(now - timedelta(days=1))
+
+        seen = []
+        params = {'limit': 2}
+        while True:
+            status, page = self.history(**params)
+            self.assertEqual(status, 200)
+            self.assertLessEqual(len(page['history']), 2)
+            seen += [entry['id'] for entry in page['history']]
+            if not page['next_cursor']:
+                break
+            params['cursor'] = page['next_cursor']
+
+        self.assertEqual(seen, [newest] + sorted(tied, reverse=True) + [oldest])
+
+    def test_filters(self):
+        now = timezone.now()
+        self.create_log(now, 'email', success=True)
+        failed_sms = self.create_log(now - timedelta(hours=1), 'sms', success=False)
+        self.create_log(now - timedelta(days=3), 'sms', success=False)
+
+        status, page = self.history(type='sms', success='false', since=(now - timedelta(days=1)).date().isoformat())
+
+        self.assertEqual([entry['id'] for entry in page['history']], [failed_sms])
+        self.assertEqual(page['history'][0]['type'], 'SMS')
+
+    def test_rejects_invalid_parameters(self):
+        for params in [{'type': 'fax'}, {'success': 'maybe'}, {'since': 'yesterday'}, {'limit': 'ten'}, {'cursor': 'not-a-cursor'}]:
+            with self.subTest(params=params):
+                status, body = self.history(**params)
+                self.assertEqual(status, 400)
+                self.assertIn('error', body)
+
+
+@override_settings(DASHBOARD_EVENTS={'BACKEND': 'database'})
+class DashboardEventTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.watching = create_user('watching')
+        self.away = create_user('away')
+        self.lapsed = create_user('lapsed')
+        DashboardStream.objects.create(user=self.watching, expires_at=timezone.now() + timedelta(seconds=30))
+        DashboardStream.objects.create(user=self.lapsed, expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_reminder_events_are_only_stored_for_open_dashboards(self):
+        with ReminderLogBuffer() as buffer:
+            for user in (self.watching, self.away, self.lapsed):
+                buffer.add(user, 'email', True)
+
+        self.assertEqual(ReminderLog.objects.count(), 3)
+        self.assertEqual(
+            list(DashboardEvent.objects.values_list('user__username', 'kind')),
+            [('watching', 'reminder.sent')],
+        )
+
+    def test_task_events_are_kept_for_reconnecting_dashboards(self):
+        self.client.force_login(self.away)
+        self.client.post(reverse('tasks:add_task'), {'text': 'Call parents'}, content_type='application/json')
+
+        event = DashboardEvent.objects.get(user=self.away)
+        self.assertEqual((event.kind, event.data['task']['text']), ('task.created', 'Call parents'))
+
+    def test_stream_needs_the_asgi_app(self):
+        self.client.force_login(self.watching)
+        self.assertEqual(self.client.get(reverse('tasks:event_stream')).status_code, 204)
+
+
+class MemoryEventStreamTests(TestCase):
+
+    async def test_stream_sends_events_published_after_it_opened(self):
+        with override_settings(DASHBOARD_EVENTS={'BACKEND': 'memory'}):
+            stream = stream_events(42)
+            self.assertEqual(await stream.__anext__(), 'retry: 3000\n\n')
+            publish_event(42, 'task.updated', {'task': {'id': 7}})
+            publish_events([(43, 'task.updated', {'task': {'id': 8}})])
+
+            chunk = await stream.__anext__()
+            await stream.aclose()
+
+        self.assertRegex(chunk, r'^id: \d+\nevent: task.updated\ndata: \{"task": \{"id": 7\}\}\n\n$')
+
+
+class AsyncNotificationApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.async_client.force_login(self.user)
+
+    async def test_send_reminder_queues_a_job(self):
+        response = await self.async_client.post(reverse('tasks:send_reminder'), {'type': 'sms'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        job = await ReminderJob.objects.aget(id=response.json()['job_id'])
+        self.assertEqual((job.user_id, job.reminder_type, job.status), (self.user.id, 'sms', 'pending'))
+        status = await self.async_client.get(response.json()['status_url'])
+        self.assertEqual(status.json()['status'], 'pending')
+
+    async def test_send_reminder_rejects_unknown_types(self):
+        response = await self.async_client.post(reverse('tasks:send_reminder'), {'type': 'fax'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await ReminderJob.objects.aexists())
+
+    async def test_settings_update_reschedules_the_reminder(self):
+        url = reverse('tasks:notification_settings')
+        response = await self.async_client.post(
+            url, {'reminder_time': '06:45', 'time_zone': 'Europe/London', 'sms_reminders': True}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        profile = await UserProfile.objects.aget(user=self.user)
+        self.assertEqual(profile.next_reminder_at, profile.get_next_reminder_at(timezone.now()))
+        settings = (await self.async_client.get(url)).json()
+        self.assertEqual(
+            (settings['reminder_time'], settings['time_zone'], settings['sms_reminders']),
+            ('06:45', 'Europe/London', True),
+        )
+
+    async def test_settings_reject_unknown_time_zones(self):
+        response = await self.async_client.post(
+            reverse('tasks:notification_settings'), {'time_zone': 'Mars/Olympus'}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(REMINDER_DEDUP_WINDOW=3600, REMINDER_DEDUP_CLAIM_TIMEOUT=900)
+class DeliveryDedupTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('teacher', push_reminders=False)
+        self.today = timezone.now().date()
+        self.tasks = [create_task(self.user, due_date=self.today)]
+
+    def test_same_reminder_is_claimed_once(self):
+        delivery_id = claim_delivery(self.user, 'email', self.tasks, self.today)
+        self.assertIsNot(delivery_id, False)
+        confirm_deliveries([delivery_id])
+
+        self.assertIs(claim_delivery(self.user, 'email', self.tasks, self.today), False)
+        self.assertIsNot(claim_delivery(self.user, 'sms', self.tasks, self.today), False)
+        self.tasks[0].completed = True
+        self.assertIsNot(claim_delivery(self.user, 'email', self.tasks, self.today), False)
+
+    def test_released_claims_can_be_retried(self):
+        claims = claim_deliveries([(self.user, 'email', self.tasks)], self.today)
+        release_deliveries(claims.values())
+
+        self.assertIsNot(claim_delivery(self.user, 'email', self.tasks, self.today), False)
+
+    def test_unconfirmed_claims_lapse(self):
+        delivery_id = claim_delivery(self.user, 'email', self.tasks, self.today)
+        self.assertIs(claim_delivery(self.user, 'email', self.tasks, self.today), False)
+
+        # The run holding the claim died before sending
+        ReminderDelivery.objects.filter(id=delivery_id).update(claimed_at=timezone.now() - timedelta(seconds=901))
+        self.assertIsNot(claim_delivery(self.user, 'email', self.tasks, self.today), False)
+
+    def test_duplicate_job_is_not_sent(self):
+        confirm_deliveries([claim_delivery(self.user, 'email', self.tasks, self.today)])
+        enqueue_reminder(self.user, 'email')
+
+        with ReminderLogBuffer() as buffer:
+            job = run_job(claim_jobs('worker-a', 1)[0], buffer)
+
+        self.assertEqual((job.status, job.success), ('duplicate', False))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(ReminderLog.objects.exists())
+
+    def test_overlapping_runs_send_once(self):
+        out = StringIO()
+        for _ in range(2):
+            UserProfile.objects.filter(user=self.user).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+            call_command('send_reminders', stdout=out)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Skipped 1 duplicate reminders', out.getvalue())
+
+
+class MetricsTests(TestCase):
+
+    def test_prometheus_rendering(self):
+        registry = Registry()
+        registry.inc('teachtime_provider_calls_total', {'channel': 'sms', 'outcome': 'success'}, 3)
+        registry.observe('teachtime_provider_call_duration_seconds', {'channel': 'sms'}, 0.02)
+        registry.observe('teachtime_provider_call_duration_seconds', {'channel': 'sms'}, 0.2)
+        registry.flush()
+
+        text = render_prometheus(*merged_snapshots())
+
+        self.assertIn('teachtime_provider_calls_total{channel="sms",outcome="success"} 3\n', text)
+        self.assertIn('teachtime_provider_call_duration_seconds_bucket{channel="sms",le="0.025"} 1\n', text)
+        self.assertIn('teachtime_provider_call_duration_seconds_bucket{channel="sms",le="+Inf"} 2\n', text)
+        self.assertIn('teachtime_provider_call_duration_seconds_count{channel="sms"} 2\n', text)
+
+    def snapshot(self, process, value):
+        counter = [['teachtime_http_requests_total', {'view': 'tasks:dashboard', 'method': 'GET', 'status': '200'}, value]]
+        return MetricsSnapshot.objects.create(process=process, data={'counters': counter, 'histograms': []})
+
+    def total(self):
+        counters, histograms = merged_snapshots()
+        return sum(counters.values())
+
+    def test_counters_stay_monotonic_when_processes_go_away(self):
+        old = self.snapshot('web-1:100:aaaa', 5)
+        self.snapshot('web-2:200:bbbb', 7)
+        MetricsSnapshot.objects.filter(id=old.id).update(updated_at=timezone.now() - timedelta(days=2))
+
+        retire_snapshots(timezone.now() - timedelta(days=1))
+        self.assertEqual(self.total(), 12)
+        self.assertEqual(
+            sorted(MetricsSnapshot.objects.values_list('process', flat=True)),
+            sorted([RETIRED_PROCESS, 'web-2:200:bbbb']),
+        )
+
+        # The next process to retire adds to the retired totals
+        MetricsSnapshot.objects.exclude(process=RETIRED_PROCESS).update(updated_at=timezone.now() - timedelta(days=2))
+        retire_snapshots(timezone.now() - timedelta(days=1))
+        self.assertEqual(self.total(), 12)
+        self.assertEqual(list(MetricsSnapshot.objects.values_list('process', flat=True)), [RETIRED_PROCESS])
+
+    def test_endpoint_needs_staff_or_the_token(self):
+        url = reverse('tasks:metrics')
+        self.client.force_login(create_user('teacher'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        with override_settings(METRICS={'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get(url).status_code, 401)
+            response = self.client.get(url, headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE teachtime_http_requests_total counter', response.content.decode())
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_reports_scenarios_and_rolls_back_their_data(self):
+        out = StringIO()
+        call_command(
+            'benchmark', 'history', 'indexes', 'send_reminders',
+            '--iterations', '2', '--users', '3', '--total-tasks', '30', '--total-logs', '30', '--reminder-users', '4',
+            stdout=out,
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(sorted(report['results']), ['history', 'indexes', 'send_reminders'])
+        self.assertEqual(report['results']['history']['pages']['after_0_rows']['latency']['iterations'], 2)
+        self.assertIn('tasks_log_user_sent_id_idx', ' '.join(report['results']['indexes']['queries']['reminder_history']['plan']))
+        self.assertEqual(report['results']['send_reminders']['sent'], {'email': 4, 'sms': 4, 'push': 4})
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(ReminderLog.objects.exists())
+
+
+class ShardedRunTests(TestCase):
+
+    def setUp(self):
+        today = timezone.now().date()
+        self.users = [create_user(f'teacher{i}', push_reminders=False) for i in range(6)]
+        for user in self.users:
+            create_task(user, due_date=today)
+        UserProfile.objects.update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+
+    def runs(self):
+        out = StringIO()
+        call_command('reminder_runs', '--json', stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_shards_split_the_users_without_overlap(self):
+        for shard in ('0/2', '1/2'):
+            call_command('send_reminders', '--shard', shard, '--run-id', 'window-1', stdout=StringIO())
+
+        self.assertCountEqual([message.to[0] for message in mail.outbox], [user.email for user in self.users])
+        [run] = self.runs()
+        self.assertEqual(
+            (run['run_id'], run['shards_finished'], run['missing_shards'], run['users'], run['sent']),
+            ('window-1', 2, [], 6, 6),
+        )
+
+    def test_reports_missing_shards(self):
+        call_command('send_reminders', '--shard', '0/2', '--run-id', 'window-1', stdout=StringIO())
+
+        [run] = self.runs()
+        self.assertEqual((run['shards_finished'], run['missing_shards']), (1, [1]))
+        self.assertEqual(run['sent'], 3)
+
+    def test_shards_need_a_shared_run_id(self):
+        with self.assertRaisesMessage(CommandError, '--run-id is required'):
+            call_command('send_reminders', '--shard', '0/2', stdout=StringIO())
+
+
+@override_settings(METRICS={'ENABLED': False})
+class CachedAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.client.force_login(self.user)
+
+    def test_warm_requests_skip_the_session_user_and_profile_queries(self):
+        url = reverse('tasks:reminder_history')
+        self.client.get(url)
+
+        # Only the view's own reads of the logs and summaries
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_saving_the_profile_refreshes_the_cached_copy(self):
+        url = reverse('tasks:notification_settings')
+        self.assertEqual(self.client.get(url).json()['reminder_time'], '08:00')
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.reminder_time = time(7, 15)
+        profile.save()
+
+        self.assertEqual(self.client.get(url).json()['reminder_time'], '07:15')
+
+    def test_password_change_still_ends_other_sessions(self):
+        url = reverse('tasks:reminder_history')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.user.set_password('new password')
+        self.user.save()
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class RecurrenceRuleTests(TestCase):
+
+    def test_monthly_on_the_31st_skips_shorter_months(self):
+        rule = RecurrenceRule(frequency='monthly', start_date=date(2024, 1, 31))
+
+        self.assertTrue(rule.occurs_on(date(2024, 1, 31)))
+        self.assertFalse(rule.occurs_on(date(2024, 2, 29)))
+        self.assertEqual(rule.next_on_or_after(date(2024, 2, 1)), date(2024, 3, 31))
+        self.assertEqual(rule.next_on_or_after(date(2024, 4, 1)), date(2024, 5, 31))
+
+        rule.interval = 2
+        self.assertEqual(next_dates(rule, date(2024, 1, 1), 3), [date(2024, 1, 31), date(2024, 3, 31), date(2024, 5, 31)])
+
+    def test_weekly_with_an_interval_counts_weeks_from_the_start_week(self):
+        # Mondays and Thursdays every other week, starting on a Wednesday
+        rule = RecurrenceRule(frequency='weekly', interval=2, weekdays='0,3', start_date=date(2024, 1, 3))
+
+        self.assertFalse(rule.occurs_on(date(2024, 1, 1)))
+        self.assertTrue(rule.occurs_on(date(2024, 1, 4)))
+        self.assertFalse(rule.occurs_on(date(2024, 1, 8)))
+        self.assertEqual(next_dates(rule, date(2024, 1, 5), 3), [date(2024, 1, 15), date(2024, 1, 18), date(2024, 1, 29)])
+
+    def test_weekly_defaults_to_the_start_weekday_and_stops_at_the_end_date(self):
+        rule = RecurrenceRule(frequency='weekly', start_date=date(2024, 1, 7), end_date=date(2024, 1, 20))
+
+        self.assertEqual(next_dates(rule, date(2024, 1, 1), 5), [date(2024, 1, 7), date(2024, 1, 14)])
+        self.assertIsNone(rule.next_on_or_after(date(2024, 1, 15)))
+
+
+class PendingOccurrenceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.today = timezone.now().date()
+        self.rule = RecurrenceRule.objects.create(user=self.user, text='Staff meeting', frequency='daily')
+
+    def pending(self):
+        return pending_occurrences(RecurrenceRule.objects.filter(user=self.user), self.today).get(self.user.id, [])
+
+    def test_occurrence_without_a_row_is_pending(self):
+        [occurrence] = self.pending()
+
+        self.assertIsNone(occurrence.id)
+        self.assertEqual(occurrence.occurrence, f'{self.rule.id}:{self.today.isoformat()}')
+        self.assertFalse(Task.objects.exists())
+
+    def test_materialized_and_excluded_occurrences_are_not_pending(self):
+        self.client.force_login(self.user)
+        occurrence = f'{self.rule.id}:{self.today.isoformat()}'
+        response = self.client.post(
+            reverse('tasks:batch_tasks'), {'operations': [{'op': 'toggle', 'occurrence': occurrence}]}, content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        task = Task.objects.get(recurrence=self.rule, due_date=self.today)
+        self.assertTrue(task.completed)
+        self.assertEqual(self.pending(), [])
+
+        task.delete()
+        self.rule.exclude(self.today)
+        self.assertEqual(self.pending(), [])
+
+    def test_behind_rules_catch_up_and_drop_past_exclusions(self):
+        start = self.today - timedelta(days=10)
+        past = (self.today - timedelta(days=3)).isoformat()
+        RecurrenceRule.objects.filter(id=self.rule.id).update(start_date=start, next_occurrence=start, excluded_dates=[past])
+
+        self.assertEqual(len(self.pending()), 1)
+        self.rule.refresh_from_db()
+        self.assertEqual((self.rule.next_occurrence, self.rule.excluded_dates), (self.today, []))
+
+    def test_users_whose_only_task_recurs_get_a_reminder(self):
+        work_set = SendRemindersCommand().get_work_set(User.objects.all(), self.today)
+
+        self.assertEqual([task.text for task in work_set[0].todays_tasks], ['Staff meeting'])
+
+    def test_reminders_without_occurrences_hash_as_before(self):
+        tasks = [create_task(self.user, 'Grade essays'), create_task(self.user, 'Plan assembly', completed=True)]
+        legacy = hashlib.sha256(json.dumps(sorted([task.id, task.text, task.completed] for task in tasks)).encode()).hexdigest()
+
+        self.assertEqual(content_hash(tasks), legacy)
+        self.assertNotEqual(content_hash(tasks + self.pending()), legacy)
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.client.force_login(self.user)
+        now = timezone.now()
+        self.old = (now - timedelta(days=100)).replace(hour=12)
+        for reminder_type, success, skipped in [('email', True, False), ('email', True, False), ('email', False, False), ('sms', False, True)]:
+            self.create_log(self.old, reminder_type, success, skipped)
+        for minutes in (1, 2):
+            self.create_log(now - timedelta(minutes=minutes), 'push', True, False)
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+
+    def create_log(self, sent_at, reminder_type, success, skipped):
+        log = ReminderLog.objects.create(user=self.user, reminder_type=reminder_type, success=success, skipped=skipped)
+        ReminderLog.objects.filter(id=log.id).update(sent_at=sent_at)
+
+    def compact(self):
+        call_command('compact_reminder_logs', '--archive-dir', self.archive_dir.name, '--batch-size', '3', stdout=StringIO())
+        return next(Path(self.archive_dir.name).iterdir())
+
+    def stats(self):
+        since = (self.old - timedelta(days=1)).date().isoformat()
+        return self.client.get(reverse('tasks:reminder_stats'), {'since': since}).json()['channels']
+
+    def test_old_logs_are_summarised_archived_and_removed(self):
+        archive = self.compact()
+
+        self.assertEqual(list(ReminderLog.objects.values_list('reminder_type', flat=True)), ['push', 'push'])
+        self.assertEqual(
+            sorted(ReminderSummary.objects.values_list('reminder_type', 'date', 'total', 'succeeded', 'failed', 'skipped')),
+            [('email', self.old.date(), 3, 2, 1, 0), ('sms', self.old.date(), 1, 0, 0, 1)],
+        )
+        # One gzip member per batch, read back as one stream
+        with gzip.open(archive, 'rt') as lines:
+            rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['username'] for row in rows}, {'teacher'})
+
+    def test_history_and_stats_continue_into_summaries(self):
+        stats = self.stats()
+        self.compact()
+
+        self.assertEqual(self.stats(), stats)
+        first = self.client.get(reverse('tasks:reminder_history'), {'limit': 2}).json()
+        self.assertEqual([entry['type'] for entry in first['history']], ['Push Notification', 'Push Notification'])
+        second = self.client.get(reverse('tasks:reminder_history'), {'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(
+            sorted((entry['type'], entry['total']) for entry in second['history'] if entry['summary']),
+            [('Email', 3), ('SMS', 1)],
+        )
+        self.assertIsNone(second['next_cursor'])
+
+    def test_restoring_an_archive_does_not_count_logs_twice(self):
+        stats = self.stats()
+        archive = self.compact()
+
+        call_command('import_data', 'reminders', str(archive), stdout=StringIO())
+
+        self.assertEqual(ReminderLog.objects.count(), 6)
+        self.assertFalse(ReminderSummary.objects.exists())
+        self.assertEqual(self.stats(), stats)
+
+    def test_malformed_summary_cursors_are_rejected(self):
+        for position in [{'a': 1, 'b': 2, 'c': 3}, ['summary', 'not a date', 1], ['summary', '2024-01-01', 'one']]:
+            with self.subTest(position=position):
+                cursor = urlsafe_b64encode(json.dumps(position).encode()).decode()
+                response = self.client.get(reverse('tasks:reminder_history'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class ReplicaRouterTests(TestCase):
+
+    def test_reads_go_to_the_primary_unless_a_caller_opts_in(self):
+        router = ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(Task))
+        with read_from('replica'):
+            self.assertEqual(router.db_for_read(Task), 'replica')
+            self.assertEqual(router.db_for_write(Task), 'default')
+        self.assertIsNone(router.db_for_read(Task))
+
+    def test_stale_rules_keep_exclusions_made_on_the_primary(self):
+        user = create_user('teacher')
+        today = timezone.now().date()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        rule = RecurrenceRule.objects.create(user=user, text='Staff meeting', frequency='daily', start_date=today - timedelta(days=3))
+        RecurrenceRule.objects.filter(id=rule.id).update(next_occurrence=today - timedelta(days=3))
+        # As read from a replica before the user deleted tomorrow's occurrence
+        stale = RecurrenceRule.objects.get(id=rule.id)
+        RecurrenceRule.objects.filter(id=rule.id).update(excluded_dates=[tomorrow])
+
+        [advanced] = advance_rules([stale], today)
+
+        self.assertEqual(advanced.next_occurrence, today)
+        self.assertEqual(advanced.excluded_dates, [tomorrow])
+        rule.refresh_from_db()
+        self.assertEqual((rule.next_occurrence, rule.excluded_dates), (today, [tomorrow]))
+
+    def test_rules_deleted_on_the_primary_are_dropped(self):
+        user = create_user('teacher')
+        today = timezone.now().date()
+        rule = RecurrenceRule.objects.create(user=user, text='Staff meeting', frequency='daily', start_date=today - timedelta(days=3))
+        RecurrenceRule.objects.filter(id=rule.id).update(next_occurrence=today - timedelta(days=3))
+        stale = RecurrenceRule.objects.get(id=rule.id)
+        rule.delete()
+
+        self.assertEqual(advance_rules([stale], today), [])
+
+    def test_schedule_changed_on_the_primary_is_not_overwritten(self):
+        now = timezone.now()
+        due = create_user('due', next_reminder_at=now - timedelta(minutes=1)).profile
+        moved = create_user('moved', next_reminder_at=now + timedelta(days=1)).profile
+
+        SendRemindersCommand().advance_schedules([due.id, moved.id], now + timedelta(minutes=5), now)
+
+        due.refresh_from_db()
+        self.assertGreater(due.next_reminder_at, now)
+        self.assertEqual(UserProfile.objects.get(id=moved.id).next_reminder_at, moved.next_reminder_at)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingMiddlewareTests(TransactionTestCase):
+    # The replica mirrors the test database, so it sees committed rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.client.force_login(self.user)
+
+    def replica_queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, len(queries)
+
+    def test_safe_requests_read_the_replica(self):
+        response, queries = self.replica_queries('get', reverse('tasks:reminder_stats'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+        self.assertNotIn('read_primary', response.cookies)
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        response, queries = self.replica_queries(
+            'post', reverse('tasks:add_task'), data={'text': 'Prepare lesson'}, content_type='application/json',
+        )
+        self.assertEqual(queries, 0)
+        self.assertEqual(response.cookies['read_primary']['max-age'], 5)
+
+        response, queries = self.replica_queries('get', reverse('tasks:reminder_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 0)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_nothing_sticks_without_replicas(self):
+        response = self.client.post(reverse('tasks:add_task'), data={'text': 'Prepare lesson'}, content_type='application/json')
+
+        self.assertNotIn('read_primary', response.cookies)
+
+
+# The manifest storage needs collectstatic to have run before pages render
+PLAIN_STATIC_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class DashboardFragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('teacher')
+        self.client.force_login(self.user)
+        self.task = create_task(self.user)
+
+    def dashboard(self):
+        return self.client.get(reverse('tasks:dashboard')).content.decode()
+
+    def test_warm_task_list_is_served_without_querying_tasks(self):
+        self.dashboard()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn('Prepare lesson', self.dashboard())
+        self.assertFalse([query for query in queries if 'tasks_task' in query['sql']])
+
+    def test_list_stays_cached_until_the_version_is_bumped(self):
+        self.dashboard()
+        Task.objects.filter(id=self.task.id).update(text='Mark essays')
+
+        self.assertIn('Prepare lesson', self.dashboard())
+        bump_task_version(self.user.id)
+        self.assertIn('Mark essays', self.dashboard())
+
+    def test_changes_through_the_views_refresh_the_list(self):
+        create_task(self.user, text='Mark essays')
+        self.assertIn('Prepare lesson', self.dashboard())
+
+        self.client.post(reverse('tasks:toggle_task', args=[self.task.id]))
+
+        page = self.dashboard()
+        self.assertNotIn('Prepare lesson', page)
+        self.assertIn('Mark essays', page)
+
+    def test_lists_are_cached_per_user(self):
+        self.dashboard()
+        other = create_user('other')
+        create_task(other, text='Mark essays')
+        self.client.force_login(other)
+
+        page = self.dashboard()
+        self.assertIn('Mark essays', page)
+        self.assertNotIn('Prepare lesson', page)
+
+
+class CompressedStaticFilesTests(TestCase):
+
+    def test_collectstatic_writes_hashed_files_with_gzip_copies(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', '--noinput', '--ignore', 'admin', verbosity=0)
+            manifest = json.loads((Path(static_root) / 'staticfiles.json').read_text())
+            hashed = Path(static_root) / manifest['paths']['tasks/dashboard.css']
+
+            self.assertNotEqual(hashed.name, 'dashboard.css')
+            self.assertEqual(gzip.decompress(Path(f'{hashed}.gz').read_bytes()), hashed.read_bytes())
+            # Only the fingerprinted names get copies
+            self.assertFalse((Path(static_root) / 'tasks/dashboard.css.gz').exists())
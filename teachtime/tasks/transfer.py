@@ -0,0 +1,181 @@
+import codecs
+import csv
+import json
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Task, ReminderLog
+
+FORMATS = ['csv', 'ndjson']
+
+TASK_FIELDS = ['id', 'text', 'priority', 'category', 'completed', 'position', 'due_date', 'created_at', 'updated_at']
+REMINDER_FIELDS = ['id', 'reminder_type', 'sent_at', 'success', 'skipped', 'error_message']
+
+# Fields taken from imported rows; ids and bookkeeping timestamps are assigned anew
+TASK_IMPORT_FIELDS = ['text', 'priority', 'category', 'completed', 'position', 'due_date']
+REMINDER_IMPORT_FIELDS = ['reminder_type', 'sent_at', 'success', 'skipped', 'error_message']
+
+
+class ImportRowError(ValueError):
+    """A row in an import file could not be turned into a model instance"""
+
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+@contextmanager
+def preserve_auto_now_add(model, field_name):
+    """Let bulk inserts keep explicit values of an auto_now_add field.
+
+    This changes the field for the whole process, so only use it from
+    management commands, never while serving requests.
+    """
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def export_lines(queryset, fields, fmt, chunk_size=2000):
+    """Yield `queryset` rows as CSV or NDJSON lines without loading it into memory.
+
+    A `user__username` field is written as the `username` column.
+    """
+    columns = ['username' if field == 'user__username' else field for field in fields]
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([value.isoformat() if isinstance(value, (date, datetime)) else value for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) pairs from a text stream of CSV or NDJSON"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    raise ImportRowError(line_number, f"invalid JSON ({e})")
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 't')
+
+
+def clean_row(model, row, fields, line):
+    """Convert the import fields of one row to model field values"""
+    values = {}
+    for name in fields:
+        if name not in row or row[name] in (None, ''):
+            continue
+        field = model._meta.get_field(name)
+        value = row[name]
+        internal_type = field.get_internal_type()
+        try:
+            if internal_type == 'BooleanField':
+                value = parse_bool(value)
+            elif internal_type == 'DateField':
+                value = value if isinstance(value, date) else parse_date(str(value))
+            elif internal_type == 'DateTimeField':
+                value = value if isinstance(value, datetime) else parse_datetime(str(value))
+            elif internal_type == 'PositiveIntegerField':
+                value = int(value)
+                if value < 0:
+                    raise ValueError
+        except (TypeError, ValueError):
+            # Malformed numbers and out of range dates such as 2024-02-30
+            raise ImportRowError(line, f"invalid {name}: {row[name]!r}")
+        if value is None:
+            raise ImportRowError(line, f"invalid {name}: {row[name]!r}")
+        if field.choices and value not in dict(field.choices):
+            raise ImportRowError(line, f"invalid {name}: {value!r}")
+        values[name] = value
+    return values
+
+
+def import_rows(model, stream, fmt, user=None, batch_size=1000, progress=None, after_batch=None):
+    """Create `model` rows from an export file in batches of bulk_create.
+
+    Rows belong to `user` when given, otherwise to the user named in each
+    row's `username` column. `after_batch` is called with the objects of
+    every batch in the transaction that creates them, and `progress` with
+    the running total after it. Returns the number of rows created.
+    """
+    fields = TASK_IMPORT_FIELDS if model is Task else REMINDER_IMPORT_FIELDS
+    total = 0
+    batch = []
+
+    def flush():
+        nonlocal total, batch
+        if not batch:
+            return
+        if user is None:
+            usernames = {username for line, username, values in batch}
+            users = User.objects.filter(username__in=usernames).in_bulk(field_name='username')
+        objects = []
+        for line, username, values in batch:
+            owner = user
+            if owner is None:
+                owner = users.get(username)
+                if owner is None:
+                    raise ImportRowError(line, f"unknown user {username!r}")
+            objects.append(model(user=owner, **values))
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=batch_size)
+            if after_batch:
+                after_batch(objects)
+        total += len(objects)
+        batch = []
+        if progress:
+            progress(total)
+
+    keep_sent_at = preserve_auto_now_add(ReminderLog, 'sent_at') if model is ReminderLog else nullcontext()
+    with keep_sent_at:
+        for line, row in read_rows(stream, fmt):
+            if not isinstance(row, dict):
+                raise ImportRowError(line, "expected an object")
+            if user is None and not row.get('username'):
+                raise ImportRowError(line, "username is required")
+            values = clean_row(model, row, fields, line)
+            if model is Task and not values.get('text'):
+                raise ImportRowError(line, "text is required")
+            if model is ReminderLog:
+                if 'reminder_type' not in values:
+                    raise ImportRowError(line, "reminder_type is required")
+                values.setdefault('sent_at', timezone.now())
+            batch.append((line, row.get('username'), values))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    return total
+
+
+def text_stream(binary):
+    """Decode the lines of an upload, request body or binary file for read_rows"""
+    return codecs.iterdecode(binary, 'utf-8')
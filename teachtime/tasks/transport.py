@@ -0,0 +1,164 @@
+import http.client
+import json
+import queue
+import select
+import threading
+import logging
+from urllib.parse import urlsplit
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_SETTINGS = {
+    'POOL_SIZE': 10,
+    'CONNECT_TIMEOUT': 5.0,
+    'READ_TIMEOUT': 10.0,
+}
+
+# Raised when a kept-alive connection was closed by the server while idle
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+# Methods that are safe to send again when the response was lost
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class HTTPResponse:
+    """Status, headers and fully read body of a pooled request"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class HTTPTransport:
+    """Thread-safe keep-alive HTTP(S) client with a bounded idle pool per host.
+
+    Connections are returned to the pool after each response has been read
+    and reused by the next request to the same scheme/host/port, so repeated
+    provider calls skip the TCP and TLS handshakes.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=10.0):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, key):
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = queue.LifoQueue(maxsize=self.pool_size)
+            return self._pools[key]
+
+    def _new_connection(self, scheme, host, port):
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(host, port, timeout=self.connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        return connection
+
+    def _checkout(self, key):
+        """Return (connection, reused) for key, creating one if none is idle"""
+        pool = self._pool(key)
+        while True:
+            try:
+                connection = pool.get_nowait()
+            except queue.Empty:
+                return self._new_connection(*key), False
+            if not is_dropped(connection):
+                return connection, True
+            connection.close()
+
+    def _checkin(self, key, connection):
+        try:
+            self._pool(key).put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, url, body=None, headers=None):
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        connection, reused = self._checkout(key)
+        try:
+            sent = False
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                sent = True
+                response = connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                # The server dropped a reused keep-alive connection; retry once on
+                # a fresh one. Once the request was written the provider may have
+                # acted on it, so only idempotent requests are sent again; a
+                # second POST could deliver a second SMS or push.
+                if not reused or (sent and method.upper() not in IDEMPOTENT_METHODS):
+                    raise
+                connection.close()
+                connection = self._new_connection(*key)
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+            data = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(key, connection)
+        return HTTPResponse(response.status, response.headers, data)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+def is_dropped(connection):
+    """True if an idle connection was closed by the server (or has unread data)"""
+    if connection.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([connection.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Process-wide transport configured from settings.NOTIFICATION_HTTP"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                options = dict(DEFAULT_HTTP_SETTINGS)
+                options.update(getattr(settings, 'NOTIFICATION_HTTP', {}))
+                _transport = HTTPTransport(
+                    pool_size=options['POOL_SIZE'],
+                    connect_timeout=options['CONNECT_TIMEOUT'],
+                    read_timeout=options['READ_TIMEOUT'],
+                )
+    return _transport
@@ -9,8 +9,18 @@ urlpatterns = [
     path('toggle/<int:task_id>/', views.toggle_task, name='toggle_task'),
     path('delete/<int:task_id>/', views.delete_task, name='delete_task'),
     path('update-buffer/', views.update_buffer, name='update_buffer'),
+    path('api/tasks/batch/', views.batch_tasks, name='batch_tasks'),
+    path('api/recurrences/', views.recurrences, name='recurrences'),
+    path('api/recurrences/<int:rule_id>/delete/', views.delete_recurrence, name='delete_recurrence'),
+    path('api/events/', views.event_stream, name='event_stream'),
     path('settings/', views.settings_page, name='settings'),
     path('api/send-reminder/', views.send_reminder_now, name='send_reminder'),
+    path('api/reminder-jobs/<int:job_id>/', views.reminder_job_status, name='reminder_job_status'),
     path('api/notification-settings/', views.notification_settings, name='notification_settings'),
     path('api/reminder-history/', views.reminder_history, name='reminder_history'),
+    path('api/reminder-stats/', views.reminder_stats, name='reminder_stats'),
+    path('api/export/tasks/', views.export_tasks, name='export_tasks'),
+    path('api/export/reminders/', views.export_reminders, name='export_reminders'),
+    path('api/import/tasks/', views.import_tasks, name='import_tasks'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
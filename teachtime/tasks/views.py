@@ -1,57 +1,127 @@
 from django.shortcuts import render, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
+from django.db.models import Q
 from django.utils import timezone
-from .models import Task, UserProfile, ReminderLog
-from .services import NotificationService
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
+from teachtime.routers import use_primary
+from .cache import get_task_version, get_today_summary, invalidate_today_summary
+from .events import publish_event, publish_events, stream_events
+from .jobs import aenqueue_reminder
+from .metrics import get_config as get_metrics_config, merged_snapshots, render_prometheus
+from .models import Task, RecurrenceRule, ReminderLog, ReminderJob, ReminderSummary
+from .recurrence import next_dates, parse_occurrence, pending_occurrences
+from .retention import summarise_logs
+from .transfer import FORMATS, TASK_FIELDS, REMINDER_FIELDS, ImportRowError, export_lines, import_rows, text_stream
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import json
 
 # Create your views here.
 
+def dashboard_tasks(user, today):
+    """The user's incomplete tasks due today in dashboard order, read from tasks_task_user_due_idx"""
+    return Task.objects.filter(user=user, completed=False, due_date=today).order_by('position', '-created_at')
+
 @login_required
 def dashboard(request):
     # Get today's date
     today = timezone.now().date()
     
-    # Get incomplete tasks for today
-    tasks = Task.objects.filter(user=request.user, completed=False, due_date=today)
+    # Today's counts and buffer time come from the per-user summary cache
+    summary = get_today_summary(request.user, request.profile)
+    total_tasks_today = summary['total_count']
+    completed_tasks_today = summary['completed_count']
     
     # Check if all tasks are completed
-    total_tasks_today = Task.objects.filter(user=request.user, due_date=today).count()
-    completed_tasks_today = Task.objects.filter(user=request.user, due_date=today, completed=True).count()
-    
     all_tasks_completed = total_tasks_today > 0 and completed_tasks_today == total_tasks_today
     
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    def load_tasks():
+        # Called by the template only when its cached task list fragment is
+        # missing. From the primary: a lagging replica would put a stale list
+        # in the cache. Skips the query when there are no incomplete tasks.
+        if completed_tasks_today >= total_tasks_today:
+            return []
+        with use_primary():
+            tasks = list(dashboard_tasks(request.user, today))
+            # Recurring tasks due today that nobody has completed or edited yet have no row
+            if summary.get('occurrence_count'):
+                rules = RecurrenceRule.objects.filter(user=request.user)
+                tasks += pending_occurrences(rules, today).get(request.user.id, [])
+        return [serialize_task(task) for task in tasks]
     
     context = {
-        'tasks': tasks,
-        'buffer_time': profile.buffer_time,
+        'tasks': load_tasks,
+        'task_version': get_task_version(request.user.id),
+        'task_list_cache_timeout': getattr(settings, 'TASK_LIST_CACHE_TIMEOUT', 300),
+        'today': today,
+        'buffer_time': summary['buffer_time'],
         'all_tasks_completed': all_tasks_completed,
         'completed_count': completed_tasks_today,
         'total_count': total_tasks_today,
     }
     return render(request, 'tasks/dashboard.html', context)
 
-@login_required
-@require_POST
-def add_task(request):
-    data = json.loads(request.body)
-    task = Task.objects.create(
-        user=request.user,
-        text=data.get('text'),
-        priority=data.get('priority', 'medium'),
-        category=data.get('category', 'personal')
-    )
-    return JsonResponse({
+def serialize_task(task):
+    data = {
         'id': task.id,
         'text': task.text,
         'priority': task.priority,
         'category': task.category,
         'completed': task.completed
-    })
+    }
+    if task.recurrence_id:
+        data['occurrence'] = task.occurrence
+    return data
+
+def serialize_rule(rule, today):
+    return {
+        'id': rule.id,
+        'text': rule.text,
+        'priority': rule.priority,
+        'category': rule.category,
+        'frequency': rule.frequency,
+        'interval': rule.interval,
+        'weekdays': sorted(rule.get_weekdays()) if rule.frequency == 'weekly' else [],
+        'start_date': rule.start_date.isoformat(),
+        'end_date': rule.end_date.isoformat() if rule.end_date else None,
+        'upcoming': [day.isoformat() for day in next_dates(rule, today, 5)],
+    }
+
+@login_required
+@require_POST
+def add_task(request):
+    data = json.loads(request.body)
+    if data.get('repeat'):
+        # A recurring task starting today; today's occurrence is shown without a row
+        if data['repeat'] not in dict(RecurrenceRule.FREQUENCY_CHOICES):
+            return JsonResponse({'error': 'Invalid repeat'}, status=400)
+        rule = RecurrenceRule.objects.create(
+            user=request.user,
+            text=data.get('text'),
+            priority=data.get('priority', 'medium'),
+            category=data.get('category', 'personal'),
+            frequency=data['repeat'],
+        )
+        task = rule.build_occurrence(rule.start_date)
+    else:
+        task = Task.objects.create(
+            user=request.user,
+            text=data.get('text'),
+            priority=data.get('priority', 'medium'),
+            category=data.get('category', 'personal')
+        )
+    invalidate_today_summary(request.user)
+    publish_event(request.user.id, 'task.created', {'task': serialize_task(task)})
+    return JsonResponse(serialize_task(task))
 
 @login_required
 @require_POST
@@ -59,78 +129,335 @@ def toggle_task(request, task_id):
     task = get_object_or_404(Task, id=task_id, user=request.user)
     task.completed = not task.completed
     task.save()
+    invalidate_today_summary(request.user)
+    publish_event(request.user.id, 'task.updated', {'task': serialize_task(task)})
     return JsonResponse({'completed': task.completed})
 
 @login_required
 @require_POST
 def delete_task(request, task_id):
     task = get_object_or_404(Task, id=task_id, user=request.user)
-    task.delete()
+    occurrence = task.occurrence
+    with transaction.atomic():
+        if task.recurrence:
+            # Deleting an occurrence's row must not bring the occurrence back
+            task.recurrence.exclude(task.due_date)
+        task.delete()
+    invalidate_today_summary(request.user)
+    publish_event(request.user.id, 'task.deleted', {'id': task_id, 'occurrence': occurrence})
+    return JsonResponse({'success': True})
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def recurrences(request):
+    """REST API endpoint to list or create recurring tasks.
+    
+    POST takes text, priority, category, frequency (daily, weekly or
+    monthly), interval, weekdays (0 = Monday, weekly only), start_date and
+    end_date; everything but text has a default.
+    """
+    today = timezone.now().date()
+    if request.method == 'GET':
+        rules = RecurrenceRule.objects.filter(user=request.user).order_by('created_at')
+        return JsonResponse({'recurrences': [serialize_rule(rule, today) for rule in rules]})
+    
+    data = json.loads(request.body)
+    if not data.get('text'):
+        return JsonResponse({'error': 'text is required'}, status=400)
+    frequency = data.get('frequency', 'weekly')
+    if frequency not in dict(RecurrenceRule.FREQUENCY_CHOICES):
+        return JsonResponse({'error': 'Invalid frequency'}, status=400)
+    interval = data.get('interval', 1)
+    if not isinstance(interval, int) or interval < 1:
+        return JsonResponse({'error': 'interval must be a positive integer'}, status=400)
+    weekdays = data.get('weekdays', [])
+    if not isinstance(weekdays, list) or any(not isinstance(day, int) or not 0 <= day <= 6 for day in weekdays):
+        return JsonResponse({'error': 'weekdays must be a list of 0 (Monday) to 6 (Sunday)'}, status=400)
+    try:
+        start_date = parse_date(data['start_date']) if data.get('start_date') else today
+        end_date = parse_date(data['end_date']) if data.get('end_date') else None
+    except (TypeError, ValueError):
+        start_date = None
+    if start_date is None or (data.get('end_date') and (end_date is None or end_date < start_date)):
+        return JsonResponse({'error': 'Invalid start_date or end_date'}, status=400)
+    
+    rule = RecurrenceRule.objects.create(
+        user=request.user,
+        text=data['text'],
+        priority=data.get('priority', 'medium'),
+        category=data.get('category', 'personal'),
+        frequency=frequency,
+        interval=interval,
+        weekdays=','.join(str(day) for day in sorted(set(weekdays))),
+        start_date=start_date,
+        end_date=end_date,
+    )
+    invalidate_today_summary(request.user)
+    if rule.next_occurrence == today:
+        publish_event(request.user.id, 'task.created', {'task': serialize_task(rule.build_occurrence(today))})
+    return JsonResponse(serialize_rule(rule, today), status=201)
+
+@login_required
+@require_POST
+def delete_recurrence(request, rule_id):
+    """Stop a recurring task; occurrences that already have rows are kept"""
+    rule = get_object_or_404(RecurrenceRule, id=rule_id, user=request.user)
+    today = timezone.now().date()
+    pending = pending_occurrences(RecurrenceRule.objects.filter(id=rule.id), today)
+    rule.delete()
+    invalidate_today_summary(request.user)
+    if pending:
+        publish_event(request.user.id, 'task.deleted', {'id': None, 'occurrence': f"{rule_id}:{today.isoformat()}"})
     return JsonResponse({'success': True})
 
+@login_required
+@require_POST
+def batch_tasks(request):
+    """REST API endpoint to apply many task operations in one transaction.
+    
+    Accepts {"operations": [...]} where each operation is one of
+    {"op": "create", "text", "priority", "category"}, {"op": "toggle", "id",
+    optional "completed"}, {"op": "delete", "id"} or {"op": "reorder", "ids"}.
+    Toggles and deletes may name an occurrence of a recurring task,
+    {"occurrence": "<rule id>:<date>"}, instead of an id: toggling one
+    materializes it as a Task row, deleting one excludes its date.
+    Ownership of every referenced task is checked in one query; if any
+    operation is invalid nothing is applied.
+    """
+    data = json.loads(request.body)
+    operations = data.get('operations')
+    max_operations = getattr(settings, 'TASK_BATCH_MAX_OPERATIONS', 200)
+    
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'error': 'operations must be a non-empty list'}, status=400)
+    if len(operations) > max_operations:
+        return JsonResponse({'error': f'At most {max_operations} operations per batch'}, status=400)
+    
+    referenced = set()
+    occurrences = {}
+    for op in operations:
+        if not isinstance(op, dict):
+            continue
+        if op.get('op') in ('toggle', 'delete') and 'occurrence' in op:
+            parsed = parse_occurrence(op['occurrence'])
+            if parsed:
+                occurrences[op['occurrence']] = parsed
+        elif op.get('op') in ('toggle', 'delete') and isinstance(op.get('id'), int):
+            referenced.add(op['id'])
+        elif op.get('op') == 'reorder' and isinstance(op.get('ids'), list):
+            referenced.update(i for i in op['ids'] if isinstance(i, int))
+    owned = Task.objects.filter(user=request.user, id__in=referenced).in_bulk()
+    
+    # Rules of the named occurrences and of deleted rows that are occurrences
+    rule_ids = {rule_id for rule_id, day in occurrences.values()}
+    rule_ids.update(task.recurrence_id for task in owned.values() if task.recurrence_id)
+    rules = RecurrenceRule.objects.filter(user=request.user, id__in=rule_ids).in_bulk() if rule_ids else {}
+    # Occurrences that already have a row are changed through it
+    materialized = {}
+    if occurrences:
+        for task in Task.objects.filter(
+            user=request.user,
+            recurrence_id__in=[rule_id for rule_id, day in occurrences.values()],
+            due_date__in=[day for rule_id, day in occurrences.values()],
+        ):
+            materialized[task.occurrence] = task
+    
+    # Validate every operation before touching the database
+    results = []
+    deleted = set()
+    deleted_occurrences = set()
+    for op in operations:
+        kind = op.get('op') if isinstance(op, dict) else None
+        error = None
+        if kind == 'create':
+            if not op.get('text'):
+                error = 'text is required'
+        elif kind in ('toggle', 'delete') and 'occurrence' in op:
+            key = op['occurrence'] if op['occurrence'] in occurrences else None
+            rule = rules.get(occurrences[key][0]) if key else None
+            if rule is None or key in deleted_occurrences:
+                error = 'Task not found'
+            else:
+                day = occurrences[key][1]
+                task = materialized.get(key)
+                if task is None and (not rule.occurs_on(day) or day.isoformat() in rule.excluded_dates):
+                    error = 'Task not found'
+                elif task is not None and task.id in deleted:
+                    error = 'Task not found'
+                elif kind == 'delete':
+                    deleted_occurrences.add(key)
+                    if task is not None:
+                        deleted.add(task.id)
+        elif kind in ('toggle', 'delete'):
+            if not isinstance(op.get('id'), int) or op['id'] not in owned or op['id'] in deleted:
+                error = 'Task not found'
+            elif kind == 'delete':
+                deleted.add(op['id'])
+                if owned[op['id']].occurrence:
+                    deleted_occurrences.add(owned[op['id']].occurrence)
+        elif kind == 'reorder':
+            ids = op.get('ids')
+            if not isinstance(ids, list) or any(not isinstance(i, int) or i not in owned or i in deleted for i in ids):
+                error = 'Task not found'
+        else:
+            error = 'Unknown operation'
+        results.append({'op': kind, 'ok': error is None, 'error': error})
+    
+    if not all(result['ok'] for result in results):
+        return JsonResponse({'success': False, 'results': results}, status=400)
+    
+    now = timezone.now()
+    created = []
+    changed = {}
+    occurrence_results = []
+    deleted_events = []
+    for op, result in zip(operations, results):
+        kind = op['op']
+        if kind == 'create':
+            task = Task(
+                user=request.user,
+                text=op['text'],
+                priority=op.get('priority', 'medium'),
+                category=op.get('category', 'personal')
+            )
+            created.append((task, result))
+        elif kind == 'toggle' and 'occurrence' in op:
+            task = materialized.get(op['occurrence'])
+            if task is None:
+                # First change to this occurrence: give it a row
+                rule_id, day = occurrences[op['occurrence']]
+                task = materialized[op['occurrence']] = rules[rule_id].build_occurrence(day)
+                created.append((task, result))
+            else:
+                task.updated_at = now
+                if task.id is not None:
+                    changed[task.id] = task
+            task.completed = bool(op['completed']) if 'completed' in op else not task.completed
+            occurrence_results.append((task, result))
+        elif kind == 'toggle':
+            task = owned[op['id']]
+            task.completed = bool(op['completed']) if 'completed' in op else not task.completed
+            task.updated_at = now
+            changed[task.id] = task
+            result['task'] = serialize_task(task)
+        elif kind == 'delete':
+            if 'occurrence' in op:
+                task = materialized.get(op['occurrence'])
+                # Made by an earlier toggle in this batch, so there is no row to delete
+                created = [(pending, pending_result) for pending, pending_result in created if pending is not task]
+                result['occurrence'] = op['occurrence']
+                result['id'] = task.id if task is not None else None
+            else:
+                result['id'] = op['id']
+                result['occurrence'] = owned[op['id']].occurrence
+            changed.pop(result['id'], None)
+            deleted_events.append({'id': result['id'], 'occurrence': result['occurrence']})
+        else:
+            for position, task_id in enumerate(op['ids']):
+                owned[task_id].position = position
+                changed[task_id] = owned[task_id]
+    
+    # Dates each rule should stop showing, for deleted occurrences and their rows
+    exclusions = {}
+    for key in deleted_occurrences:
+        rule_id, day = parse_occurrence(key)
+        exclusions.setdefault(rules[rule_id], set()).add(day.isoformat())
+    for rule, days in exclusions.items():
+        rule.excluded_dates = sorted(set(rule.excluded_dates) | days)
+    
+    try:
+        with transaction.atomic():
+            if created:
+                Task.objects.bulk_create([task for task, result in created])
+            if changed:
+                Task.objects.bulk_update(changed.values(), ['completed', 'position', 'updated_at'])
+            if deleted:
+                Task.objects.filter(user=request.user, id__in=deleted).delete()
+            if exclusions:
+                RecurrenceRule.objects.bulk_update(exclusions.keys(), ['excluded_dates'])
+    except IntegrityError:
+        # Another request materialized one of these occurrences first
+        return JsonResponse({'success': False, 'error': 'Tasks changed concurrently, reload and retry'}, status=409)
+    
+    for task, result in created + occurrence_results:
+        result['task'] = serialize_task(task)
+    
+    invalidate_today_summary(request.user)
+    publish_events(
+        [(request.user.id, 'task.created', {'task': result['task']}) for task, result in created]
+        + [(request.user.id, 'task.updated', {'task': serialize_task(task)}) for task in changed.values()]
+        + [(request.user.id, 'task.deleted', event) for event in deleted_events]
+    )
+    return JsonResponse({'success': True, 'results': results})
+
+@login_required
+async def event_stream(request):
+    """Server-Sent Events stream of the user's task changes and reminder sends.
+    
+    Needs the ASGI app (teachtime/asgi.py); under WSGI a stream would hold a
+    worker for good, so it answers 204, which tells EventSource not to retry.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    
+    response = StreamingHttpResponse(stream_events(user.id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
 @login_required
 @require_POST
 def update_buffer(request):
     data = json.loads(request.body)
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    profile = request.profile
     profile.buffer_time = float(data.get('buffer_time', 2.0))
-    profile.save()
+    # The cached profile may lag bulk updates, so only write what changed
+    profile.save(update_fields=['buffer_time'])
+    invalidate_today_summary(request.user)
     return JsonResponse({'buffer_time': profile.buffer_time})
 
 @login_required
 @require_POST
-def send_reminder_now(request):
-    """REST API endpoint to send immediate reminder"""
+async def send_reminder_now(request):
+    """REST API endpoint to queue an immediate reminder"""
+    user = await request.auser()
     data = json.loads(request.body)
     reminder_type = data.get('type', 'email')
     
-    # Get today's tasks
-    today = timezone.now().date()
-    tasks = Task.objects.filter(user=request.user, due_date=today)
+    if reminder_type not in dict(ReminderLog.REMINDER_TYPES):
+        return JsonResponse({'error': 'Invalid reminder type'}, status=400)
     
-    success = False
-    message = ""
+    job = await aenqueue_reminder(user, reminder_type)
     
-    try:
-        if reminder_type == 'email':
-            success = NotificationService.send_email_reminder(request.user, tasks)
-            message = "Email reminder sent successfully" if success else "Failed to send email"
-        elif reminder_type == 'sms':
-            success = NotificationService.send_sms_reminder(request.user, tasks)
-            message = "SMS reminder sent successfully" if success else "Failed to send SMS"
-        elif reminder_type == 'push':
-            success = NotificationService.send_push_notification(request.user, tasks)
-            message = "Push notification sent successfully" if success else "Failed to send push notification"
-        else:
-            return JsonResponse({'error': 'Invalid reminder type'}, status=400)
-        
-        # Log the reminder
-        ReminderLog.objects.create(
-            user=request.user,
-            reminder_type=reminder_type,
-            success=success
-        )
-        
-        return JsonResponse({
-            'success': success,
-            'message': message,
-            'task_count': tasks.count()
-        })
-        
-    except Exception as e:
-        ReminderLog.objects.create(
-            user=request.user,
-            reminder_type=reminder_type,
-            success=False,
-            error_message=str(e)
-        )
-        return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('tasks:reminder_job_status', args=[job.id]),
+    }, status=202)
+
+@login_required
+def reminder_job_status(request, job_id):
+    """REST API endpoint to poll a queued reminder"""
+    job = get_object_or_404(ReminderJob, id=job_id, user=request.user)
+    
+    return JsonResponse({
+        'job_id': job.id,
+        'type': job.reminder_type,
+        'status': job.status,
+        'attempts': job.attempts,
+        'success': job.success,
+        'error_message': job.error_message,
+    })
 
 @login_required
 @require_http_methods(["GET", "POST"])
-def notification_settings(request):
+async def notification_settings(request):
     """REST API endpoint to get/update notification settings"""
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    profile = await request.aprofile()
     
     if request.method == 'GET':
         return JsonResponse({
@@ -138,6 +465,7 @@ def notification_settings(request):
             'sms_reminders': profile.sms_reminders,
             'push_reminders': profile.push_reminders,
             'reminder_time': profile.reminder_time.strftime('%H:%M'),
+            'time_zone': profile.time_zone,
             'phone_number': profile.phone_number or '',
         })
     
@@ -147,39 +475,325 @@ def notification_settings(request):
         profile.email_reminders = data.get('email_reminders', profile.email_reminders)
         profile.sms_reminders = data.get('sms_reminders', profile.sms_reminders)
         profile.push_reminders = data.get('push_reminders', profile.push_reminders)
+        # The cached profile may lag bulk updates, so only write what changed
+        update_fields = ['email_reminders', 'sms_reminders', 'push_reminders']
         
         if 'reminder_time' in data:
-            from datetime import datetime
             profile.reminder_time = datetime.strptime(data['reminder_time'], '%H:%M').time()
         
+        if 'time_zone' in data:
+            try:
+                ZoneInfo(data['time_zone'])
+            except (ZoneInfoNotFoundError, ValueError, TypeError):
+                return JsonResponse({'error': 'Invalid time zone'}, status=400)
+            profile.time_zone = data['time_zone']
+        
+        if 'reminder_time' in data or 'time_zone' in data:
+            profile.schedule_next_reminder()
+            update_fields += ['reminder_time', 'time_zone', 'next_reminder_at']
+        
         if 'phone_number' in data:
             profile.phone_number = data['phone_number']
+            update_fields.append('phone_number')
         
         if 'fcm_token' in data:
             profile.fcm_token = data['fcm_token']
+            update_fields.append('fcm_token')
         
-        profile.save()
+        await profile.asave(update_fields=update_fields)
         
         return JsonResponse({
             'success': True,
             'message': 'Settings updated successfully'
         })
 
+def encode_history_cursor(sent_at, log_id):
+    return urlsafe_b64encode(json.dumps([sent_at.isoformat(), log_id]).encode()).decode()
+
+def encode_summary_cursor(day=None, summary_id=None):
+    """Cursor into the daily summaries; without a position it starts at the newest"""
+    position = ['summary', day.isoformat() if day else None, summary_id]
+    return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_history_cursor(cursor):
+    """('log', sent_at, id) or ('summary', date, id) of the last entry on the
+    previous page, or None if malformed. A summary cursor's date and id are
+    None when the previous page ended with the oldest raw log."""
+    try:
+        position = json.loads(urlsafe_b64decode(cursor.encode()))
+        if not isinstance(position, list):
+            return None
+        if len(position) == 3 and position[0] == 'summary':
+            day, summary_id = position[1:]
+            if day is None and summary_id is None:
+                return 'summary', None, None
+            day = parse_date(day)
+            if day is None or not isinstance(summary_id, int):
+                return None
+            return 'summary', day, summary_id
+        sent_at, log_id = position
+        sent_at = parse_datetime(sent_at)
+    except (ValueError, TypeError):
+        return None
+    if sent_at is None or not isinstance(log_id, int):
+        return None
+    return 'log', sent_at, log_id
+
+def parse_history_bound(value):
+    """A datetime, or a date meaning midnight UTC at its start"""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
 @login_required
 def reminder_history(request):
-    """REST API endpoint to get reminder history"""
-    logs = ReminderLog.objects.filter(user=request.user)[:20]
+    """REST API endpoint to page through reminder history, newest first.
+
+    Pages are keyed on (sent_at, id) rather than OFFSET, so any page costs
+    one index range scan. Pass back `next_cursor` as ?cursor= for the next
+    page. Optional filters: type, success, since (inclusive) and until
+    (exclusive) as ISO dates or datetimes, and limit.
+
+    Once the raw logs run out, paging continues through the per-day
+    summaries compact_reminder_logs left for older days, keyed on (date,
+    id). Those entries have "summary": true and counts instead of a single
+    result; success=true matches days with any success, success=false days
+    with any failure, and since/until match days they overlap.
+    """
+    logs = ReminderLog.objects.filter(user=request.user)
+    summaries = ReminderSummary.objects.filter(user=request.user)
+    
+    reminder_type = request.GET.get('type')
+    if reminder_type:
+        if reminder_type not in dict(ReminderLog.REMINDER_TYPES):
+            return JsonResponse({'error': 'Invalid reminder type'}, status=400)
+        logs = logs.filter(reminder_type=reminder_type)
+        summaries = summaries.filter(reminder_type=reminder_type)
+    
+    success = request.GET.get('success')
+    if success:
+        if success not in ('true', 'false'):
+            return JsonResponse({'error': 'success must be true or false'}, status=400)
+        logs = logs.filter(success=success == 'true')
+        if success == 'true':
+            summaries = summaries.filter(succeeded__gt=0)
+        else:
+            summaries = summaries.filter(Q(failed__gt=0) | Q(skipped__gt=0))
+    
+    for param, lookup in (('since', 'sent_at__gte'), ('until', 'sent_at__lt')):
+        if request.GET.get(param):
+            bound = parse_history_bound(request.GET[param])
+            if bound is None:
+                return JsonResponse({'error': f'Invalid {param}'}, status=400)
+            logs = logs.filter(**{lookup: bound})
+            bound = bound.astimezone(dt_timezone.utc)
+            if param == 'since':
+                summaries = summaries.filter(date__gte=bound.date())
+            elif bound.time() == time.min:
+                summaries = summaries.filter(date__lt=bound.date())
+            else:
+                summaries = summaries.filter(date__lte=bound.date())
+    
+    phase = 'log'
+    if request.GET.get('cursor'):
+        position = decode_history_cursor(request.GET['cursor'])
+        if position is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        phase, after, after_id = position
+        if phase == 'log':
+            # The plain upper bound lets the database range-scan the index; the OR breaks ties
+            logs = logs.filter(sent_at__lte=after).filter(Q(sent_at__lt=after) | Q(id__lt=after_id))
+        elif after is not None:
+            summaries = summaries.filter(date__lte=after).filter(Q(date__lt=after) | Q(id__lt=after_id))
+    
+    try:
+        limit = int(request.GET.get('limit', settings.REMINDER_HISTORY_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    limit = max(1, min(limit, settings.REMINDER_HISTORY_MAX_PAGE_SIZE))
+    
+    # One extra row tells us whether there is a next page
+    rows = []
+    if phase == 'log':
+        rows = list(
+            logs.order_by('-sent_at', '-id')
+            .values('id', 'reminder_type', 'sent_at', 'success', 'skipped', 'error_message')[:limit + 1]
+        )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
+    # The rest of the page comes from the summaries of compacted days
+    summary_rows = []
+    if not has_more:
+        remaining = limit - len(rows)
+        summary_rows = list(
+            summaries.order_by('-date', '-id')
+            .values('id', 'reminder_type', 'date', 'total', 'succeeded', 'failed', 'skipped')[:remaining + 1]
+        )
+    
+    type_labels = dict(ReminderLog.REMINDER_TYPES)
     history = []
-    for log in logs:
+    for row in rows:
         history.append({
-            'type': log.get_reminder_type_display(),
-            'sent_at': log.sent_at.isoformat(),
-            'success': log.success,
-            'error_message': log.error_message
+            'id': row['id'],
+            'type': type_labels[row['reminder_type']],
+            'sent_at': row['sent_at'].isoformat(),
+            'success': row['success'],
+            'skipped': row['skipped'],
+            'error_message': row['error_message']
         })
+    for row in summary_rows[:limit - len(rows)]:
+        history.append({
+            'summary': True,
+            'type': type_labels[row['reminder_type']],
+            'date': row['date'].isoformat(),
+            'total': row['total'],
+            'succeeded': row['succeeded'],
+            'failed': row['failed'],
+            'skipped': row['skipped'],
+        })
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_history_cursor(rows[-1]['sent_at'], rows[-1]['id'])
+    elif len(summary_rows) > limit - len(rows):
+        if len(rows) == limit:
+            next_cursor = encode_summary_cursor()
+        else:
+            last = summary_rows[limit - len(rows) - 1]
+            next_cursor = encode_summary_cursor(last['date'], last['id'])
+    
+    return JsonResponse({'history': history, 'next_cursor': next_cursor})
+
+@login_required
+def reminder_stats(request):
+    """REST API endpoint for reminder counts per channel and day.
+    
+    Optional since (inclusive) and until (exclusive) ISO dates, by default
+    the last 30 days. Recent days are counted from the raw logs and
+    compacted ones from their summaries, so the range may span both.
+    """
+    today = timezone.now().astimezone(dt_timezone.utc).date()
+    since = today - timedelta(days=29)
+    until = today + timedelta(days=1)
+    for param in ('since', 'until'):
+        if request.GET.get(param):
+            try:
+                day = parse_date(request.GET[param])
+            except ValueError:
+                day = None
+            if day is None:
+                return JsonResponse({'error': f'Invalid {param}'}, status=400)
+            if param == 'since':
+                since = day
+            else:
+                until = day
+    
+    counts = summarise_logs(ReminderLog.objects.filter(
+        user=request.user,
+        sent_at__gte=datetime.combine(since, time.min, tzinfo=dt_timezone.utc),
+        sent_at__lt=datetime.combine(until, time.min, tzinfo=dt_timezone.utc),
+    ))
+    summaries = ReminderSummary.objects.filter(user=request.user, date__gte=since, date__lt=until)
+    for summary in summaries.values('reminder_type', 'date', 'total', 'succeeded', 'failed', 'skipped'):
+        key = (request.user.id, summary.pop('reminder_type'), summary.pop('date'))
+        if key in counts:
+            counts[key] = {field: counts[key][field] + value for field, value in summary.items()}
+        else:
+            counts[key] = summary
+    
+    channels = {}
+    days = []
+    for (user_id, channel, day), values in sorted(counts.items(), key=lambda item: (item[0][2], item[0][1])):
+        days.append({'date': day.isoformat(), 'channel': channel, **values})
+        totals = channels.setdefault(channel, {'total': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0})
+        for field, value in values.items():
+            totals[field] += value
+    
+    return JsonResponse({
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'channels': channels,
+        'days': days,
+    })
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+def export_response(queryset, fields, fmt, name):
+    response = StreamingHttpResponse(export_lines(queryset, fields, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+@login_required
+def export_tasks(request):
+    """Stream all of the user's tasks as CSV or NDJSON (?format=)"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': 'Invalid format'}, status=400)
+    
+    return export_response(Task.objects.filter(user=request.user), TASK_FIELDS, fmt, 'tasks')
+
+@login_required
+def export_reminders(request):
+    """Stream all of the user's reminder logs as CSV or NDJSON (?format=)"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': 'Invalid format'}, status=400)
+    
+    return export_response(ReminderLog.objects.filter(user=request.user), REMINDER_FIELDS, fmt, 'reminders')
+
+@login_required
+@require_POST
+def import_tasks(request):
+    """Create tasks for the user from an uploaded `file` or the raw request body.
+
+    The format comes from ?format=, else the file extension, else CSV.
+    Either every row is imported or, on the first bad row, none are.
+    """
+    upload = request.FILES.get('file')
+    fmt = request.GET.get('format')
+    if fmt is None:
+        fmt = 'ndjson' if upload and upload.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+    if fmt not in FORMATS:
+        return JsonResponse({'error': 'Invalid format'}, status=400)
+    
+    stream = text_stream(upload.file if upload else request)
+    try:
+        with transaction.atomic():
+            created = import_rows(Task, stream, fmt, user=request.user)
+    except (ImportRowError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    invalidate_today_summary(request.user)
+    return JsonResponse({'created': created})
+
+def metrics(request):
+    """Prometheus scrape endpoint with the merged metrics of all processes.
+    
+    Needs `Authorization: Bearer <METRICS['TOKEN']>` when a token is set,
+    otherwise a logged-in staff user.
+    """
+    token = get_metrics_config()['TOKEN']
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not request.user.is_staff:
+        return HttpResponse(status=403)
     
-    return JsonResponse({'history': history})
+    counters, histograms = merged_snapshots()
+    return HttpResponse(render_prometheus(counters, histograms), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @login_required
 def settings_page(request):
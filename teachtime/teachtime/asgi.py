@@ -2,6 +2,8 @@
 ASGI config for teachtime project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The dashboard's live event stream (/api/events/) is only served through it,
+e.g. ``uvicorn teachtime.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -0,0 +1,62 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Database that reads in this context go to; None means the primary
+read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def choose_replica():
+    """A random replica alias, or None when none are configured"""
+    replicas = get_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def read_from(alias):
+    """Send reads inside the block to `alias` (None: the primary); writes still go to the primary"""
+    token = read_alias.set(alias)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+def use_primary():
+    """Read from the primary inside the block, e.g. for values about to be cached"""
+    return read_from(DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+    """Reads go to a replica only where a caller opted in with read_from().
+
+    Safe requests opt in through tasks.middleware.ReplicaRoutingMiddleware
+    and the send_reminders recipient scan through --database. Everything else,
+    including management commands that read and then update rows, keeps
+    reading the primary. Writes always go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary by replication
+        if db in get_replicas():
+            return False
+        return None
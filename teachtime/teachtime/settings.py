@@ -30,12 +30,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tasks.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tasks.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tasks.metrics.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'teachtime.urls'
@@ -65,9 +67,76 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # A read replica; reads only go to it once it is listed in DATABASE_REPLICAS.
+    # To try routing locally, a copy of the database stands in for a lagging
+    # replica:
+    #     cp db.sqlite3 db-replica.sqlite3
+    # Tests use it as a mirror of the primary, so they need one database.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['teachtime.routers.ReplicaRouter']
+
+# Aliases in DATABASES that GET and HEAD requests read from, one picked at
+# random per request. Everything else reads the primary ('default').
+DATABASE_REPLICAS = []
+
+# Seconds a client's reads stay on the primary after its own POST, so it sees
+# its writes despite replication lag
+REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# Local memory is per process; use a shared backend (Redis, Memcached) when
+# running several workers so summary invalidation reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Seconds a user's cached "today" task summary is kept
+TASK_SUMMARY_CACHE_TIMEOUT = 300
+
+# Seconds a user's cached dashboard task list fragment is kept. The task views
+# replace it at once; changes made elsewhere, e.g. in the admin, show after this long
+TASK_LIST_CACHE_TIMEOUT = 300
+
+# Seconds a user's cached User and UserProfile pair is kept; saving either drops it sooner
+USER_CACHE_TIMEOUT = 300
+
+# Sessions are read through the cache, so warm authenticated requests make no
+# session query. 'django.contrib.sessions.backends.signed_cookies' avoids the
+# session table entirely, at the cost of a larger cookie and no server-side logout.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Largest number of operations accepted by the batch task endpoint
+TASK_BATCH_MAX_OPERATIONS = 200
+
+# Dashboard live updates (Server-Sent Events, served by the ASGI app).
+# 'memory' passes events between requests of one process; 'database' also
+# reaches dashboards served by other processes and events from
+# send_reminders / reminder_worker, at the cost of a row per event and one
+# poll per open dashboard every POLL_INTERVAL seconds. Reminder events are
+# only stored for users with a dashboard open.
+DASHBOARD_EVENTS = {
+    'BACKEND': 'database',
+    'KEEPALIVE': 15,  # Seconds between keepalive comments on an idle stream
+    'POLL_INTERVAL': 2,  # Seconds between polls ('database' backend)
+    'RETENTION': 600,  # Seconds events are kept for reconnecting clients ('database' backend)
+    'QUEUE_SIZE': 100,  # Events buffered per stream before it is told to resync ('memory' backend)
+}
+
+# Reminder history API page size (?limit= may ask for up to the maximum)
+REMINDER_HISTORY_PAGE_SIZE = 20
+REMINDER_HISTORY_MAX_PAGE_SIZE = 100
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -105,6 +174,23 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic copies static files here under content-hashed names
+# (dashboard.3f2a9c1e.css) with .gz, and with the brotli package .br, copies
+# next to them. Serve this directory from the web server with a far-future
+# Cache-Control, as the names change whenever the content does, and its
+# precompressed files, e.g. in nginx:
+#     location /static/ { alias .../staticfiles/; expires max; gzip_static on; brotli_static on; }
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'tasks.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -121,9 +207,28 @@ DEFAULT_FROM_EMAIL = 'Time Manager <noreply@timemanager.com>'
 TWILIO_ACCOUNT_SID = 'your-twilio-account-sid'  # Replace with your Twilio SID
 TWILIO_AUTH_TOKEN = 'your-twilio-auth-token'  # Replace with your Twilio token
 TWILIO_PHONE_NUMBER = '+1234567890'  # Replace with your Twilio phone number
+TWILIO_API_URL = 'https://api.twilio.com'
 
 # Firebase Cloud Messaging for push notifications
 FCM_SERVER_KEY = 'your-fcm-server-key'  # Replace with your FCM server key
+FCM_API_URL = 'https://fcm.googleapis.com/fcm/send'
+FCM_MULTICAST_SIZE = 1000  # Registration tokens per multicast request (FCM maximum)
+
+# Shared keep-alive HTTP transport for Twilio and FCM (timeouts in seconds)
+NOTIFICATION_HTTP = {
+    'POOL_SIZE': 10,        # Idle connections kept per provider host
+    'CONNECT_TIMEOUT': 5.0,
+    'READ_TIMEOUT': 10.0,
+}
+
+# Per-channel rate limits (requests/second) and circuit breakers for
+# notification providers. A breaker opens after FAILURE_THRESHOLD consecutive
+# failures and lets one probe through after RESET_TIMEOUT seconds.
+NOTIFICATION_PROVIDER_LIMITS = {
+    'email': {'RATE': 50, 'BURST': 50, 'FAILURE_THRESHOLD': 5, 'RESET_TIMEOUT': 60},
+    'sms': {'RATE': 30, 'BURST': 30, 'FAILURE_THRESHOLD': 5, 'RESET_TIMEOUT': 60},
+    'push': {'RATE': 20, 'BURST': 20, 'FAILURE_THRESHOLD': 5, 'RESET_TIMEOUT': 60},
+}
 
 # Site URL for links in notifications
 SITE_URL = 'http://127.0.0.1:8000'
@@ -147,3 +252,46 @@ LOGGING = {
         },
     },
 }
+
+# Request and provider metrics, served at /metrics and by manage.py metrics_report
+METRICS = {
+    'ENABLED': True,
+    'VIEW_SAMPLE_RATE': 0.1,  # Share of requests whose latency and DB queries are measured
+    'FLUSH_INTERVAL': 30,  # Seconds between saves of a process's totals to the database
+    'RETENTION': 24 * 3600,  # Seconds after which a silent process's totals are folded into one retired row
+    'TOKEN': None,  # Bearer token for Prometheus scrapes; without one /metrics is staff-only
+}
+
+# Maximum concurrent reminder sends per channel in send_reminders
+REMINDER_CHANNEL_CONCURRENCY = {
+    'email': 4,   # SMTP
+    'sms': 8,     # Twilio
+    'push': 16,   # FCM
+}
+
+# Reminder emails sent over one SMTP connection by a send_reminders worker
+REMINDER_EMAIL_BATCH_SIZE = 100
+
+# Number of ReminderLog rows send_reminders buffers per bulk INSERT
+REMINDER_LOG_BATCH_SIZE = 500
+
+# ReminderLog retention (run manage.py compact_reminder_logs daily). Rows older
+# than REMINDER_LOG_RETENTION_DAYS are rolled into per user, channel and day
+# ReminderSummary rows, which reminder history and stats read for older ranges.
+REMINDER_LOG_RETENTION_DAYS = 90
+REMINDER_LOG_COMPACT_BATCH_SIZE = 5000  # Rows summarised and deleted per transaction, so locks stay short
+REMINDER_LOG_ARCHIVE_DIR = BASE_DIR / 'archive'  # Gzipped NDJSON of removed rows; None deletes them unarchived
+REMINDER_SUMMARY_RETENTION_DAYS = None  # Summaries older than this are deleted too; None keeps them
+
+# Seconds during which a reminder with the same tasks is not sent again to a
+# user on the same channel (overlapping send_reminders runs, send_reminder_now).
+# 0 disables deduplication.
+REMINDER_DEDUP_WINDOW = 3600
+
+# Seconds a claimed reminder counts as being sent before it is confirmed. Claims
+# of a run that died mid-send lapse after this, so keep it above the longest run.
+REMINDER_DEDUP_CLAIM_TIMEOUT = 900
+
+# Reminder job queue (processed by manage.py reminder_worker)
+REMINDER_JOB_MAX_ATTEMPTS = 3
+REMINDER_JOB_RETRY_DELAY = 30  # Seconds before the first retry; doubles per attempt